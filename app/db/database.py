@@ -2,13 +2,21 @@
 Модуль для работы с базой данных SQLite
 """
 import os
+import atexit
 import logging
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import json
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, Float, ForeignKey, DateTime, Text
+from sqlalchemy import create_engine, event, inspect, text, func, and_, Column, Integer, String, Boolean, Float, ForeignKey, DateTime, Text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-from config import DATABASE_URL, BASE_DIR
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import QueuePool
+from collections import OrderedDict
+from config import DATABASE_URL, BASE_DIR, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_BUSY_TIMEOUT, USER_SETTINGS_CACHE_SIZE
 
 # Создаем базовый класс для моделей
 Base = declarative_base()
@@ -69,15 +77,81 @@ class Task(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     estimated_time = Column(Integer)
+    source_type = Column(String)
+    payload_path = Column(String)
+    worker_id = Column(String)
+    lease_expires_at = Column(DateTime)
+    attempts = Column(Integer, default=0)
+    chunks_done = Column(Integer, default=0)
+    chapters_sent = Column(Integer, default=0)
+    chapter_part = Column(Integer, default=1)  # Номер части главы chapters_sent, если она делится на файлы
+    settings = Column(Text)  # Снимок настроек пользователя на момент постановки в очередь (JSON)
     
     # Отношения
     user = relationship("User", back_populates="tasks")
+    chunks = relationship("TaskChunk", back_populates="task", cascade="all, delete-orphan")
+
+# Модель озвученной части задачи (контрольная точка длинной задачи)
+class TaskChunk(Base):
+    __tablename__ = 'task_chunks'
+    
+    task_id = Column(String, ForeignKey('tasks.task_id'), primary_key=True)
+    chunk_index = Column(Integer, primary_key=True)
+    text_hash = Column(String)
+    artifact_path = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Отношения
+    task = relationship("Task", back_populates="chunks")
+
+def _engine_options(url):
+    """
+    Параметры движка базы данных
+
+    Args:
+        url (str): Адрес базы данных
+
+    Returns:
+        dict: Аргументы create_engine
+    """
+    options = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_pre_ping': True
+    }
+    if url.startswith('sqlite'):
+        # Соединения SQLite переходят между потоками через пул;
+        # timeout — ожидание блокировки записи вместо ошибки database is locked
+        options = {
+            'poolclass': QueuePool,
+            'pool_size': DB_POOL_SIZE,
+            'max_overflow': DB_MAX_OVERFLOW,
+            'connect_args': {'check_same_thread': False, 'timeout': DB_BUSY_TIMEOUT}
+        }
+    return options
 
 # Создаем движок базы данных
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+
+if engine.dialect.name == 'sqlite':
+    @event.listens_for(engine, "connect")
+    def _tune_sqlite(dbapi_connection, connection_record):
+        """
+        Настройка нового соединения SQLite: WAL позволяет читать во время
+        записи, synchronous=NORMAL в режиме WAL не теряет согласованность
+        при сбое, но не ждет fsync на каждый commit
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT * 1000)}")
+        cursor.close()
+
+# Создаем фабрику сессий: у каждого потока своя сессия
+SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine))
 
-# Создаем фабрику сессий
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Глубина вложенных session_scope в текущем потоке
+_scope_state = threading.local()
 
 def init_db():
     """Инициализация базы данных"""
@@ -87,15 +161,133 @@ def init_db():
     
     # Создаем таблицы
     Base.metadata.create_all(bind=engine)
+    
+    # Добавляем новые столбцы в таблицы, созданные предыдущими версиями
+    migrate_columns()
     logging.info("База данных инициализирована")
 
-def get_db():
-    """Получение сессии базы данных"""
-    db = SessionLocal()
+def migrate_columns():
+    """Добавление недостающих столбцов в существующие таблицы"""
+    inspector = inspect(engine)
+    
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    logging.info(f"В таблицу {table.name} добавлен столбец {column.name}")
+
+@contextmanager
+def session_scope():
+    """
+    Сессия базы данных на время блока
+
+    Внутри потока вложенные блоки получают одну и ту же сессию. При выходе
+    из внешнего блока незавершенная транзакция откатывается, а сессия
+    закрывается и возвращает соединение в пул. Объекты, загруженные в
+    блоке, остаются доступными и после него (expire_on_commit=False).
+
+    Yields:
+        Session: Сессия текущего потока
+    """
+    depth = getattr(_scope_state, 'depth', 0)
+    _scope_state.depth = depth + 1
+    session = SessionLocal()
     try:
-        return db
+        yield session
+    except Exception:
+        session.rollback()
+        raise
     finally:
-        db.close()
+        _scope_state.depth = depth
+        if depth == 0:
+            SessionLocal.remove()
+
+class DatabaseWriter:
+    """
+    Единственный поток для частых записей (аренда задач, прогресс книг,
+    контрольные точки частей)
+
+    Записи выполняются по одной в порядке поступления, поэтому не
+    соперничают друг с другом за блокировку SQLite, а вызывающий поток не
+    ждет commit.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        """
+        Запуск потока записи при первом обращении
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-writer")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def submit(self, func, *args):
+        """
+        Постановка записи в очередь
+
+        Args:
+            func (callable): Функция этого модуля, первым аргументом принимающая сессию
+            *args: Остальные аргументы функции
+
+        Returns:
+            Future: Результат функции
+        """
+        future = Future()
+        self._ensure_started()
+        self._queue.put((func, args, future))
+        return future
+
+    def flush(self, timeout=None):
+        """
+        Ожидание выполнения всех поставленных записей
+
+        Args:
+            timeout (float): Максимальное время ожидания в секундах
+        """
+        if self._thread is not None:
+            self.submit(lambda db: None).result(timeout)
+
+    def _run(self):
+        """
+        Цикл потока записи
+        """
+        while True:
+            func, args, future = self._queue.get()
+            try:
+                with session_scope() as db:
+                    future.set_result(func(db, *args))
+            except Exception as e:
+                logging.error(f"Ошибка при записи в базу данных ({getattr(func, '__name__', func)}): {e}")
+                future.set_exception(e)
+
+# Общий поток записи процесса
+db_writer = DatabaseWriter()
+atexit.register(db_writer.flush, 10)
+
+def write_async(func, *args):
+    """
+    Запись в базу данных через общий поток записи
+
+    Args:
+        func (callable): Функция этого модуля, первым аргументом принимающая сессию
+        *args: Остальные аргументы функции
+
+    Returns:
+        Future: Результат функции
+    """
+    return db_writer.submit(func, *args)
 
 def get_or_create_user(db, user_id, username=None, first_name=None, last_name=None, language_code=None, is_premium=False):
     """Получение или создание пользователя"""
@@ -120,11 +312,99 @@ def get_or_create_user(db, user_id, username=None, first_name=None, last_name=No
         counter = RequestCounter(user_id=user_id)
         db.add(counter)
         
-        db.commit()
+        try:
+            db.commit()
+        except IntegrityError:
+            # Пользователя одновременно создал другой поток
+            db.rollback()
+            return db.query(User).filter(User.user_id == user_id).first()
         db.refresh(user)
     
     return user
 
+class UserSettingsCache:
+    """
+    Кэш настроек пользователей (словарей) с вытеснением давно не
+    использованных записей
+
+    update_user_settings и reset_user_settings записывают в кэш новые
+    настройки сразу после commit. Чтение из базы, начатое до такой записи,
+    не может положить в кэш устаревшие настройки: put с маркером проверяет,
+    что записей с момента получения маркера не было.
+    """
+
+    def __init__(self, size=USER_SETTINGS_CACHE_SIZE):
+        self.size = max(0, size)
+        self._items = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """
+        Получение настроек из кэша
+
+        Returns:
+            dict: Копия настроек или None, если их нет в кэше
+        """
+        with self._lock:
+            settings = self._items.get(user_id)
+            if settings is None:
+                return None
+            self._items.move_to_end(user_id)
+            return dict(settings)
+
+    def token(self):
+        """
+        Маркер для put перед чтением настроек из базы
+
+        Returns:
+            int: Номер последней записи в кэш
+        """
+        with self._lock:
+            return self._generation
+
+    def put(self, user_id, settings, token=None):
+        """
+        Сохранение настроек в кэш
+
+        Args:
+            user_id (int): ID пользователя
+            settings (dict): Настройки
+            token (int): Маркер из token(); None — запись новых настроек
+        """
+        with self._lock:
+            if token is None:
+                self._generation += 1
+            elif token != self._generation:
+                return
+
+            if self.size == 0:
+                return
+            self._items[user_id] = dict(settings)
+            self._items.move_to_end(user_id)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """
+        Удаление настроек пользователя из кэша
+        """
+        with self._lock:
+            self._generation += 1
+            self._items.pop(user_id, None)
+
+# Общий кэш настроек процесса
+user_settings_cache = UserSettingsCache()
+
+def settings_to_dict(settings):
+    """Преобразование настроек пользователя в словарь"""
+    return {
+        'tts_engine': settings.tts_engine,
+        'voice_type': settings.voice_type,
+        'language': settings.language,
+        'audio_format': settings.audio_format
+    }
+
 def get_user_settings(db, user_id):
     """Получение настроек пользователя"""
     settings = db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
@@ -146,16 +426,37 @@ def update_user_settings(db, user_id, **kwargs):
     
     db.commit()
     db.refresh(settings)
+    user_settings_cache.put(user_id, settings_to_dict(settings))
     return settings
 
-def create_task(db, user_id, task_id, text_length, file_name=None, estimated_time=None):
+def get_request_counter(db, user_id):
+    """Получение счетчика запросов пользователя"""
+    return db.query(RequestCounter).filter(RequestCounter.user_id == user_id).first()
+
+def save_request_counters(db, counters):
+    """Сохранение счетчиков запросов нескольких пользователей одной транзакцией"""
+    for user_id, hourly_count, daily_count, last_hourly_reset, last_daily_reset in counters:
+        db.merge(RequestCounter(
+            user_id=user_id,
+            hourly_count=hourly_count,
+            daily_count=daily_count,
+            last_hourly_reset=last_hourly_reset,
+            last_daily_reset=last_daily_reset
+        ))
+    db.commit()
+
+def create_task(db, user_id, task_id, text_length, file_name=None, estimated_time=None,
+                source_type=None, payload_path=None, settings=None):
     """Создание новой задачи"""
     task = Task(
         task_id=task_id,
         user_id=user_id,
         text_length=text_length,
         file_name=file_name,
-        estimated_time=estimated_time
+        estimated_time=estimated_time,
+        source_type=source_type,
+        payload_path=payload_path,
+        settings=json.dumps(settings) if settings is not None else None
     )
     
     db.add(task)
@@ -175,12 +476,168 @@ def update_task_status(db, task_id, status):
     
     return task
 
-def get_active_tasks(db, user_id):
-    """Получение активных задач пользователя"""
-    return db.query(Task).filter(
-        Task.user_id == user_id,
-        Task.status.in_(['pending', 'processing'])
+def claim_task(db, task_id, worker_id, lease_seconds):
+    """Атомарный захват ожидающей задачи обработчиком; возвращает номер попытки (0 — задача не захвачена)"""
+    now = datetime.utcnow()
+    claimed = db.query(Task).filter(
+        Task.task_id == task_id,
+        Task.status == 'pending'
+    ).update({
+        Task.status: 'processing',
+        Task.worker_id: worker_id,
+        Task.lease_expires_at: now + timedelta(seconds=lease_seconds),
+        Task.attempts: func.coalesce(Task.attempts, 0) + 1,
+        Task.updated_at: now
+    }, synchronize_session=False)
+    db.commit()
+    if claimed != 1:
+        return 0
+    return db.query(Task.attempts).filter(Task.task_id == task_id).scalar() or 1
+
+def requeue_task(db, task_id, max_attempts):
+    """Возврат обрабатываемой задачи в очередь, если у нее остались попытки"""
+    requeued = db.query(Task).filter(
+        Task.task_id == task_id,
+        Task.status == 'processing',
+        func.coalesce(Task.attempts, 0) < max_attempts
+    ).update({
+        Task.status: 'pending',
+        Task.worker_id: None,
+        Task.lease_expires_at: None,
+        Task.updated_at: datetime.utcnow()
+    }, synchronize_session=False)
+    db.commit()
+    return requeued == 1
+
+def extend_task_leases(db, task_ids, lease_seconds):
+    """Продление аренды обрабатываемых задач"""
+    if not task_ids:
+        return 0
+    
+    extended = db.query(Task).filter(
+        Task.task_id.in_(task_ids),
+        Task.status == 'processing'
+    ).update({
+        Task.lease_expires_at: datetime.utcnow() + timedelta(seconds=lease_seconds)
+    }, synchronize_session=False)
+    db.commit()
+    return extended
+
+def finish_task(db, task_id, status):
+    """Завершение задачи, если ее не отменили во время обработки"""
+    finished = db.query(Task).filter(
+        Task.task_id == task_id,
+        Task.status == 'processing'
+    ).update({
+        Task.status: status,
+        Task.lease_expires_at: None,
+        Task.updated_at: datetime.utcnow()
+    }, synchronize_session=False)
+    db.commit()
+    return finished == 1
+
+def update_task_progress(db, task_id, chunks_done, chapters_sent, chapter_part=1):
+    """Сохранение прогресса обработки книги"""
+    updated = db.query(Task).filter(
+        Task.task_id == task_id,
+        Task.status == 'processing'
+    ).update({
+        Task.chunks_done: chunks_done,
+        Task.chapters_sent: chapters_sent,
+        Task.chapter_part: chapter_part,
+        Task.updated_at: datetime.utcnow()
+    }, synchronize_session=False)
+    db.commit()
+    return updated == 1
+
+def cancel_task_row(db, task_id):
+    """Отмена задачи, которая еще ожидает или обрабатывается; возвращает ее прежний статус"""
+    for status in ('pending', 'processing'):
+        cancelled = db.query(Task).filter(
+            Task.task_id == task_id,
+            Task.status == status
+        ).update({
+            Task.status: 'cancelled',
+            Task.lease_expires_at: None,
+            Task.updated_at: datetime.utcnow()
+        }, synchronize_session=False)
+        db.commit()
+        if cancelled:
+            return status
+    return None
+
+def get_task_status(db, task_id):
+    """Получение статуса задачи"""
+    row = db.query(Task.status).filter(Task.task_id == task_id).first()
+    return row.status if row else None
+
+def get_cancelled_task_ids(db, task_ids):
+    """Получение ID отмененных задач из списка"""
+    if not task_ids:
+        return []
+    
+    rows = db.query(Task.task_id).filter(
+        Task.task_id.in_(task_ids),
+        Task.status == 'cancelled'
     ).all()
+    return [row.task_id for row in rows]
+
+def requeue_orphaned_tasks(db, worker_prefix=None, max_attempts=None):
+    """Возврат в очередь задач с истекшей арендой; возвращает (число возвращенных, ID задач, исчерпавших попытки)"""
+    condition = Task.lease_expires_at < datetime.utcnow()
+    if worker_prefix:
+        condition = condition | Task.worker_id.like(f"{worker_prefix}%")
+    orphaned = and_(Task.status == 'processing', condition | Task.lease_expires_at.is_(None))
+    now = datetime.utcnow()
+    
+    # Задача, которая каждый раз роняет процесс, не должна возвращаться бесконечно
+    failed_ids = []
+    if max_attempts:
+        exhausted = and_(orphaned, func.coalesce(Task.attempts, 0) >= max_attempts)
+        failed_ids = [row.task_id for row in db.query(Task.task_id).filter(exhausted).all()]
+        if failed_ids:
+            db.query(Task).filter(Task.task_id.in_(failed_ids), orphaned).update({
+                Task.status: 'failed',
+                Task.worker_id: None,
+                Task.lease_expires_at: None,
+                Task.updated_at: now
+            }, synchronize_session=False)
+    
+    requeued = db.query(Task).filter(orphaned).update({
+        Task.status: 'pending',
+        Task.worker_id: None,
+        Task.lease_expires_at: None,
+        Task.updated_at: now
+    }, synchronize_session=False)
+    db.commit()
+    return requeued, failed_ids
+
+def get_task_chunks(db, task_id):
+    """Получение озвученных частей задачи"""
+    return db.query(TaskChunk).filter(TaskChunk.task_id == task_id).all()
+
+def save_task_chunk(db, task_id, chunk_index, text_hash, artifact_path):
+    """Сохранение озвученной части задачи"""
+    db.merge(TaskChunk(
+        task_id=task_id,
+        chunk_index=chunk_index,
+        text_hash=text_hash,
+        artifact_path=artifact_path
+    ))
+    db.commit()
+
+def delete_task_chunks(db, task_id, chunk_indexes=None):
+    """Удаление озвученных частей задачи (всех или указанных)"""
+    query = db.query(TaskChunk).filter(TaskChunk.task_id == task_id)
+    if chunk_indexes is not None:
+        query = query.filter(TaskChunk.chunk_index.in_(list(chunk_indexes)))
+    deleted = query.delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def get_pending_tasks(db):
+    """Получение всех ожидающих задач в порядке создания"""
+    return db.query(Task).filter(Task.status == 'pending').order_by(Task.created_at).all()
 
 def get_user_tasks(db, user_id, status=None):
     """Получение задач пользователя с указанным статусом"""
@@ -200,4 +657,5 @@ def reset_user_settings(db, user_id):
     
     db.commit()
     db.refresh(settings)
+    user_settings_cache.put(user_id, settings_to_dict(settings))
     return settings
\ No newline at end of file
@@ -3,13 +3,9 @@
 """
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
-import config
-from app.db.database import get_db, get_user_settings, update_task_status, get_user_tasks
-from app.utils.queue_manager import add_to_queue, get_queue_position, can_make_request, update_request_counter, cancel_task
-from app.utils.text_splitter import split_text
-from app.utils.tts_converter import convert_text_to_speech
-from app.utils.audio_processor import process_audio
-import os
+from app.db.database import session_scope, update_task_status, get_user_tasks
+from app.utils.queue_manager import submit_task, is_queue_full, can_make_request, cancel_task
+from app.handlers.common import reply_task_submitted
 import logging
 
 logger = logging.getLogger(__name__)
@@ -24,12 +20,10 @@ def cancel_command(update: Update, context: CallbackContext):
     """
     user = update.effective_user
     
-    # Получаем сессию базы данных
-    db = get_db()
-    
     # Получаем активные задачи пользователя
-    tasks = get_user_tasks(db, user.id, status='processing')
-    pending_tasks = get_user_tasks(db, user.id, status='pending')
+    with session_scope() as db:
+        tasks = get_user_tasks(db, user.id, status='processing')
+        pending_tasks = get_user_tasks(db, user.id, status='pending')
     tasks.extend(pending_tasks)
     
     if not tasks:
@@ -72,15 +66,15 @@ def show_cancel_menu(update: Update, context: CallbackContext, tasks):
     # Создаем клавиатуру с кнопками
     keyboard = []
     for task in tasks:
-        task_info = f"Задача {task['task_id'][:8]}... "
-        if task['file_name']:
-            task_info += f"(Файл: {task['file_name']})"
+        task_info = f"Задача {task.task_id[:8]}... "
+        if task.file_name:
+            task_info += f"(Файл: {task.file_name})"
         else:
-            task_info += f"(Текст: {task['text_length']} символов)"
+            task_info += f"(Текст: {task.text_length} символов)"
         
         keyboard.append([InlineKeyboardButton(
             task_info,
-            callback_data=f"cancel_task_{task['task_id']}"
+            callback_data=f"cancel_task_{task.task_id}"
         )])
     keyboard.append([InlineKeyboardButton("Отменить все", callback_data="cancel_all")])
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -120,12 +114,10 @@ def cancel_callback(update: Update, context: CallbackContext):
             )
     
     elif data == "cancel_all":
-        # Получаем сессию базы данных
-        db = get_db()
-        
         # Отменяем все задачи пользователя
-        tasks = get_user_tasks(db, user.id, status='processing')
-        pending_tasks = get_user_tasks(db, user.id, status='pending')
+        with session_scope() as db:
+            tasks = get_user_tasks(db, user.id, status='processing')
+            pending_tasks = get_user_tasks(db, user.id, status='pending')
         tasks.extend(pending_tasks)
         
         canceled_count = 0
@@ -141,6 +133,7 @@ def cancel_callback(update: Update, context: CallbackContext):
         # Отмена обработки длинного текста
         if "pending_text" in context.user_data:
             del context.user_data["pending_text"]
+            context.user_data.pop("pending_source", None)
             query.edit_message_text(
                 "Обработка текста отменена."
             )
@@ -157,70 +150,33 @@ def cancel_callback(update: Update, context: CallbackContext):
             )
             return
         
-        text = context.user_data["pending_text"]
-        del context.user_data["pending_text"]
+        # С момента вопроса лимиты и очередь могли заполниться: текст
+        # остается в контексте, и подтвердить можно позже той же кнопкой
+        if not can_make_request(user.id, update.effective_chat.id):
+            query.edit_message_text(
+                "Вы превысили лимит запросов. Попробуйте подтвердить обработку позже.",
+                reply_markup=query.message.reply_markup
+            )
+            return
+        
+        if is_queue_full():
+            query.edit_message_text(
+                "Сервис временно загружен. Пожалуйста, подтвердите обработку через несколько минут.",
+                reply_markup=query.message.reply_markup
+            )
+            return
+        
+        text = context.user_data.pop("pending_text")
+        source_type, file_name = context.user_data.pop("pending_source", ("text", None))
         
         query.edit_message_text(
-            "Начинаю обработку текста..."
+            "Текст принят в обработку."
         )
         
-        # Добавление задачи в очередь
-        task_id = add_to_queue(user.id, text, "text")
-        position = get_queue_position(task_id)
-        
-        if position > 0:
-            query.message.reply_text(
-                f"Ваш запрос добавлен в очередь (позиция: {position}). "
-                f"Вы получите уведомление, когда обработка начнется."
-            )
-        else:
-            # Обновление счетчика запросов
-            update_request_counter(user.id)
-            
-            # Получение настроек пользователя из базы данных
-            db = get_db()
-            user_settings_obj = get_user_settings(db, user.id)
-            user_settings = {
-                'tts_engine': user_settings_obj.tts_engine,
-                'voice_type': user_settings_obj.voice_type,
-                'language': user_settings_obj.language,
-                'audio_format': user_settings_obj.audio_format
-            }
-            
-            # Разбиение текста на части
-            text_parts = split_text(text)
-            
-            # Конвертация текста в аудио
-            audio_files = []
-            for i, part in enumerate(text_parts):
-                part_label = f"Часть {i+1} из {len(text_parts)}" if len(text_parts) > 1 else None
-                audio_file = convert_text_to_speech(
-                    part, 
-                    language=user_settings.get("language", config.DEFAULT_LANGUAGE),
-                    voice_type=user_settings.get("voice_type", config.DEFAULT_VOICE_TYPE),
-                    tts_engine=user_settings.get("tts_engine", config.DEFAULT_TTS_ENGINE)
-                )
-                
-                # Обработка аудиофайла (форматирование, добавление метаданных)
-                processed_audio = process_audio(
-                    audio_file,
-                    title=part_label,
-                    output_format=user_settings.get("audio_format", config.DEFAULT_AUDIO_FORMAT)
-                )
-                audio_files.append(processed_audio)
-            
-            # Отправка аудиофайлов пользователю
-            for audio_file in audio_files:
-                with open(audio_file, "rb") as audio:
-                    query.message.reply_audio(
-                        audio=audio,
-                        title=f"Аудиокнига {audio_files.index(audio_file) + 1}/{len(audio_files)}"
-                    )
-                
-                # Удаление временного файла
-                os.remove(audio_file)
-            
-            query.message.reply_text("Обработка завершена!")
+        # Постановка задачи в очередь: озвучку выполняют воркеры
+        task_id, position = submit_task(user.id, text, source_type, file_name=file_name,
+                                        chat_id=update.effective_chat.id)
+        reply_task_submitted(query.message, position)
     
     # Логируем действие
     # Функция add_log отсутствует в database.py, поэтому закомментируем эту строку
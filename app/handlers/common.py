@@ -0,0 +1,20 @@
+"""
+Общие ответы обработчиков команд и сообщений
+"""
+import config
+
+def reply_task_submitted(message, position):
+    """
+    Ответ пользователю о постановке задачи на озвучку
+    
+    Args:
+        message (Message): Сообщение, на которое отвечаем
+        position (int): Позиция задачи в очереди
+    """
+    if position <= config.QUEUE_WORKERS:
+        message.reply_text("Начинаю обработку. Аудио придет, как только будет готово.")
+    else:
+        message.reply_text(
+            f"Ваш запрос добавлен в очередь (позиция: {position}). "
+            f"Аудио придет, когда обработка завершится."
+        )
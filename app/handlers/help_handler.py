@@ -33,7 +33,7 @@ def help_command(update: Update, context: CallbackContext):
 • PDF - документы PDF
 
 *Ограничения:*
-• Максимальный размер текста: 4000 символов
+• Тексты длиннее 4000 символов озвучиваются как книга и приходят по главам
 • Максимальный размер файла: 20 МБ
 
 *Как пользоваться:*
@@ -7,12 +7,9 @@ from telegram import Update, ParseMode
 from telegram.ext import CallbackContext
 import config
 from app.utils.file_processor import process_file, is_supported_file
-from app.utils.text_splitter import split_text
 from app.utils.lang_detector import detect_language
-from app.utils.queue_manager import add_to_queue, get_queue_position, is_queue_full, can_make_request, update_request_counter, get_user_settings
-from app.utils.tts_converter import convert_text_to_speech
-from app.utils.audio_processor import process_audio
-from app.db.database import get_db, get_user_settings as db_get_user_settings
+from app.utils.queue_manager import submit_task, is_queue_full, can_make_request
+from app.handlers.common import reply_task_submitted
 
 logger = logging.getLogger(__name__)
 
@@ -24,16 +21,16 @@ def process_text(update: Update, context: CallbackContext):
     text = update.message.text
     
     # Проверка ограничений по количеству запросов
-    if not can_make_request(user_id):
+    if not can_make_request(user_id, update.effective_chat.id):
         update.message.reply_text(
             "Вы превысили лимит запросов. Попробуйте повторить попытку позже."
         )
         return
     
-    # Проверка длины текста
-    if len(text) > config.MAX_TEXT_LENGTH:
+    # Проверка длины текста (длинные тексты озвучиваются в режиме книги)
+    if len(text) > config.BOOK_MAX_LENGTH:
         update.message.reply_text(
-            f"Текст слишком длинный (превышает {config.MAX_TEXT_LENGTH} символов). "
+            f"Текст слишком длинный (превышает {config.BOOK_MAX_LENGTH} символов). "
             "Пожалуйста, разделите его на несколько частей."
         )
         return
@@ -58,8 +55,9 @@ def process_text(update: Update, context: CallbackContext):
             "Не удалось однозначно определить язык текста. Пожалуйста, выберите язык вручную:",
             reply_markup={"inline_keyboard": keyboard}
         )
-        # Сохраняем текст в контексте для последующей обработки
+        # Сохраняем текст и его источник в контексте для последующей обработки
         context.user_data["pending_text"] = text
+        context.user_data["pending_source"] = ("text", None)
         return
     
     # Расчет предполагаемого времени обработки
@@ -78,69 +76,14 @@ def process_text(update: Update, context: CallbackContext):
             f"составляет примерно {int(estimated_time)} минут. Продолжить обработку?",
             reply_markup={"inline_keyboard": keyboard}
         )
-        # Сохраняем текст в контексте для последующей обработки
+        # Сохраняем текст и его источник в контексте для последующей обработки
         context.user_data["pending_text"] = text
+        context.user_data["pending_source"] = ("text", None)
         return
     
-    # Добавление задачи в очередь
-    task_id = add_to_queue(user_id, text, "text")
-    position = get_queue_position(task_id)
-    
-    if position > 0:
-        update.message.reply_text(
-            f"Ваш запрос добавлен в очередь (позиция: {position}). "
-            f"Вы получите уведомление, когда обработка начнется."
-        )
-    else:
-        update.message.reply_text("Начинаю обработку текста...")
-        
-        # Обновление счетчика запросов
-        update_request_counter(user_id)
-        
-        # Получение настроек пользователя из базы данных
-        db = get_db()
-        user_settings_obj = db_get_user_settings(db, user_id)
-        user_settings = {
-            'tts_engine': user_settings_obj.tts_engine,
-            'voice_type': user_settings_obj.voice_type,
-            'language': user_settings_obj.language,
-            'audio_format': user_settings_obj.audio_format
-        }
-        
-        # Разбиение текста на части
-        text_parts = split_text(text)
-        
-        # Конвертация текста в аудио
-        audio_files = []
-        for i, part in enumerate(text_parts):
-            part_label = f"Часть {i+1} из {len(text_parts)}" if len(text_parts) > 1 else None
-            audio_file = convert_text_to_speech(
-                part, 
-                language=user_settings.get("language", config.DEFAULT_LANGUAGE),
-                voice_type=user_settings.get("voice_type", config.DEFAULT_VOICE_TYPE),
-                tts_engine=user_settings.get("tts_engine", config.DEFAULT_TTS_ENGINE)
-            )
-            
-            # Обработка аудиофайла (форматирование, добавление метаданных)
-            processed_audio = process_audio(
-                audio_file,
-                title=part_label,
-                output_format=user_settings.get("audio_format", config.DEFAULT_AUDIO_FORMAT)
-            )
-            audio_files.append(processed_audio)
-        
-        # Отправка аудиофайлов пользователю
-        for audio_file in audio_files:
-            with open(audio_file, "rb") as audio:
-                update.message.reply_audio(
-                    audio=audio,
-                    title=f"Аудиокнига {audio_files.index(audio_file) + 1}/{len(audio_files)}"
-                )
-            
-            # Удаление временного файла
-            os.remove(audio_file)
-        
-        update.message.reply_text("Обработка завершена!")
+    # Постановка задачи в очередь: озвучку выполняют воркеры
+    task_id, position = submit_task(user_id, text, "text", chat_id=update.effective_chat.id)
+    reply_task_submitted(update.message, position)
 
 def process_document(update: Update, context: CallbackContext):
     """
@@ -150,7 +93,7 @@ def process_document(update: Update, context: CallbackContext):
     document = update.message.document
     
     # Проверка ограничений по количеству запросов
-    if not can_make_request(user_id):
+    if not can_make_request(user_id, update.effective_chat.id):
         update.message.reply_text(
             "Вы превысили лимит запросов. Попробуйте повторить попытку позже."
         )
@@ -196,10 +139,10 @@ def process_document(update: Update, context: CallbackContext):
         os.remove(file_path)
         return
     
-    # Проверка длины текста
-    if len(text) > config.MAX_TEXT_LENGTH:
+    # Проверка длины текста (длинные тексты озвучиваются в режиме книги)
+    if len(text) > config.BOOK_MAX_LENGTH:
         update.message.reply_text(
-            f"Текст в файле слишком длинный (превышает {config.MAX_TEXT_LENGTH} символов). "
+            f"Текст в файле слишком длинный (превышает {config.BOOK_MAX_LENGTH} символов). "
             "Пожалуйста, разделите его на несколько частей."
         )
         # Удаление временного файла
@@ -219,8 +162,9 @@ def process_document(update: Update, context: CallbackContext):
             "Не удалось однозначно определить язык текста. Пожалуйста, выберите язык вручную:",
             reply_markup={"inline_keyboard": keyboard}
         )
-        # Сохраняем текст в контексте для последующей обработки
+        # Сохраняем текст и его источник в контексте для последующей обработки
         context.user_data["pending_text"] = text
+        context.user_data["pending_source"] = ("file", file_name)
         # Удаление временного файла
         os.remove(file_path)
         return
@@ -241,71 +185,16 @@ def process_document(update: Update, context: CallbackContext):
             f"составляет примерно {int(estimated_time)} минут. Продолжить обработку?",
             reply_markup={"inline_keyboard": keyboard}
         )
-        # Сохраняем текст в контексте для последующей обработки
+        # Сохраняем текст и его источник в контексте для последующей обработки
         context.user_data["pending_text"] = text
+        context.user_data["pending_source"] = ("file", file_name)
         # Удаление временного файла
         os.remove(file_path)
         return
     
-    # Добавление задачи в очередь
-    task_id = add_to_queue(user_id, text, "file")
-    position = get_queue_position(task_id)
+    # Текст извлечен, исходный файл больше не нужен
+    os.remove(file_path)
     
-    if position > 0:
-        update.message.reply_text(
-            f"Ваш запрос добавлен в очередь (позиция: {position}). "
-            f"Вы получите уведомление, когда обработка начнется."
-        )
-    else:
-        update.message.reply_text("Начинаю обработку файла...")
-        
-        # Обновление счетчика запросов
-        update_request_counter(user_id)
-        
-        # Получение настроек пользователя из базы данных
-        db = get_db()
-        user_settings_obj = db_get_user_settings(db, user_id)
-        user_settings = {
-            'tts_engine': user_settings_obj.tts_engine,
-            'voice_type': user_settings_obj.voice_type,
-            'language': user_settings_obj.language,
-            'audio_format': user_settings_obj.audio_format
-        }
-        
-        # Разбиение текста на части
-        text_parts = split_text(text)
-        
-        # Конвертация текста в аудио
-        audio_files = []
-        for i, part in enumerate(text_parts):
-            part_label = f"Часть {i+1} из {len(text_parts)}" if len(text_parts) > 1 else None
-            audio_file = convert_text_to_speech(
-                part, 
-                language=user_settings.get("language", config.DEFAULT_LANGUAGE),
-                voice_type=user_settings.get("voice_type", config.DEFAULT_VOICE_TYPE),
-                tts_engine=user_settings.get("tts_engine", config.DEFAULT_TTS_ENGINE)
-            )
-            
-            # Обработка аудиофайла (форматирование, добавление метаданных)
-            processed_audio = process_audio(
-                audio_file,
-                title=part_label,
-                output_format=user_settings.get("audio_format", config.DEFAULT_AUDIO_FORMAT)
-            )
-            audio_files.append(processed_audio)
-        
-        # Отправка аудиофайлов пользователю
-        for audio_file in audio_files:
-            with open(audio_file, "rb") as audio:
-                update.message.reply_audio(
-                    audio=audio,
-                    title=f"Аудиокнига {audio_files.index(audio_file) + 1}/{len(audio_files)}"
-                )
-            
-            # Удаление временного файла
-            os.remove(audio_file)
-        
-        # Удаление исходного файла
-        os.remove(file_path)
-        
-        update.message.reply_text("Обработка завершена!")
\ No newline at end of file
+    # Постановка задачи в очередь: озвучку выполняют воркеры
+    task_id, position = submit_task(user_id, text, "file", file_name=file_name, chat_id=update.effective_chat.id)
+    reply_task_submitted(update.message, position)
@@ -3,7 +3,7 @@
 """
 from telegram import Update
 from telegram.ext import CallbackContext
-from app.db.database import get_db, reset_user_settings, get_user_settings
+from app.db.database import session_scope, reset_user_settings
 from app.handlers.settings_handler import (
     TTS_ENGINE_NAMES, VOICE_TYPE_NAMES, LANGUAGE_NAMES, AUDIO_FORMAT_NAMES
 )
@@ -18,14 +18,9 @@ def reset_command(update: Update, context: CallbackContext):
     """
     user = update.effective_user
     
-    # Получаем сессию базы данных
-    db = get_db()
-    
     # Сбрасываем настройки пользователя к значениям по умолчанию
-    reset_user_settings(db, user.id)
-    
-    # Получаем обновленные настройки
-    settings = get_user_settings(db, user.id)
+    with session_scope() as db:
+        settings = reset_user_settings(db, user.id)
     
     # Отправляем сообщение об успешном сбросе настроек
     update.message.reply_text(
@@ -6,18 +6,14 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
 
 from config import DEFAULT_TTS_ENGINE, DEFAULT_VOICE_TYPE, DEFAULT_LANGUAGE, DEFAULT_AUDIO_FORMAT
-from app.db.database import get_db, get_user_settings as db_get_user_settings, update_user_settings
+from app.db.database import session_scope, update_user_settings
 from app.utils.queue_manager import get_user_settings
+from app.utils.tts_engines import ENGINES, engine_titles
 
 logger = logging.getLogger(__name__)
 
 # Константы для настроек
-TTS_ENGINE_NAMES = {
-    'gtts': 'Google TTS (онлайн)',
-    'pyttsx3': 'pyttsx3 (оффлайн, высокое качество)',
-    'espeak': 'eSpeak (оффлайн)',
-    'festival': 'Festival (оффлайн)'
-}
+TTS_ENGINE_NAMES = {name: engine.title for name, engine in ENGINES.items()}
 
 VOICE_TYPE_NAMES = {
     'male': 'Мужской',
@@ -44,9 +40,8 @@ def settings_command(update: Update, context: CallbackContext):
     """
     user_id = update.effective_user.id
     
-    # Получение настроек пользователя из базы данных
-    db = get_db()
-    user_settings = db_get_user_settings(db, user_id)
+    # Получение настроек пользователя (из кэша)
+    user_settings = get_user_settings(user_id)
     
     # Создание клавиатуры
     keyboard = [
@@ -66,10 +61,10 @@ def settings_command(update: Update, context: CallbackContext):
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     # Формирование текста сообщения
-    tts_engine_name = TTS_ENGINE_NAMES.get(user_settings.tts_engine, DEFAULT_TTS_ENGINE)
-    voice_type_name = VOICE_TYPE_NAMES.get(user_settings.voice_type, DEFAULT_VOICE_TYPE)
-    language_name = LANGUAGE_NAMES.get(user_settings.language, DEFAULT_LANGUAGE)
-    audio_format_name = AUDIO_FORMAT_NAMES.get(user_settings.audio_format, DEFAULT_AUDIO_FORMAT)
+    tts_engine_name = TTS_ENGINE_NAMES.get(user_settings['tts_engine'], DEFAULT_TTS_ENGINE)
+    voice_type_name = VOICE_TYPE_NAMES.get(user_settings['voice_type'], DEFAULT_VOICE_TYPE)
+    language_name = LANGUAGE_NAMES.get(user_settings['language'], DEFAULT_LANGUAGE)
+    audio_format_name = AUDIO_FORMAT_NAMES.get(user_settings['audio_format'], DEFAULT_AUDIO_FORMAT)
     
     message = f"""
 *Текущие настройки:*
@@ -129,7 +124,8 @@ def show_tts_engine_settings(update: Update, context: CallbackContext):
     
     # Создание клавиатуры
     keyboard = []
-    for engine, name in TTS_ENGINE_NAMES.items():
+    # В меню только установленные движки
+    for engine, name in engine_titles().items():
         keyboard.append([InlineKeyboardButton(name, callback_data=f"set_tts_engine_{engine}")])
     
     keyboard.append([InlineKeyboardButton("Назад", callback_data="settings_back")])
@@ -213,8 +209,7 @@ def show_settings_menu(update: Update, context: CallbackContext):
     user_id = update.effective_user.id
     
     # Получение настроек пользователя
-    db = get_db()
-    user_settings = db_get_user_settings(db, user_id)
+    user_settings = get_user_settings(user_id)
     
     # Создание клавиатуры
     keyboard = [
@@ -234,10 +229,10 @@ def show_settings_menu(update: Update, context: CallbackContext):
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     # Формирование текста сообщения
-    tts_engine_name = TTS_ENGINE_NAMES.get(user_settings.tts_engine, DEFAULT_TTS_ENGINE)
-    voice_type_name = VOICE_TYPE_NAMES.get(user_settings.voice_type, DEFAULT_VOICE_TYPE)
-    language_name = LANGUAGE_NAMES.get(user_settings.language, DEFAULT_LANGUAGE)
-    audio_format_name = AUDIO_FORMAT_NAMES.get(user_settings.audio_format, DEFAULT_AUDIO_FORMAT)
+    tts_engine_name = TTS_ENGINE_NAMES.get(user_settings['tts_engine'], DEFAULT_TTS_ENGINE)
+    voice_type_name = VOICE_TYPE_NAMES.get(user_settings['voice_type'], DEFAULT_VOICE_TYPE)
+    language_name = LANGUAGE_NAMES.get(user_settings['language'], DEFAULT_LANGUAGE)
+    audio_format_name = AUDIO_FORMAT_NAMES.get(user_settings['audio_format'], DEFAULT_AUDIO_FORMAT)
     
     message = f"""
 *Текущие настройки:*
@@ -265,8 +260,8 @@ def set_tts_engine(update: Update, context: CallbackContext, tts_engine):
     user_id = update.effective_user.id
     
     # Обновление настроек пользователя
-    db = get_db()
-    update_user_settings(db, user_id, tts_engine=tts_engine)
+    with session_scope() as db:
+        update_user_settings(db, user_id, tts_engine=tts_engine)
     
     # Возврат к основным настройкам
     show_settings_menu(update, context)
@@ -279,8 +274,8 @@ def set_voice_type(update: Update, context: CallbackContext, voice_type):
     user_id = update.effective_user.id
     
     # Обновление настроек пользователя
-    db = get_db()
-    update_user_settings(db, user_id, voice_type=voice_type)
+    with session_scope() as db:
+        update_user_settings(db, user_id, voice_type=voice_type)
     
     # Возврат к основным настройкам
     show_settings_menu(update, context)
@@ -293,8 +288,8 @@ def set_language(update: Update, context: CallbackContext, language):
     user_id = update.effective_user.id
     
     # Обновление настроек пользователя
-    db = get_db()
-    update_user_settings(db, user_id, language=language)
+    with session_scope() as db:
+        update_user_settings(db, user_id, language=language)
     
     # Возврат к основным настройкам
     show_settings_menu(update, context)
@@ -307,8 +302,8 @@ def set_audio_format(update: Update, context: CallbackContext, audio_format):
     user_id = update.effective_user.id
     
     # Обновление настроек пользователя
-    db = get_db()
-    update_user_settings(db, user_id, audio_format=audio_format)
+    with session_scope() as db:
+        update_user_settings(db, user_id, audio_format=audio_format)
     
     # Возврат к основным настройкам
     show_settings_menu(update, context)
@@ -321,12 +316,12 @@ def reset_settings(update: Update, context: CallbackContext):
     user_id = update.effective_user.id
     
     # Сброс настроек пользователя
-    db = get_db()
-    update_user_settings(db, user_id, 
-                        tts_engine=DEFAULT_TTS_ENGINE,
-                        voice_type=DEFAULT_VOICE_TYPE,
-                        language=DEFAULT_LANGUAGE,
-                        audio_format=DEFAULT_AUDIO_FORMAT)
+    with session_scope() as db:
+        update_user_settings(db, user_id, 
+                            tts_engine=DEFAULT_TTS_ENGINE,
+                            voice_type=DEFAULT_VOICE_TYPE,
+                            language=DEFAULT_LANGUAGE,
+                            audio_format=DEFAULT_AUDIO_FORMAT)
     
     # Возврат к основным настройкам
     show_settings_menu(update, context)
\ No newline at end of file
@@ -2,14 +2,251 @@
 Модуль для обработки аудиофайлов
 """
 import os
+import shutil
+import subprocess
+import uuid
 import logging
 from config import AUDIO_BITRATE, AUDIO_SAMPLE_RATE, DEFAULT_AUDIO_FORMAT, TEMP_DIR
 
+# Импортируем ffmpeg-python с обработкой ошибок
+try:
+    import ffmpeg
+    FFMPEG_AVAILABLE = shutil.which('ffmpeg') is not None
+except ImportError:
+    FFMPEG_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Кодеки и контейнеры ffmpeg для поддерживаемых форматов
+AUDIO_CODECS = {
+    'mp3': ('libmp3lame', 'mp3'),
+    'ogg': ('libvorbis', 'ogg'),
+    'wav': ('pcm_s16le', 'wav'),
+    'm4a': ('aac', 'ipod')
+}
+
+# Формат частей, которые будут склеены: звук без сжатия, поэтому
+# merge_audio кодирует его в формат пользователя один раз
+MERGE_FORMAT = 'wav'
+
+# Кодек и формат, которые ffprobe сообщает для уже закодированного файла
+PROBE_NAMES = {
+    'mp3': ('mp3', 'mp3'),
+    'ogg': ('vorbis', 'ogg'),
+    'wav': ('pcm_s16le', 'wav'),
+    'm4a': ('aac', 'mp4')
+}
+
+def _metadata_args(title=None, artist=None, album=None):
+    """
+    Аргументы ffmpeg для записи тегов
+
+    Args:
+        title (str): Название трека
+        artist (str): Исполнитель
+        album (str): Альбом
+
+    Returns:
+        dict: Аргументы вида metadata:g:N
+    """
+    tags = [
+        f"{name}={value}"
+        for name, value in (('title', title), ('artist', artist), ('album', album))
+        if value
+    ]
+    return {f"metadata:g:{i}": tag for i, tag in enumerate(tags)}
+
+def _encoding_options(output_format):
+    """
+    Аргументы ffmpeg для кодирования в заданный формат
+
+    Args:
+        output_format (str): Формат выходного файла
+
+    Returns:
+        dict: Аргументы кодека, частоты дискретизации, битрейта и контейнера
+
+    Raises:
+        ValueError: Если формат не поддерживается
+    """
+    if output_format not in AUDIO_CODECS:
+        raise ValueError(f"Неподдерживаемый формат аудио: {output_format}")
+
+    codec, container = AUDIO_CODECS[output_format]
+    options = {
+        'acodec': codec,
+        'ar': AUDIO_SAMPLE_RATE,
+        'f': container
+    }
+    if output_format != 'wav':
+        options['audio_bitrate'] = AUDIO_BITRATE
+    return options
+
+def is_encoded_as(audio_file, output_format):
+    """
+    Проверка, что файл уже закодирован в нужном формате и с нужной
+    частотой дискретизации (перекодировать его не требуется)
+
+    Args:
+        audio_file (str): Путь к аудиофайлу
+        output_format (str): Формат
+
+    Returns:
+        bool: True, если файл можно отдать без перекодирования
+    """
+    if output_format not in PROBE_NAMES:
+        return False
+
+    try:
+        probe = ffmpeg.probe(audio_file)
+    except Exception as e:
+        logger.debug(f"Не удалось определить формат {audio_file}: {e}")
+        return False
+
+    streams = [stream for stream in probe.get('streams', []) if stream.get('codec_type') == 'audio']
+    if len(streams) != 1:
+        return False
+
+    codec_name, format_name = PROBE_NAMES[output_format]
+    return (
+        streams[0].get('codec_name') == codec_name
+        and int(streams[0].get('sample_rate', 0)) == AUDIO_SAMPLE_RATE
+        and format_name in probe.get('format', {}).get('format_name', '').split(',')
+    )
+
+def transcode_audio(audio_file, output_file, output_format=DEFAULT_AUDIO_FORMAT, title=None,
+                    artist=None, album=None, copy=False):
+    """
+    Перекодирование аудиофайла за один проход ffmpeg: смена формата,
+    частоты дискретизации и битрейта и запись тегов
+
+    Формат входного файла определяется по содержимому, поэтому WAV,
+    записанный движком под другим расширением, тоже будет перекодирован.
+
+    Args:
+        audio_file (str): Путь к исходному аудиофайлу
+        output_file (str): Путь к выходному файлу
+        output_format (str): Формат выходного файла
+        title (str): Название трека
+        artist (str): Исполнитель
+        album (str): Альбом
+        copy (bool): Не перекодировать звук, только переписать теги
+
+    Raises:
+        ValueError: Если формат не поддерживается
+        ffmpeg.Error: Если ffmpeg завершился с ошибкой
+    """
+    options = _encoding_options(output_format)
+    if copy:
+        options = {'acodec': 'copy', 'f': options['f']}
+    options['map_metadata'] = -1
+    options.update(_metadata_args(title, artist, album))
+
+    (
+        ffmpeg
+        .input(audio_file)
+        .output(output_file, vn=None, **options)
+        .run(quiet=True, overwrite_output=True)
+    )
+
+def encode_pipe(command, text, output_file, output_format=DEFAULT_AUDIO_FORMAT):
+    """
+    Запуск программы синтеза с передачей ее вывода в ffmpeg через канал
+
+    Текст подается программе на stdin, звук с ее stdout сразу кодируется
+    ffmpeg в выходной файл, так что промежуточный WAV на диск не пишется.
+
+    Args:
+        command (list): Команда синтеза, пишущая WAV в stdout
+        text (str): Текст для синтеза
+        output_file (str): Путь к выходному файлу
+        output_format (str): Формат выходного файла
+
+    Raises:
+        RuntimeError: Если программа синтеза или ffmpeg завершились с ошибкой
+    """
+    encoder_args = (
+        ffmpeg
+        .input('pipe:0')
+        .output(output_file, **_encoding_options(output_format))
+        .global_args('-loglevel', 'error')
+        .overwrite_output()
+        .compile()
+    )
+
+    source = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    encoder = subprocess.Popen(encoder_args, stdin=source.stdout, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # Канал теперь принадлежит ffmpeg: закрываем свою копию, чтобы он получил EOF
+    source.stdout.close()
+
+    try:
+        source.stdin.write(text.encode('utf-8'))
+        source.stdin.close()
+    except BrokenPipeError:
+        pass
+
+    source_error = source.stderr.read()
+    source.wait()
+    _, encoder_error = encoder.communicate()
+
+    if source.returncode != 0:
+        raise RuntimeError(f"{command[0]} завершился с кодом {source.returncode}: {source_error.decode('utf-8', errors='replace').strip()}")
+    if encoder.returncode != 0:
+        raise RuntimeError(f"ffmpeg завершился с кодом {encoder.returncode}: {encoder_error.decode('utf-8', errors='replace').strip()}")
+
+def encode_audio_bytes(audio, output_file, output_format=DEFAULT_AUDIO_FORMAT):
+    """
+    Кодирование звука из памяти (например, WAV от библиотеки синтеза)
+
+    Args:
+        audio (bytes): Исходный звук
+        output_file (str): Путь к выходному файлу
+        output_format (str): Формат выходного файла
+
+    Raises:
+        RuntimeError: Если ffmpeg завершился с ошибкой
+    """
+    try:
+        (
+            ffmpeg
+            .input('pipe:0')
+            .output(output_file, **_encoding_options(output_format))
+            .run(input=audio, quiet=True, overwrite_output=True)
+        )
+    except Exception as e:
+        stderr = getattr(e, 'stderr', None)
+        message = stderr.decode('utf-8', errors='replace').strip() if stderr else str(e)
+        raise RuntimeError(f"Ошибка при кодировании аудио: {message}")
+
+def save_audio_bytes(audio, output_file, output_format=DEFAULT_AUDIO_FORMAT):
+    """
+    Сохранение WAV из памяти в заданном формате
+
+    WAV (и любой формат без ffmpeg) записывается как есть, с частотой
+    дискретизации движка, без лишнего прохода ffmpeg.
+
+    Args:
+        audio (bytes): WAV от движка синтеза
+        output_file (str): Путь к выходному файлу
+        output_format (str): Формат выходного файла
+
+    Raises:
+        RuntimeError: Если ffmpeg завершился с ошибкой
+    """
+    if FFMPEG_AVAILABLE and output_format != 'wav':
+        encode_audio_bytes(audio, output_file, output_format)
+        return
+
+    with open(output_file, 'wb') as f:
+        f.write(audio)
+
 def process_audio(audio_file, title=None, artist=None, album=None, output_format=DEFAULT_AUDIO_FORMAT):
     """
-    Обработка аудиофайла (форматирование, добавление метаданных)
+    Обработка аудиофайла (перекодирование, добавление метаданных)
+    
+    Файл, уже закодированный в нужном формате, не перекодируется: если
+    теги не нужны, возвращается сам исходный файл, иначе звук копируется
+    в новый контейнер без декодирования.
     
     Args:
         audio_file (str): Путь к аудиофайлу
@@ -19,13 +256,23 @@ def process_audio(audio_file, title=None, artist=None, album=None, output_format
         output_format (str): Формат выходного файла
         
     Returns:
-        str: Путь к обработанному аудиофайлу
+        str: Путь к обработанному аудиофайлу (может совпадать с audio_file)
     """
     try:
         # Проверяем, что файл существует и не содержит ':Zone.Identifier'
         if not os.path.exists(audio_file) or ':Zone.Identifier' in audio_file:
             logger.error(f"Файл {audio_file} не существует или имеет неверный формат")
             return None
+        
+        if not FFMPEG_AVAILABLE:
+            # Без ffmpeg перекодировать нечем: отдаем файл как есть
+            logger.warning("ffmpeg не установлен, аудиофайл не перекодирован")
+            return audio_file
+        
+        encoded = is_encoded_as(audio_file, output_format)
+        if encoded and not any((title, artist, album)):
+            logger.debug(f"Аудиофайл {audio_file} не требует обработки")
+            return audio_file
             
         # Генерируем имя выходного файла
         output_file = os.path.join(
@@ -33,13 +280,172 @@ def process_audio(audio_file, title=None, artist=None, album=None, output_format
             f"{os.path.splitext(os.path.basename(audio_file))[0]}_processed.{output_format}"
         )
         
-        # Для демонстрации просто копируем файл
-        with open(audio_file, 'rb') as src:
-            with open(output_file, 'wb') as dst:
-                dst.write(src.read())
+        transcode_audio(audio_file, output_file, output_format, title=title, artist=artist, album=album, copy=encoded)
         
         logger.debug(f"Аудиофайл успешно обработан: {output_file}")
         return output_file
     except Exception as e:
-        logger.error(f"Ошибка при обработке аудиофайла: {e}")
-        return None  # В случае ошибки возвращаем None
\ No newline at end of file
+        # Для ошибок ffmpeg выводим его собственное сообщение
+        stderr = getattr(e, 'stderr', None)
+        details = stderr.decode('utf-8', errors='replace').strip() if stderr else e
+        logger.error(f"Ошибка при обработке аудиофайла: {details}")
+        return None  # В случае ошибки возвращаем None
+
+def audio_duration(audio_file):
+    """
+    Длительность аудиофайла
+
+    Args:
+        audio_file (str): Путь к аудиофайлу
+
+    Returns:
+        float: Длительность в секундах или None, если ее не удалось определить
+    """
+    if not FFMPEG_AVAILABLE:
+        return None
+
+    try:
+        return float(ffmpeg.probe(audio_file)['format']['duration'])
+    except Exception as e:
+        logger.debug(f"Не удалось определить длительность {audio_file}: {e}")
+        return None
+
+def _bits_per_second(output_format):
+    """
+    Битрейт закодированного звука
+
+    Args:
+        output_format (str): Формат
+
+    Returns:
+        int: Бит в секунду
+    """
+    if output_format == 'wav':
+        # 16-битный моно PCM
+        return AUDIO_SAMPLE_RATE * 16
+
+    bitrate = str(AUDIO_BITRATE).strip().lower()
+    multipliers = {'k': 1000, 'm': 1000000}
+    if bitrate[-1:] in multipliers:
+        return int(float(bitrate[:-1]) * multipliers[bitrate[-1]])
+    return int(bitrate)
+
+def estimate_encoded_size(audio_file, output_format=DEFAULT_AUDIO_FORMAT):
+    """
+    Оценка размера аудиофайла после кодирования в заданный формат
+
+    Args:
+        audio_file (str): Путь к аудиофайлу
+        output_format (str): Формат
+
+    Returns:
+        int: Размер в байтах (если длительность неизвестна — текущий размер файла)
+    """
+    duration = audio_duration(audio_file)
+    if duration is None:
+        return os.path.getsize(audio_file)
+    return int(duration * _bits_per_second(output_format) / 8)
+
+def _escape_metadata(value):
+    """
+    Экранирование значения для файла FFMETADATA
+
+    Args:
+        value (str): Значение
+
+    Returns:
+        str: Экранированное значение
+    """
+    for char in ('\\', '=', ';', '#', '\n'):
+        value = value.replace(char, '\\' + char)
+    return value
+
+def _write_chapters(audio_files, chapters, metadata_file):
+    """
+    Запись оглавления в файл FFMETADATA
+
+    Args:
+        audio_files (list): Пути к склеиваемым аудиофайлам
+        chapters (list): Пары (название главы, номер первого файла главы)
+        metadata_file (str): Путь к файлу метаданных
+    """
+    # Начало каждого файла в миллисекундах от начала склейки
+    offsets = [0]
+    for audio_file in audio_files:
+        offsets.append(offsets[-1] + int((audio_duration(audio_file) or 0) * 1000))
+
+    with open(metadata_file, 'w', encoding='utf-8') as f:
+        f.write(";FFMETADATA1\n")
+        for i, (chapter_title, first_file) in enumerate(chapters):
+            last_file = chapters[i + 1][1] if i + 1 < len(chapters) else len(audio_files)
+            f.write("[CHAPTER]\nTIMEBASE=1/1000\n")
+            f.write(f"START={offsets[first_file]}\nEND={offsets[last_file]}\n")
+            f.write(f"title={_escape_metadata(chapter_title)}\n")
+
+def merge_audio(audio_files, output_format=DEFAULT_AUDIO_FORMAT, title=None, artist=None, album=None, chapters=None):
+    """
+    Склейка частей в один файл за один проход ffmpeg
+
+    Части декодируются и склеиваются фильтром concat без пауз на стыках,
+    результат сразу кодируется в выходной формат с тегами и оглавлением.
+    Части для склейки синтезируются в MERGE_FORMAT (см. pipeline), так что
+    звук сжимается с потерями только здесь.
+    ffmpeg читает части с диска по мере склейки, поэтому память не зависит
+    от их количества. Без ffmpeg склеить части нечем, поэтому функция
+    сразу возвращает None, а вызывающий код отправляет части отдельно.
+
+    Args:
+        audio_files (list): Пути к аудиофайлам в порядке склейки
+        output_format (str): Формат выходного файла
+        title (str): Название трека
+        artist (str): Исполнитель
+        album (str): Альбом
+        chapters (list): Пары (название главы, номер первого файла главы)
+            для оглавления внутри файла
+
+    Returns:
+        str: Путь к итоговому аудиофайлу или None в случае ошибки
+    """
+    if not FFMPEG_AVAILABLE:
+        logger.error("ffmpeg не установлен, склейка аудиофайлов невозможна")
+        return None
+
+    output_file = os.path.join(TEMP_DIR, f"tts_{uuid.uuid4()}_merged.{output_format}")
+    metadata_file = None
+    try:
+        codec, container = AUDIO_CODECS[output_format]
+
+        args = ['ffmpeg', '-loglevel', 'error', '-y']
+        for audio_file in audio_files:
+            args += ['-i', audio_file]
+
+        if chapters:
+            metadata_file = os.path.join(TEMP_DIR, f"chapters_{uuid.uuid4()}.txt")
+            _write_chapters(audio_files, chapters, metadata_file)
+            args += ['-f', 'ffmetadata', '-i', metadata_file]
+            args += ['-map_chapters', str(len(audio_files))]
+
+        streams = ''.join(f"[{i}:a]" for i in range(len(audio_files)))
+        args += ['-filter_complex', f"{streams}concat=n={len(audio_files)}:v=0:a=1[out]", '-map', '[out]']
+        args += ['-map_metadata', '-1', '-acodec', codec, '-ar', str(AUDIO_SAMPLE_RATE)]
+        if output_format != 'wav':
+            args += ['-b:a', str(AUDIO_BITRATE)]
+        for name, value in (('title', title), ('artist', artist), ('album', album)):
+            if value:
+                args += ['-metadata', f"{name}={value}"]
+        args += ['-f', container, output_file]
+
+        result = subprocess.run(args, capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode('utf-8', errors='replace').strip())
+
+        logger.debug(f"Объединено аудиофайлов: {len(audio_files)}, результат: {output_file}")
+        return output_file
+    except Exception as e:
+        logger.error(f"Ошибка при объединении аудиофайлов: {e}")
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        return None
+    finally:
+        if metadata_file and os.path.exists(metadata_file):
+            os.remove(metadata_file)
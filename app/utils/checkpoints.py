@@ -0,0 +1,148 @@
+"""
+Модуль контрольных точек длинных задач: озвученные части сохраняются
+на диск и в базу данных, чтобы после перезапуска не синтезировать их заново
+"""
+import logging
+import os
+import shutil
+import threading
+from config import TASKS_DIR
+from app.db.database import session_scope, write_async, get_task_chunks, save_task_chunk, delete_task_chunks
+from app.utils.tts_cache import make_cache_key
+
+logger = logging.getLogger(__name__)
+
+def chunk_hash(text, settings):
+    """
+    Хэш части текста вместе с параметрами синтеза
+
+    Args:
+        text (str): Текст части
+        settings (dict): Настройки пользователя
+
+    Returns:
+        str: SHA-256 в шестнадцатеричном виде
+    """
+    return make_cache_key(
+        text,
+        settings['language'],
+        settings['voice_type'],
+        settings['tts_engine'],
+        settings['audio_format']
+    )
+
+class ChunkCheckpoints:
+    """
+    Озвученные части одной задачи
+
+    Файлы частей хранятся в TASKS_DIR/<ID задачи>/ (временная директория
+    очищается при запуске бота), а индекс части, хэш ее текста и путь к
+    файлу записываются в таблицу task_chunks через общий поток записи в
+    порядке вызовов. Часть считается готовой, только если совпадает хэш и
+    файл на месте, поэтому смена текста или настроек пользователя не
+    подставит чужое аудио.
+    """
+
+    def __init__(self, task_id):
+        """
+        Args:
+            task_id (str): ID задачи
+        """
+        self.task_id = task_id
+        self.directory = os.path.join(TASKS_DIR, task_id)
+        self._chunks = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """
+        Загрузка сохраненных частей из базы данных при первом обращении
+
+        Returns:
+            dict: Индекс части -> (хэш, путь к файлу)
+        """
+        with self._lock:
+            if self._chunks is None:
+                with session_scope() as db:
+                    rows = get_task_chunks(db, self.task_id)
+                self._chunks = {row.chunk_index: (row.text_hash, row.artifact_path) for row in rows}
+                if self._chunks:
+                    logger.info(f"Для задачи {self.task_id} найдено озвученных частей: {len(self._chunks)}")
+            return self._chunks
+
+    def get(self, index, text_hash):
+        """
+        Получение файла уже озвученной части
+
+        Args:
+            index (int): Номер части
+            text_hash (str): Хэш части (см. chunk_hash)
+
+        Returns:
+            str: Путь к файлу или None, если часть нужно синтезировать
+        """
+        saved = self._load().get(index)
+        if saved is None or saved[0] != text_hash:
+            return None
+
+        artifact_path = saved[1]
+        if not artifact_path or not os.path.exists(artifact_path):
+            return None
+
+        return artifact_path
+
+    def save(self, index, text_hash, audio_file):
+        """
+        Сохранение озвученной части
+
+        Файл переносится в директорию задачи. После clear (задача отменена
+        или завершена, а часть еще синтезировалась) файл удаляется.
+
+        Args:
+            index (int): Номер части
+            text_hash (str): Хэш части (см. chunk_hash)
+            audio_file (str): Путь к синтезированному файлу
+
+        Returns:
+            str: Новый путь к файлу части или None после clear
+        """
+        extension = os.path.splitext(audio_file)[1]
+        artifact_path = os.path.join(self.directory, f"{index:06d}{extension}")
+
+        with self._lock:
+            if self._closed:
+                os.remove(audio_file)
+                return None
+
+            os.makedirs(self.directory, exist_ok=True)
+            shutil.move(audio_file, artifact_path)
+            write_async(save_task_chunk, self.task_id, index, text_hash, artifact_path)
+            if self._chunks is not None:
+                self._chunks[index] = (text_hash, artifact_path)
+
+        return artifact_path
+
+    def discard(self, indexes):
+        """
+        Удаление частей, которые больше не нужны (например, после отправки главы)
+
+        Args:
+            indexes (iterable): Номера частей
+        """
+        indexes = list(indexes)
+        write_async(delete_task_chunks, self.task_id, indexes)
+        with self._lock:
+            for index in indexes:
+                saved = (self._chunks or {}).pop(index, None)
+                if saved and saved[1] and os.path.exists(saved[1]):
+                    os.remove(saved[1])
+
+    def clear(self):
+        """
+        Удаление всех частей задачи (новые части после этого не сохраняются)
+        """
+        with self._lock:
+            self._closed = True
+            self._chunks = {}
+            write_async(delete_task_chunks, self.task_id)
+            shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,99 @@
+"""
+Модуль синтеза речи через Coqui TTS
+"""
+import importlib.util
+import io
+import logging
+import threading
+import wave
+from config import COQUI_MODELS
+from app.utils.audio_processor import save_audio_bytes
+
+# Coqui TTS тянет за собой torch, поэтому при запуске только проверяем,
+# что он установлен, а импортируем при первой загрузке модели
+COQUI_AVAILABLE = importlib.util.find_spec('TTS') is not None
+
+logger = logging.getLogger(__name__)
+
+# Загруженные модели процесса: имя модели -> TTS
+_models = {}
+# Блокировки загрузки: имя модели -> Lock (загрузка одной модели не задерживает другие)
+_model_locks = {}
+_models_lock = threading.Lock()
+
+def get_model(model_name):
+    """
+    Загрузка модели Coqui TTS (выполняется один раз за процесс для каждой модели)
+
+    Args:
+        model_name (str): Имя модели (например, tts_models/en/ljspeech/vits)
+
+    Returns:
+        TTS: Модель
+
+    Raises:
+        RuntimeError: Если Coqui TTS не установлен
+    """
+    if not COQUI_AVAILABLE:
+        raise RuntimeError("Coqui TTS не установлен")
+
+    with _models_lock:
+        model = _models.get(model_name)
+        if model is not None:
+            return model
+        model_lock = _model_locks.setdefault(model_name, threading.Lock())
+
+    with model_lock:
+        model = _models.get(model_name)
+        if model is None:
+            from TTS.api import TTS
+
+            model = TTS(model_name=model_name, progress_bar=False, gpu=False)
+            # Модель синтезирует по одной части за раз
+            model.lock = threading.Lock()
+            with _models_lock:
+                _models[model_name] = model
+            logger.info(f"Загружена модель Coqui TTS {model_name}")
+        return model
+
+def coqui_model_for(language):
+    """
+    Модель Coqui TTS для языка
+
+    Args:
+        language (str): Язык
+
+    Returns:
+        str: Имя модели или None, если для языка нет модели
+    """
+    if not COQUI_AVAILABLE:
+        return None
+    return COQUI_MODELS.get(language)
+
+def save_coqui(text, model_name, file_path, audio_format):
+    """
+    Синтез речи через Coqui TTS с сохранением в файл
+
+    Args:
+        text (str): Текст
+        model_name (str): Имя модели
+        file_path (str): Путь к файлу
+        audio_format (str): Формат файла (без ffmpeg сохраняется WAV)
+    """
+    import numpy as np
+
+    model = get_model(model_name)
+    with model.lock:
+        samples = model.tts(text=text)
+        sample_rate = model.synthesizer.output_sample_rate
+
+    pcm = (np.clip(np.asarray(samples, dtype=np.float32), -1.0, 1.0) * 32767).astype('<i2')
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+
+    save_audio_bytes(buffer.getvalue(), file_path, audio_format)
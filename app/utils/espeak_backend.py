@@ -0,0 +1,211 @@
+"""
+Модуль синтеза речи через eSpeak
+
+Если в системе есть библиотека libespeak-ng (или libespeak), eSpeak
+работает внутри процесса: библиотека инициализируется и загружает голоса
+один раз, а каждая часть текста синтезируется вызовом espeak_Synth. Иначе
+запускается программа espeak без оболочки: текст передается через stdin,
+WAV читается из stdout.
+
+Библиотека не загружается в процесс, где движок pyttsx3 уже создан через
+драйвер espeak (обратный вызов синтеза у библиотеки один на процесс;
+pyttsx3 работает в своих процессах, см. worker_pool), а также в процесс
+бота при SYNTHESIS_PROCESSES=0, если ESPEAK_CONCURRENCY больше 1:
+вызовы библиотеки выполняются по одному, а программ espeak можно запустить
+несколько одновременно.
+"""
+import ctypes
+import ctypes.util
+import io
+import logging
+import shutil
+import subprocess
+import threading
+import wave
+from config import SYNTHESIS_PROCESSES, ENGINE_CONCURRENCY
+from app.utils.audio_processor import FFMPEG_AVAILABLE, encode_pipe, save_audio_bytes
+from app.utils.pyttsx3_pool import claim_libespeak, release_libespeak
+
+logger = logging.getLogger(__name__)
+
+# Программа eSpeak (eSpeak NG предпочтительнее)
+ESPEAK_COMMAND = shutil.which('espeak-ng') or shutil.which('espeak')
+
+# Библиотеки eSpeak в порядке предпочтения
+ESPEAK_LIBRARIES = ('espeak-ng', 'espeak')
+
+# Константы speak_lib.h
+AUDIO_OUTPUT_SYNCHRONOUS = 2
+POS_CHARACTER = 1
+ESPEAK_CHARS_UTF8 = 1
+EE_OK = 0
+
+# Функция обратного вызова: int callback(short *wav, int numsamples, espeak_EVENT *events)
+SYNTH_CALLBACK = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(ctypes.c_short), ctypes.c_int, ctypes.c_void_p)
+
+class LibEspeak:
+    """
+    Синтез через библиотеку eSpeak внутри процесса
+
+    Библиотека хранит состояние глобально, поэтому вызовы синтеза
+    выполняются по одному (в каждом процессе пула — свой экземпляр).
+    """
+
+    def __init__(self, library_path):
+        """
+        Args:
+            library_path (str): Путь или имя библиотеки для ctypes
+        """
+        self._lib = ctypes.CDLL(library_path)
+        self._lib.espeak_Initialize.restype = ctypes.c_int
+        self._lib.espeak_Initialize.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+        self._lib.espeak_SetVoiceByName.restype = ctypes.c_int
+        self._lib.espeak_SetVoiceByName.argtypes = [ctypes.c_char_p]
+        self._lib.espeak_Synth.restype = ctypes.c_int
+        self._lib.espeak_Synth.argtypes = [
+            ctypes.c_char_p, ctypes.c_size_t, ctypes.c_uint, ctypes.c_int,
+            ctypes.c_uint, ctypes.c_uint, ctypes.c_void_p, ctypes.c_void_p
+        ]
+
+        self.sample_rate = self._lib.espeak_Initialize(AUDIO_OUTPUT_SYNCHRONOUS, 0, None, 0)
+        if self.sample_rate <= 0:
+            raise RuntimeError("Не удалось инициализировать библиотеку eSpeak")
+
+        self._samples = []
+        # Ссылка на обратный вызов должна жить столько же, сколько библиотека
+        self._callback = SYNTH_CALLBACK(self._collect)
+        self._lib.espeak_SetSynthCallback(self._callback)
+        self._lock = threading.Lock()
+
+    def _collect(self, wav, numsamples, events):
+        """
+        Получение очередного блока звука от библиотеки
+        """
+        if wav and numsamples > 0:
+            self._samples.append(ctypes.string_at(wav, numsamples * 2))
+        return 0
+
+    def synthesize(self, text, voice):
+        """
+        Синтез текста в WAV
+
+        Args:
+            text (str): Текст
+            voice (str): Голос eSpeak (например, ru+m1)
+
+        Returns:
+            bytes: Содержимое WAV-файла (16 бит, моно)
+        """
+        data = text.encode('utf-8')
+
+        with self._lock:
+            if self._lib.espeak_SetVoiceByName(voice.encode('utf-8')) != EE_OK:
+                raise RuntimeError(f"В eSpeak нет голоса {voice}")
+
+            self._samples = []
+            result = self._lib.espeak_Synth(data, len(data) + 1, 0, POS_CHARACTER, 0, ESPEAK_CHARS_UTF8, None, None)
+            if result != EE_OK:
+                raise RuntimeError(f"eSpeak вернул код {result}")
+            samples, self._samples = b''.join(self._samples), []
+
+        if not samples:
+            raise RuntimeError("eSpeak не вернул звук")
+
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(samples)
+        return buffer.getvalue()
+
+# Библиотека процесса (False — загрузка еще не выполнялась)
+_library = False
+_library_lock = threading.Lock()
+
+def _library_unsuitable():
+    """
+    Причина, по которой библиотеку eSpeak нельзя загружать в этот процесс
+
+    Returns:
+        str: Причина или None, если библиотеку можно загрузить
+    """
+    if SYNTHESIS_PROCESSES <= 0 and ENGINE_CONCURRENCY.get('espeak', 1) > 1:
+        return "синтез выполняется в потоках, а библиотека синтезирует по одной части"
+    if not claim_libespeak('espeak'):
+        return "ее использует драйвер espeak у pyttsx3"
+    return None
+
+def get_library():
+    """
+    Загрузка библиотеки eSpeak (выполняется один раз за процесс)
+
+    Returns:
+        LibEspeak: Библиотека или None, если она недоступна
+    """
+    global _library
+
+    with _library_lock:
+        if _library is not False:
+            return _library
+
+        _library = None
+        reason = _library_unsuitable()
+        if reason:
+            logger.info(f"Библиотека eSpeak не используется ({reason}), используется программа espeak")
+            return _library
+
+        for name in ESPEAK_LIBRARIES:
+            path = ctypes.util.find_library(name)
+            if not path:
+                continue
+            try:
+                _library = LibEspeak(path)
+                logger.info(f"eSpeak работает через библиотеку {path}")
+                break
+            except Exception as e:
+                logger.warning(f"Не удалось загрузить библиотеку {path}: {e}")
+
+        if _library is None:
+            release_libespeak('espeak')
+            logger.info("Библиотека eSpeak не найдена, используется программа espeak")
+        return _library
+
+def warm_up_espeak():
+    """
+    Загрузка библиотеки eSpeak заранее, до первого запроса на синтез
+    """
+    get_library()
+
+def save_espeak(text, voice, file_path, audio_format):
+    """
+    Синтез речи через eSpeak с сохранением в файл
+
+    Args:
+        text (str): Текст
+        voice (str): Голос eSpeak (например, ru+m1)
+        file_path (str): Путь к файлу
+        audio_format (str): Формат файла (без ffmpeg сохраняется WAV)
+
+    Raises:
+        RuntimeError: Если eSpeak не установлен или синтез не удался
+    """
+    library = get_library()
+
+    if library is not None:
+        save_audio_bytes(library.synthesize(text, voice), file_path, audio_format)
+        return
+
+    if ESPEAK_COMMAND is None:
+        raise RuntimeError("eSpeak не установлен")
+
+    command = [ESPEAK_COMMAND, '-b', '1', '-v', voice, '--stdout']
+    if FFMPEG_AVAILABLE and audio_format != 'wav':
+        # WAV не пишется на диск: вывод eSpeak сразу кодируется ffmpeg
+        encode_pipe(command, text, file_path, audio_format)
+    else:
+        result = subprocess.run(command, input=text.encode('utf-8'), capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"espeak завершился с кодом {result.returncode}: {result.stderr.decode('utf-8', errors='replace').strip()}")
+        with open(file_path, 'wb') as f:
+            f.write(result.stdout)
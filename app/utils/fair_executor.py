@@ -0,0 +1,109 @@
+"""
+Модуль пула потоков с честным распределением между владельцами задач
+"""
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+class FairExecutor:
+    """
+    Пул потоков, обслуживающий очереди владельцев по кругу
+
+    У каждого владельца (например, пользователя) своя очередь, а потоки
+    берут работу по кругу: за один проход владелец с весом w получает до w
+    запусков подряд. Поэтому части длинного текста одного пользователя не
+    выстраиваются перед частями коротких текстов других пользователей, как
+    в обычной очереди ThreadPoolExecutor.
+
+    Работа с меньшим приоритетом выполняется раньше: как только у
+    свободного потока есть выбор, он берет ее, а круг владельцев с
+    большим приоритетом ждет. Уже запущенная работа не прерывается.
+    """
+
+    def __init__(self, max_workers, thread_name_prefix="fair"):
+        """
+        Args:
+            max_workers (int): Количество потоков
+            thread_name_prefix (str): Префикс имен потоков
+        """
+        self._queues = {}  # (приоритет, владелец) -> очередь (future, функция, аргументы)
+        self._weights = {}  # (приоритет, владелец) -> вес
+        self._credits = {}  # (приоритет, владелец) -> оставшиеся запуски в текущем проходе
+        self._rings = {}  # Приоритет -> владельцы с работой в порядке обхода
+        self._condition = threading.Condition()
+
+        for i in range(max(1, max_workers)):
+            thread = threading.Thread(target=self._run, name=f"{thread_name_prefix}_{i}")
+            thread.daemon = True
+            thread.start()
+
+    def submit(self, fn, *args, owner=None, weight=1, priority=0):
+        """
+        Постановка функции в очередь владельца
+
+        Args:
+            fn (callable): Функция
+            *args: Аргументы функции
+            owner: Владелец работы (None — общий владелец)
+            weight (int): Вес владельца (запусков за один проход)
+            priority (int): Приоритет (меньшее значение выполняется раньше)
+
+        Returns:
+            Future: Результат функции
+        """
+        future = Future()
+        with self._condition:
+            key = (priority, owner)
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+                self._rings.setdefault(priority, deque()).append(key)
+                self._credits[key] = max(1, int(weight))
+            self._weights[key] = max(1, int(weight))
+            queue.append((future, fn, args))
+            self._condition.notify()
+        return future
+
+    def _next(self):
+        """
+        Выбор следующей работы по кругу (вызывается под блокировкой)
+        """
+        priority = min(self._rings)
+        ring = self._rings[priority]
+        key = ring[0]
+        queue = self._queues[key]
+        item = queue.popleft()
+
+        if not queue:
+            # Владелец без работы выходит из круга и теряет остаток прохода
+            ring.popleft()
+            if not ring:
+                del self._rings[priority]
+            del self._queues[key]
+            del self._credits[key]
+            del self._weights[key]
+        else:
+            self._credits[key] -= 1
+            if self._credits[key] <= 0:
+                self._credits[key] = self._weights[key]
+                ring.rotate(-1)
+
+        return item
+
+    def _run(self):
+        """
+        Цикл потока пула
+        """
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._rings)
+                future, fn, args = self._next()
+
+            # Отмененная до запуска работа пропускается
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
@@ -0,0 +1,349 @@
+"""
+Модуль синтеза речи через постоянно запущенные серверы Festival
+"""
+import atexit
+import io
+import logging
+import shutil
+import socket
+import subprocess
+import threading
+import time
+import wave
+from contextlib import contextmanager
+from config import ENGINE_CONCURRENCY, FESTIVAL_TIMEOUT
+from app.utils.audio_processor import save_audio_bytes
+
+logger = logging.getLogger(__name__)
+
+# Программа Festival
+FESTIVAL_COMMAND = shutil.which('festival')
+
+# Маркер конца данных в протоколе сервера Festival (см. festival_client)
+FESTIVAL_KEY = b'ft_StUfF_key'
+
+class FestivalError(Exception):
+    """
+    Ошибка синтеза речи через сервер Festival
+    """
+
+def _free_port():
+    """
+    Поиск свободного TCP-порта на localhost
+
+    Returns:
+        int: Номер порта
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _quote(text):
+    """
+    Запись текста строковым литералом Scheme
+
+    Args:
+        text (str): Текст
+
+    Returns:
+        str: Текст в кавычках с экранированными \\ и "
+    """
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _join_waves(waves):
+    """
+    Склейка нескольких WAV в один
+
+    Args:
+        waves (list): Содержимое WAV-файлов с одинаковыми параметрами
+
+    Returns:
+        bytes: Содержимое склеенного WAV-файла
+    """
+    if len(waves) == 1:
+        return waves[0]
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as output:
+        for index, data in enumerate(waves):
+            with wave.open(io.BytesIO(data), 'rb') as part:
+                if index == 0:
+                    output.setparams(part.getparams())
+                output.writeframes(part.readframes(part.getnframes()))
+    return buffer.getvalue()
+
+class FestivalServer:
+    """
+    Процесс festival --server и постоянное соединение с ним
+
+    Festival загружает голос один раз при запуске сервера, поэтому на
+    каждую часть текста тратится только время синтеза.
+    """
+
+    def __init__(self, timeout=FESTIVAL_TIMEOUT):
+        """
+        Args:
+            timeout (float): Таймаут запуска сервера и синтеза одной части в секундах
+        """
+        if FESTIVAL_COMMAND is None:
+            raise FestivalError("Festival не установлен")
+
+        self.port = _free_port()
+        self.process = subprocess.Popen(
+            [
+                FESTIVAL_COMMAND,
+                f"(set! server_port {self.port})",
+                "(set! server_access_list '(\"localhost\" \"localhost.localdomain\" \"127.0.0.1\"))",
+                '--server'
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        self._buffer = b''
+
+        try:
+            self.sock = self._connect(timeout)
+            self.sock.settimeout(timeout)
+            # Сервер отдает звук в формате WAV (RIFF)
+            self._command("(Parameter.set 'Wavefiletype 'riff)")
+        except Exception:
+            self.close()
+            raise
+
+        logger.info(f"Запущен сервер Festival на порту {self.port}")
+
+    def _connect(self, timeout):
+        """
+        Ожидание запуска сервера и подключение к нему
+
+        Args:
+            timeout (float): Максимальное время ожидания в секундах
+
+        Returns:
+            socket.socket: Соединение с сервером
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.process.poll() is not None:
+                raise FestivalError(f"Сервер Festival завершился с кодом {self.process.returncode}")
+            try:
+                return socket.create_connection(('127.0.0.1', self.port), timeout=1)
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise FestivalError(f"Сервер Festival не запустился за {timeout:.0f} с")
+                time.sleep(0.1)
+
+    def _read(self, size):
+        """
+        Чтение заданного количества байт из соединения
+        """
+        while len(self._buffer) < size:
+            self._receive()
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def _read_until_key(self):
+        """
+        Чтение данных до маркера конца
+        """
+        while True:
+            position = self._buffer.find(FESTIVAL_KEY)
+            if position >= 0:
+                data = self._buffer[:position]
+                self._buffer = self._buffer[position + len(FESTIVAL_KEY):]
+                return data
+            self._receive()
+
+    def _receive(self):
+        """
+        Получение очередного блока данных от сервера
+        """
+        data = self.sock.recv(65536)
+        if not data:
+            raise FestivalError("Сервер Festival закрыл соединение")
+        self._buffer += data
+
+    def _command(self, expression):
+        """
+        Выполнение выражения Scheme на сервере
+
+        Args:
+            expression (str): Одно выражение Scheme
+
+        Returns:
+            list: Звук, отправленный сервером (содержимое WAV-файлов)
+
+        Raises:
+            FestivalError: Если сервер сообщил об ошибке
+        """
+        self.sock.sendall(expression.encode('utf-8') + b'\n')
+
+        waves = []
+        while True:
+            ack = self._read(3)
+            if ack == b'WV\n':
+                waves.append(self._read_until_key())
+            elif ack == b'LP\n':
+                self._read_until_key()
+            elif ack == b'ER\n':
+                raise FestivalError("Сервер Festival вернул ошибку")
+            elif ack == b'OK\n':
+                return waves
+            else:
+                raise FestivalError(f"Неизвестный ответ сервера Festival: {ack!r}")
+
+    def synthesize(self, text):
+        """
+        Синтез текста в WAV
+
+        Args:
+            text (str): Текст
+
+        Returns:
+            bytes: Содержимое WAV-файла
+        """
+        waves = self._command(f"(utt.send.wave.client (utt.synth (Utterance Text {_quote(text)})))")
+        if not waves:
+            raise FestivalError("Сервер Festival не вернул звук")
+        return _join_waves(waves)
+
+    def close(self):
+        """
+        Закрытие соединения и остановка сервера
+        """
+        sock = getattr(self, 'sock', None)
+        if sock is not None:
+            sock.close()
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+class FestivalServerPool:
+    """
+    Пул серверов Festival
+
+    Серверы запускаются при первом обращении, их число ограничено
+    количеством одновременно синтезируемых частей для Festival. Процесс
+    из пула синтеза выполняет по одной части за раз, поэтому в нем
+    запускается не больше одного сервера. Сервер, на котором произошла
+    ошибка, останавливается и будет запущен заново при следующем запросе.
+    Запрос, которому не хватило сервера, ждет освобождения или остановки
+    любого из них не дольше FESTIVAL_TIMEOUT секунд.
+    """
+
+    def __init__(self, size=ENGINE_CONCURRENCY.get('festival', 1), timeout=FESTIVAL_TIMEOUT):
+        """
+        Args:
+            size (int): Максимум серверов
+            timeout (float): Максимальное ожидание свободного сервера в секундах
+        """
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle = []
+        self._servers = set()  # Запущенные серверы (свободные и занятые)
+        self._count = 0  # Запущенные и запускаемые серверы
+        self._condition = threading.Condition()
+
+    def _acquire(self):
+        """
+        Получение свободного сервера или права запустить новый
+
+        Returns:
+            FestivalServer: Свободный сервер или None, если нужно запустить новый
+
+        Raises:
+            FestivalError: Если за timeout не освободился ни один сервер
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._count < self.size:
+                    # Место в пуле занимается до запуска, чтобы не превысить размер
+                    self._count += 1
+                    return None
+
+                # Ждем, пока сервер вернут в пул или остановят после ошибки
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise FestivalError(f"Нет свободного сервера Festival за {self.timeout:.0f} с")
+                self._condition.wait(remaining)
+
+    def _discard(self, server=None):
+        """
+        Освобождение места остановленного или не запустившегося сервера
+
+        Args:
+            server (FestivalServer): Остановленный сервер
+        """
+        with self._condition:
+            self._servers.discard(server)
+            self._count -= 1
+            self._condition.notify()
+
+    @contextmanager
+    def server(self):
+        """
+        Получение сервера из пула на время синтеза
+
+        Yields:
+            FestivalServer: Сервер
+        """
+        server = self._acquire()
+        if server is None:
+            try:
+                server = FestivalServer()
+            except Exception:
+                self._discard()
+                raise
+            with self._condition:
+                self._servers.add(server)
+
+        try:
+            yield server
+        except Exception:
+            server.close()
+            self._discard(server)
+            raise
+        else:
+            with self._condition:
+                self._idle.append(server)
+                self._condition.notify()
+
+    def close(self):
+        """
+        Остановка всех серверов
+        """
+        with self._condition:
+            servers = list(self._servers)
+            self._servers.clear()
+            self._idle = []
+            self._count = 0
+        for server in servers:
+            server.close()
+
+# Общий пул серверов процесса
+server_pool = FestivalServerPool()
+atexit.register(server_pool.close)
+
+def save_festival(text, file_path, audio_format):
+    """
+    Синтез речи через Festival с сохранением в файл
+
+    Args:
+        text (str): Текст
+        file_path (str): Путь к файлу
+        audio_format (str): Формат файла (без ffmpeg сохраняется WAV)
+
+    Raises:
+        FestivalError: Если Festival не установлен или синтез не удался
+    """
+    with server_pool.server() as server:
+        audio = server.synthesize(text)
+
+    save_audio_bytes(audio, file_path, audio_format)
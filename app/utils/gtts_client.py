@@ -0,0 +1,202 @@
+"""
+Модуль асинхронного клиента Google TTS с общим пулом соединений
+"""
+import asyncio
+import base64
+import logging
+import random
+import re
+import threading
+import gtts
+from config import (
+    GTTS_BASE_URL, GTTS_CONNECTIONS, GTTS_RATE_LIMIT,
+    GTTS_RETRIES, GTTS_TIMEOUT
+)
+
+# Импортируем aiohttp с обработкой ошибок
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Путь RPC-метода синтеза речи Google Translate
+GTTS_RPC_PATH = "/_/TranslateWebserverUi/data/batchexecute"
+
+# Фрагмент ответа с аудио в base64 (формат тот же, что разбирает gTTS.stream)
+AUDIO_PATTERN = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+
+# Коды ответа, после которых запрос имеет смысл повторить
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class GTTSError(Exception):
+    """
+    Ошибка синтеза речи через Google TTS
+    """
+
+class GTTSClient:
+    """
+    Клиент Google TTS на asyncio
+
+    Event loop работает в отдельном потоке и держит одну сессию aiohttp,
+    поэтому HTTPS-соединения переиспользуются между запросами. Части
+    текста (gTTS делит текст по ~100 символов) запрашиваются параллельно,
+    общий поток запросов ограничивается по частоте, а неудачные запросы
+    повторяются с экспоненциальной задержкой.
+    """
+
+    def __init__(self, base_url=GTTS_BASE_URL, connections=GTTS_CONNECTIONS,
+                 rate_limit=GTTS_RATE_LIMIT, retries=GTTS_RETRIES, timeout=GTTS_TIMEOUT):
+        """
+        Args:
+            base_url (str): Адрес сервиса (для тестов — адрес локальной заглушки)
+            connections (int): Максимум одновременных соединений
+            rate_limit (float): Максимум запросов в секунду (0 — без ограничения)
+            retries (int): Количество повторов неудачного запроса
+            timeout (float): Таймаут одного запроса в секундах
+        """
+        self.url = base_url.rstrip('/') + GTTS_RPC_PATH
+        self.connections = max(1, connections)
+        self.rate_limit = rate_limit
+        self.retries = retries
+        self.timeout = timeout
+        self._loop = None
+        self._session = None
+        self._rate_lock = None
+        self._next_request_at = 0.0
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        """
+        Запуск event loop в фоновом потоке при первом обращении
+        """
+        with self._start_lock:
+            if self._loop is not None:
+                return
+
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="gtts-client")
+            thread.daemon = True
+            thread.start()
+            asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+            self._loop = loop
+
+    async def _open(self):
+        """
+        Создание сессии aiohttp внутри event loop клиента
+        """
+        connector = aiohttp.TCPConnector(limit=self.connections)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers=gtts.gTTS.GOOGLE_TTS_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+        self._rate_lock = asyncio.Lock()
+
+    async def _throttle(self):
+        """
+        Ожидание очередного слота в пределах ограничения частоты запросов
+        """
+        if self.rate_limit <= 0:
+            return
+
+        async with self._rate_lock:
+            now = asyncio.get_running_loop().time()
+            wait = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at) + 1 / self.rate_limit
+
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _fetch_part(self, body):
+        """
+        Запрос аудио для одной части текста с повторами
+
+        Args:
+            body (str): Тело RPC-запроса, подготовленное gTTS
+
+        Returns:
+            bytes: Аудио в формате MP3
+        """
+        for attempt in range(self.retries + 1):
+            await self._throttle()
+            try:
+                async with self._session.post(self.url, data=body) as response:
+                    if response.status in RETRY_STATUSES:
+                        raise GTTSError(f"Google TTS вернул код {response.status}")
+                    if response.status != 200:
+                        # Остальные ошибки (например, 400 при неверном языке) повторять бесполезно
+                        raise ValueError(f"Google TTS вернул код {response.status}")
+                    content = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError, GTTSError) as e:
+                if attempt == self.retries:
+                    raise GTTSError(f"Запрос к Google TTS не удался после {attempt + 1} попыток: {e}")
+
+                delay = 0.5 * 2 ** attempt + random.uniform(0, 0.25)
+                logger.warning(f"Ошибка запроса к Google TTS ({e}), повтор через {delay:.2f} с")
+                await asyncio.sleep(delay)
+                continue
+
+            audio = b''
+            for line in content.splitlines():
+                match = AUDIO_PATTERN.search(line)
+                if match:
+                    audio += base64.b64decode(match.group(1))
+            if not audio:
+                raise GTTSError("В ответе Google TTS нет аудио")
+            return audio
+
+    async def _synthesize(self, bodies):
+        """
+        Параллельный запрос всех частей текста
+
+        Args:
+            bodies (list): Тела RPC-запросов
+
+        Returns:
+            bytes: Аудио всех частей в исходном порядке
+        """
+        parts = await asyncio.gather(*(self._fetch_part(body) for body in bodies))
+        return b''.join(parts)
+
+    def save(self, text, language, file_path):
+        """
+        Синтез речи и сохранение MP3 в файл
+
+        Args:
+            text (str): Текст
+            language (str): Язык
+            file_path (str): Путь к файлу
+
+        Raises:
+            GTTSError: Если сервис не вернул аудио
+        """
+        # Разбиение текста и упаковку запросов выполняет gTTS
+        bodies = gtts.gTTS(text=text, lang=language, slow=False).get_bodies()
+
+        self._ensure_started()
+        audio = asyncio.run_coroutine_threadsafe(self._synthesize(bodies), self._loop).result()
+
+        with open(file_path, 'wb') as f:
+            f.write(audio)
+
+# Общий клиент процесса
+gtts_client = GTTSClient() if AIOHTTP_AVAILABLE else None
+
+def save_gtts(text, language, file_path):
+    """
+    Синтез речи через Google TTS с сохранением в файл
+
+    Если aiohttp не установлен, используется синхронный gTTS.
+
+    Args:
+        text (str): Текст
+        language (str): Язык
+        file_path (str): Путь к файлу
+    """
+    if gtts_client is not None:
+        gtts_client.save(text, language, file_path)
+    else:
+        gtts.gTTS(text=text, lang=language, slow=False).save(file_path)
@@ -0,0 +1,136 @@
+"""
+Модуль упорядоченного индекса с порядковой статистикой
+"""
+import random
+
+class _Node:
+    """
+    Узел декартова дерева
+    """
+    __slots__ = ('key', 'priority', 'size', 'left', 'right')
+
+    def __init__(self, key):
+        self.key = key
+        self.priority = random.random()
+        self.size = 1
+        self.left = None
+        self.right = None
+
+def _size(node):
+    return node.size if node is not None else 0
+
+def _update(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+    return node
+
+def _split(node, key):
+    """
+    Разделение дерева на ключи меньше key и не меньше key
+    """
+    if node is None:
+        return None, None
+    if node.key < key:
+        left, right = _split(node.right, key)
+        node.right = left
+        return _update(node), right
+    left, right = _split(node.left, key)
+    node.left = right
+    return left, _update(node)
+
+def _merge(left, right):
+    """
+    Слияние деревьев, где все ключи left меньше ключей right
+    """
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _update(left)
+    right.left = _merge(left, right.left)
+    return _update(right)
+
+def _remove(node, key):
+    """
+    Удаление ключа из поддерева
+
+    Returns:
+        _Node: Новый корень поддерева
+    """
+    if node is None:
+        raise KeyError(key)
+    if key == node.key:
+        return _merge(node.left, node.right)
+    if key < node.key:
+        node.left = _remove(node.left, key)
+    else:
+        node.right = _remove(node.right, key)
+    return _update(node)
+
+class OrderIndex:
+    """
+    Упорядоченное множество уникальных сравнимых ключей
+
+    Декартово дерево (treap) с размерами поддеревьев: вставка, удаление,
+    наименьший ключ и номер ключа по порядку за O(log n) в среднем.
+    Потокобезопасность обеспечивает вызывающий код.
+    """
+
+    def __init__(self):
+        self._root = None
+
+    def __len__(self):
+        return _size(self._root)
+
+    def add(self, key):
+        """
+        Добавление ключа (ключа еще нет в индексе)
+        """
+        left, right = _split(self._root, key)
+        self._root = _merge(_merge(left, _Node(key)), right)
+
+    def remove(self, key):
+        """
+        Удаление ключа
+
+        Raises:
+            KeyError: Если ключа нет в индексе
+        """
+        self._root = _remove(self._root, key)
+
+    def first(self):
+        """
+        Наименьший ключ
+
+        Returns:
+            Ключ или None, если индекс пуст
+        """
+        node = self._root
+        if node is None:
+            return None
+        while node.left is not None:
+            node = node.left
+        return node.key
+
+    def rank(self, key):
+        """
+        Количество ключей меньше key
+
+        Args:
+            key: Ключ (не обязательно из индекса)
+
+        Returns:
+            int: Номер ключа по порядку, начиная с 0
+        """
+        rank = 0
+        node = self._root
+        while node is not None:
+            if key <= node.key:
+                if key == node.key:
+                    return rank + _size(node.left)
+                node = node.left
+            else:
+                rank += _size(node.left) + 1
+                node = node.right
+        return rank
@@ -0,0 +1,524 @@
+"""
+Модуль конвейера синтеза: параллельная озвучка частей текста и их сборка
+"""
+import os
+import uuid
+import shutil
+import logging
+from collections import deque
+from config import (
+    TEMP_DIR, CHUNK_WORKERS, CHUNK_PREFETCH,
+    STREAM_AUDIO_PARTS, BOOK_CHAPTER_LENGTH, TELEGRAM_MAX_UPLOAD_MB
+)
+from app.utils.text_splitter import split_text, iter_text_chunks
+from app.utils.tts_engines import get_engine
+from app.utils.worker_pool import synthesize
+from app.utils.audio_processor import FFMPEG_AVAILABLE, MERGE_FORMAT, process_audio, merge_audio, estimate_encoded_size
+from app.utils.checkpoints import chunk_hash
+from app.utils.fair_executor import FairExecutor
+
+logger = logging.getLogger(__name__)
+
+class TaskCancelled(Exception):
+    """
+    Задача отменена во время обработки
+    """
+
+# Общий пул потоков синтеза частей для всех задач: части разных
+# пользователей чередуются с учетом их веса
+_chunk_executor = FairExecutor(max_workers=CHUNK_WORKERS, thread_name_prefix="chunk")
+
+def _synthesize_part(text, settings):
+    """
+    Синтез одной части (лимит одновременных запросов к движку соблюдает
+    convert_text_to_speech)
+
+    Args:
+        text (str): Текст части
+        settings (dict): Настройки пользователя
+
+    Returns:
+        str: Путь к аудиофайлу или None в случае ошибки
+    """
+    return synthesize(
+        text,
+        language=settings['language'],
+        voice_type=settings['voice_type'],
+        tts_engine=settings['tts_engine'],
+        audio_format=settings['audio_format']
+    )
+
+def _merge_settings(settings):
+    """
+    Настройки синтеза частей, которые будут склеены
+
+    Такие части синтезируются в MERGE_FORMAT: merge_audio кодирует звук
+    в формат пользователя один раз, без повторного сжатия с потерями.
+    Без ffmpeg части не склеиваются и синтезируются сразу в формат
+    пользователя.
+
+    Args:
+        settings (dict): Настройки пользователя
+
+    Returns:
+        dict: Настройки для синтеза частей
+    """
+    if not FFMPEG_AVAILABLE:
+        return settings
+    return dict(settings, audio_format=MERGE_FORMAT)
+
+def _check_cancelled(cancelled):
+    """
+    Остановка обработки отмененной задачи
+
+    Args:
+        cancelled (threading.Event): Флаг отмены задачи или None
+
+    Raises:
+        TaskCancelled: Если задачу отменили
+    """
+    if cancelled is not None and cancelled.is_set():
+        raise TaskCancelled()
+
+def _discard_futures(futures, keep_results=False):
+    """
+    Отмена еще не начатых частей и удаление файлов уже запущенных
+
+    Args:
+        futures (iterable): Futures синтеза частей
+        keep_results (bool): Не удалять файлы запущенных частей (они
+            сохранены как контрольные точки)
+    """
+    def remove_result(future):
+        if not future.cancelled() and future.exception() is None:
+            remove_files([future.result()])
+
+    for future in futures:
+        if not future.cancel() and not keep_results:
+            future.add_done_callback(remove_result)
+
+def _iter_synthesized(items, synthesize_part, prefetch=CHUNK_PREFETCH, owner=None, weight=1, express=False,
+                      cancelled=None, keep_results=False):
+    """
+    Синтез частей с выдачей результатов по порядку по мере готовности
+
+    Части берутся из items лениво: одновременно в работе не больше
+    prefetch частей, поэтому длинный текст не держится в памяти целиком.
+    Генератор ждет только очередную по порядку часть, остальные в это
+    время озвучиваются. Если генератор закрыт досрочно, оставшиеся части
+    отменяются, а их файлы удаляются (кроме контрольных точек, см.
+    keep_results).
+
+    Части короткой задачи (express) ставятся в пул синтеза впереди частей
+    остальных задач: длинные задачи уступают ей потоки на границе частей.
+
+    Args:
+        items (iterable): Пары (метка, текст части)
+        synthesize_part (callable): Синтез части, принимает метку и текст
+            и возвращает путь к аудиофайлу
+        prefetch (int): Максимум частей в работе
+        owner: Владелец частей в пуле синтеза (ID пользователя)
+        weight (int): Вес владельца
+        express (bool): Короткая задача (см. QUEUE_SCHEDULING)
+        cancelled (threading.Event): Флаг отмены задачи
+        keep_results (bool): Не удалять файлы частей при досрочном закрытии
+            (synthesize_part сохраняет их как контрольные точки)
+
+    Yields:
+        tuple: (метка, путь к аудиофайлу или None, если часть не удалось озвучить)
+
+    Raises:
+        TaskCancelled: Если задачу отменили
+    """
+    items = iter(items)
+    pending = deque()
+    try:
+        while True:
+            _check_cancelled(cancelled)
+
+            # Пополняем окно частей в работе
+            while len(pending) < max(1, prefetch):
+                item = next(items, None)
+                if item is None:
+                    break
+                tag, part = item
+                pending.append((tag, _chunk_executor.submit(
+                    synthesize_part, tag, part, owner=owner, weight=weight, priority=0 if express else 1
+                )))
+
+            if not pending:
+                return
+
+            tag, future = pending.popleft()
+            try:
+                yield tag, future.result()
+            except Exception as e:
+                logger.error(f"Ошибка при синтезе части: {e}")
+                yield tag, None
+    finally:
+        _discard_futures((future for _, future in pending), keep_results=keep_results)
+
+def iter_synthesized_parts(parts, settings, owner=None, weight=1, express=False, cancelled=None):
+    """
+    Синтез частей текста с выдачей результатов по порядку по мере готовности
+
+    Args:
+        parts (iterable): Части текста
+        settings (dict): Настройки пользователя (tts_engine, voice_type, language, audio_format)
+        owner: Владелец частей в пуле синтеза (ID пользователя)
+        weight (int): Вес владельца
+        express (bool): Короткая задача (см. QUEUE_SCHEDULING)
+        cancelled (threading.Event): Флаг отмены задачи
+
+    Yields:
+        str: Путь к аудиофайлу части (None, если часть не удалось озвучить)
+    """
+    synthesized = _iter_synthesized(
+        ((None, part) for part in parts),
+        lambda tag, part: _synthesize_part(part, settings),
+        owner=owner,
+        weight=weight,
+        express=express,
+        cancelled=cancelled
+    )
+    try:
+        for _, audio_file in synthesized:
+            yield audio_file
+    finally:
+        synthesized.close()
+
+def remove_files(file_paths):
+    """
+    Удаление временных файлов
+
+    Args:
+        file_paths (list): Пути к файлам (None пропускаются)
+    """
+    for file_path in set(file_paths):
+        if file_path and os.path.exists(file_path):
+            try:
+                os.remove(file_path)
+            except Exception as e:
+                logger.error(f"Ошибка при удалении временного файла {file_path}: {e}")
+
+def _assemble(audio_files, settings, title=None, chapters=None, remove_inputs=True):
+    """
+    Сборка озвученных частей в один файл: склейка в исходном порядке,
+    кодирование, теги и оглавление за один проход
+
+    Промежуточные файлы удаляются в любом случае. Если файлы частей
+    сохраняются (контрольные точки), результат никогда не совпадает с
+    ними: вызывающий код удаляет его после отправки.
+
+    Args:
+        audio_files (list): Пути к аудиофайлам частей
+        settings (dict): Настройки пользователя
+        title (str): Название трека
+        chapters (list): Пары (название главы, номер первого файла главы)
+        remove_inputs (bool): Удалять ли файлы частей
+
+    Returns:
+        str: Путь к итоговому аудиофайлу или None в случае ошибки
+    """
+    if len(audio_files) == 1 and (not chapters or not FFMPEG_AVAILABLE):
+        audio_file = process_audio(audio_files[0], title=title, output_format=settings['audio_format'])
+    else:
+        audio_file = merge_audio(audio_files, output_format=settings['audio_format'], title=title, chapters=chapters)
+
+    if remove_inputs:
+        remove_files([path for path in audio_files if path != audio_file])
+    elif audio_file in audio_files:
+        # Файл части не перекодировался: отдаем жесткую ссылку на него,
+        # чтобы удаление после отправки не затронуло контрольную точку
+        link = os.path.join(TEMP_DIR, f"tts_{uuid.uuid4()}{os.path.splitext(audio_file)[1]}")
+        try:
+            os.link(audio_file, link)
+        except OSError:
+            shutil.copyfile(audio_file, link)
+        audio_file = link
+
+    return audio_file
+
+def _deliver_volumes(synthesized, settings, send_audio, title, chapter_markers=False,
+                     on_volume_sent=None, checkpoints=None, cancelled=None, chapters_sent=0, chapter_part=1):
+    """
+    Сборка озвученных частей в файлы не больше лимита Telegram и их отправка
+
+    Части копятся в текущем томе, пока его оценочный размер после
+    кодирования помещается в TELEGRAM_MAX_UPLOAD_MB; следующая часть,
+    которая не помещается, открывает новый том. Короткий текст поэтому
+    приходит одним файлом, а длинный делится только при необходимости.
+    Без ffmpeg склеить части нечем, и каждая часть отправляется отдельным
+    томом.
+
+    Args:
+        synthesized (iterator): Пары ((номер главы, номер части), путь к файлу)
+        settings (dict): Настройки пользователя
+        send_audio (callable): Функция отправки, принимает путь к файлу и название трека
+        title (str): Название
+        chapter_markers (bool): Записывать ли оглавление по главам в файл
+            (файлы тогда называются по главам, а глава, разделенная между
+            файлами, получает номер части)
+        on_volume_sent (callable): Вызывается после отправки тома с номером
+            последней главы, количеством озвученных частей текста и номером
+            части последней главы
+        checkpoints (ChunkCheckpoints): Контрольные точки задачи
+        cancelled (threading.Event): Флаг отмены задачи
+        chapters_sent (int): Последняя глава, отправленная (хотя бы частично)
+            до возобновления задачи
+        chapter_part (int): Номер отправленной части этой главы
+
+    Returns:
+        bool: True, если все тома отправлены, иначе False
+
+    Raises:
+        TaskCancelled: Если задачу отменили (неотправленные тома не отправляются)
+    """
+    limit = TELEGRAM_MAX_UPLOAD_MB * 1024 * 1024
+    volume = {'number': 0, 'files': [], 'indexes': [], 'chapters': [], 'size': 0, 'chapter': None, 'first_chapter': None}
+    # Последняя глава в отправленных томах и номер ее части
+    sent = {'chapter': chapters_sent or None, 'part': chapter_part or 1}
+
+    def send_volume(final, next_chapter=None):
+        _check_cancelled(cancelled)
+        volume['number'] += 1
+        if chapter_markers:
+            # Книга: файл называется по входящим в него главам, поэтому
+            # названия не зависят от того, возобновлялась ли задача
+            first_chapter, last_chapter = volume['first_chapter'], volume['chapter']
+            if first_chapter != last_chapter:
+                volume_title = f"{title}. Главы {first_chapter}–{last_chapter}"
+                part = 1
+            else:
+                # Глава, не поместившаяся в один файл, делится на части
+                part = sent['part'] + 1 if sent['chapter'] == first_chapter else 1
+                volume_title = f"{title}. Глава {first_chapter}"
+                if part > 1 or next_chapter == first_chapter:
+                    volume_title += f" (часть {part})"
+            sent.update(chapter=last_chapter, part=part)
+        elif final and volume['number'] == 1:
+            volume_title = title
+        else:
+            volume_title = f"{title}. Часть {volume['number']}"
+
+        audio_files, indexes = volume['files'], volume['indexes']
+        chapters = volume['chapters'] if chapter_markers else None
+        volume.update(files=[], indexes=[], chapters=[], size=0)
+
+        audio_file = _assemble(audio_files, settings, title=volume_title, chapters=chapters,
+                               remove_inputs=checkpoints is None)
+        if audio_file is None:
+            return False
+        try:
+            send_audio(audio_file, volume_title)
+        except Exception as e:
+            logger.error(f"Ошибка при отправке файла «{volume_title}»: {e}")
+            return False
+        finally:
+            remove_files([audio_file])
+
+        if on_volume_sent:
+            on_volume_sent(volume['chapter'], indexes[-1] + 1, sent['part'])
+        # Части отправленного тома больше не понадобятся
+        if checkpoints is not None:
+            checkpoints.discard(indexes)
+        return True
+
+    try:
+        for (chapter, index), audio_file in synthesized:
+            if audio_file is None:
+                return False
+
+            size = estimate_encoded_size(audio_file, settings['audio_format'])
+            if volume['files'] and (volume['size'] + size > limit or not FFMPEG_AVAILABLE):
+                if not send_volume(final=False, next_chapter=chapter):
+                    return False
+
+            # Глава начинается здесь или продолжается в новом томе
+            if not volume['files']:
+                volume['first_chapter'] = chapter
+            if chapter != volume['chapter'] or not volume['files']:
+                volume['chapters'].append((f"Глава {chapter}", len(volume['files'])))
+
+            volume['chapter'] = chapter
+            volume['files'].append(audio_file)
+            volume['indexes'].append(index)
+            volume['size'] += size
+
+        if volume['files'] and not send_volume(final=True):
+            return False
+    finally:
+        synthesized.close()
+        # Файлы контрольных точек остаются для возобновления задачи
+        if checkpoints is None:
+            remove_files(volume['files'])
+
+    return True
+
+def deliver_document(text, settings, send_audio, title="Аудиокнига", owner=None, weight=1, express=False,
+                     cancelled=None):
+    """
+    Озвучка текста с отправкой результата пользователю
+
+    Части склеиваются в один файл (делится, только если не помещается
+    в лимит Telegram). При включенном STREAM_AUDIO_PARTS текст из
+    нескольких частей отправляется по частям: каждая уходит сразу после
+    синтеза (в исходном порядке), пока следующие еще озвучиваются.
+
+    Args:
+        text (str): Текст для конвертации
+        settings (dict): Настройки пользователя (tts_engine, voice_type, language, audio_format)
+        send_audio (callable): Функция отправки, принимает путь к файлу и название трека
+        title (str): Название трека
+        owner: Владелец частей в пуле синтеза (ID пользователя)
+        weight (int): Вес владельца
+        express (bool): Короткая задача (см. QUEUE_SCHEDULING)
+        cancelled (threading.Event): Флаг отмены задачи
+
+    Returns:
+        bool: True, если все аудио отправлено, иначе False
+
+    Raises:
+        TaskCancelled: Если задачу отменили
+    """
+    parts = split_text(text, get_engine(settings['tts_engine']).chunk_length)
+
+    if len(parts) == 1 or not STREAM_AUDIO_PARTS:
+        # Единственная часть не склеивается: она синтезируется сразу в
+        # формат пользователя и может быть отдана без перекодирования
+        part_settings = settings if len(parts) == 1 else _merge_settings(settings)
+        synthesized = _iter_synthesized(
+            (((1, index), part) for index, part in enumerate(parts)),
+            lambda tag, part: _synthesize_part(part, part_settings),
+            owner=owner,
+            weight=weight,
+            express=express,
+            cancelled=cancelled
+        )
+        return _deliver_volumes(synthesized, settings, send_audio, title, cancelled=cancelled)
+
+    synthesized = iter_synthesized_parts(parts, settings, owner=owner, weight=weight, express=express,
+                                         cancelled=cancelled)
+    try:
+        for i, audio_file in enumerate(synthesized):
+            if audio_file is None:
+                return False
+
+            part_title = f"{title} {i + 1}/{len(parts)}"
+            try:
+                _check_cancelled(cancelled)
+            except TaskCancelled:
+                remove_files([audio_file])
+                raise
+            processed_audio = process_audio(audio_file, title=part_title, output_format=settings['audio_format'])
+            try:
+                if processed_audio is None:
+                    return False
+                send_audio(processed_audio, part_title)
+            except Exception as e:
+                logger.error(f"Ошибка при отправке части {i + 1}: {e}")
+                return False
+            finally:
+                remove_files([audio_file, processed_audio])
+    finally:
+        synthesized.close()
+
+    return True
+
+def _numbered_chunks(chunks, chapter_length, skip_chunks=0):
+    """
+    Разметка частей текста по главам
+
+    Глава заканчивается на первой части, после которой в ней набралось
+    не меньше chapter_length символов.
+
+    Args:
+        chunks (iterable): Части текста
+        chapter_length (int): Длина главы в символах
+        skip_chunks (int): Сколько первых частей пропустить
+
+    Yields:
+        tuple: ((номер главы, номер части), текст части)
+    """
+    chapter = 1
+    length = 0
+    for index, chunk in enumerate(chunks):
+        if length >= chapter_length:
+            chapter += 1
+            length = 0
+        length += len(chunk)
+
+        if index >= skip_chunks:
+            yield (chapter, index), chunk
+
+def deliver_book(stream, settings, send_audio, title="Аудиокнига", skip_chunks=0,
+                 on_volume_sent=None, checkpoints=None, owner=None, weight=1, cancelled=None,
+                 chapters_sent=0, chapter_part=1):
+    """
+    Озвучка книги с оглавлением по главам
+
+    Текст читается из потока и разбивается лениво, в работе одновременно
+    не больше CHUNK_PREFETCH частей. Части размечаются по главам
+    (BOOK_CHAPTER_LENGTH символов) и склеиваются в файлы с оглавлением;
+    файл отправляется, как только следующая часть перестает помещаться
+    в лимит Telegram, поэтому память не зависит от размера книги.
+
+    Args:
+        stream (str | file): Текст книги или открытый текстовый файл
+        settings (dict): Настройки пользователя (tts_engine, voice_type, language, audio_format)
+        send_audio (callable): Функция отправки, принимает путь к файлу и название трека
+        title (str): Название книги
+        skip_chunks (int): Сколько частей уже отправлено (при возобновлении задачи)
+        on_volume_sent (callable): Вызывается после отправки файла с номером
+            последней главы, количеством озвученных частей текста и номером
+            части последней главы
+        checkpoints (ChunkCheckpoints): Контрольные точки задачи; уже озвученные
+            части берутся из них, новые сохраняются в них
+        owner: Владелец частей в пуле синтеза (ID пользователя)
+        weight (int): Вес владельца
+        cancelled (threading.Event): Флаг отмены задачи
+        chapters_sent (int): Последняя глава, отправленная (хотя бы частично)
+            до возобновления задачи
+        chapter_part (int): Номер отправленной части этой главы
+
+    Returns:
+        bool: True, если вся книга отправлена, иначе False
+
+    Raises:
+        TaskCancelled: Если задачу отменили
+    """
+    chunks = iter_text_chunks(stream, get_engine(settings['tts_engine']).chunk_length)
+    part_settings = _merge_settings(settings)
+
+    def synthesize_chunk(tag, part):
+        if checkpoints is None:
+            return _synthesize_part(part, part_settings)
+
+        _, index = tag
+        text_hash = chunk_hash(part, part_settings)
+        artifact_path = checkpoints.get(index, text_hash)
+        if artifact_path is not None:
+            return artifact_path
+
+        audio_file = _synthesize_part(part, part_settings)
+        if audio_file is None:
+            return None
+        return checkpoints.save(index, text_hash, audio_file)
+
+    synthesized = _iter_synthesized(
+        _numbered_chunks(chunks, BOOK_CHAPTER_LENGTH, skip_chunks),
+        synthesize_chunk,
+        owner=owner,
+        weight=weight,
+        cancelled=cancelled,
+        keep_results=checkpoints is not None
+    )
+    return _deliver_volumes(
+        synthesized, settings, send_audio, title,
+        chapter_markers=True,
+        on_volume_sent=on_volume_sent,
+        checkpoints=checkpoints,
+        cancelled=cancelled,
+        chapters_sent=chapters_sent,
+        chapter_part=chapter_part
+    )
@@ -0,0 +1,209 @@
+"""
+Модуль пула заранее инициализированных движков pyttsx3
+"""
+import logging
+import queue
+import sys
+import threading
+from contextlib import contextmanager
+
+# Импортируем pyttsx3 с обработкой ошибок
+try:
+    import pyttsx3
+    PYTTSX3_AVAILABLE = True
+except ImportError:
+    PYTTSX3_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Драйверы в порядке проверки: по умолчанию, espeak, sapi5 (Windows), nsss (macOS)
+PYTTSX3_DRIVERS = (None, 'espeak', 'sapi5', 'nsss')
+
+# Результат определения драйвера (False — определение еще не выполнялось)
+_driver_name = False
+_driver_error = None
+_driver_lock = threading.Lock()
+
+# Кто в этом процессе использует libespeak: 'pyttsx3', 'espeak' или None
+_libespeak_user = None
+_libespeak_lock = threading.Lock()
+
+def claim_libespeak(user):
+    """
+    Закрепление libespeak за одним пользователем в процессе
+
+    На Linux у pyttsx3 есть только драйвер espeak, который загружает
+    libespeak-ng и регистрирует в ней свой обратный вызов синтеза.
+    Состояние библиотеки общее для процесса, поэтому библиотеку
+    использует тот, кто первым к ней обратился: драйвер pyttsx3 или
+    eSpeak внутри процесса (см. espeak_backend).
+
+    Args:
+        user (str): 'pyttsx3' или 'espeak'
+
+    Returns:
+        bool: True, если библиотека закреплена за user
+    """
+    global _libespeak_user
+
+    with _libespeak_lock:
+        if _libespeak_user is None:
+            _libespeak_user = user
+        return _libespeak_user == user
+
+def release_libespeak(user):
+    """
+    Освобождение libespeak, если ее так и не удалось загрузить
+
+    Args:
+        user (str): 'pyttsx3' или 'espeak'
+    """
+    global _libespeak_user
+
+    with _libespeak_lock:
+        if _libespeak_user == user:
+            _libespeak_user = None
+
+def _uses_libespeak():
+    """
+    Проверка, что драйвер pyttsx3 на этой платформе работает через libespeak
+    """
+    return sys.platform not in ('win32', 'darwin')
+
+def detect_driver():
+    """
+    Определение рабочего драйвера pyttsx3 (выполняется один раз за процесс)
+
+    Returns:
+        str: Имя драйвера (None — драйвер по умолчанию)
+
+    Raises:
+        RuntimeError: Если pyttsx3 не установлен или ни один драйвер не работает
+    """
+    global _driver_name, _driver_error
+
+    with _driver_lock:
+        if _driver_name is not False:
+            return _driver_name
+        if _driver_error is not None:
+            raise RuntimeError(_driver_error)
+
+        if not PYTTSX3_AVAILABLE:
+            raise RuntimeError("pyttsx3 не установлен")
+        if _uses_libespeak() and not claim_libespeak('pyttsx3'):
+            raise RuntimeError("libespeak в этом процессе уже использует eSpeak")
+
+        for driver_name in PYTTSX3_DRIVERS:
+            try:
+                pyttsx3.Engine(driver_name)
+                _driver_name = driver_name
+                logger.info(f"Для pyttsx3 выбран драйвер: {driver_name or 'по умолчанию'}")
+                return driver_name
+            except Exception as e:
+                logger.warning(f"Ошибка при инициализации pyttsx3 с драйвером {driver_name or 'по умолчанию'}: {e}")
+
+        release_libespeak('pyttsx3')
+        _driver_error = "Не удалось инициализировать pyttsx3 с известными драйверами"
+        raise RuntimeError(_driver_error)
+
+class Pyttsx3EnginePool:
+    """
+    Пул движков pyttsx3
+
+    Движки создаются напрямую через pyttsx3.Engine: pyttsx3.init возвращает
+    один и тот же экземпляр для драйвера, а он не потокобезопасен. Пул
+    держит сильные ссылки на движки, поэтому они не уничтожаются между
+    вызовами и задержка перед завершением работы не нужна.
+
+    По умолчанию в процессе один движок: движки драйвера espeak делят одно
+    состояние libespeak и не могут синтезировать одновременно. Параллельно
+    pyttsx3 работает в отдельных процессах (см. worker_pool).
+    """
+
+    def __init__(self, size=1):
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _create_engine(self):
+        """
+        Создание нового движка с заранее определенным драйвером
+        """
+        engine = pyttsx3.Engine(detect_driver())
+        engine.setProperty('rate', 150)  # Нормальная скорость
+        return engine
+
+    def warm_up(self, count=1):
+        """
+        Предварительное создание движков
+
+        Args:
+            count (int): Сколько движков создать (не больше размера пула)
+        """
+        for _ in range(min(count, self.size)):
+            with self._lock:
+                if self._created >= self.size:
+                    return
+                self._created += 1
+            try:
+                self._idle.put(self._create_engine())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+    @contextmanager
+    def engine(self):
+        """
+        Получение движка из пула на время синтеза
+
+        Движок, на котором произошла ошибка, не возвращается в пул и
+        будет пересоздан при следующем запросе.
+
+        Yields:
+            pyttsx3.Engine: Движок
+        """
+        try:
+            engine = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    engine = self._create_engine()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                engine = self._idle.get()
+
+        try:
+            yield engine
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        else:
+            self._idle.put(engine)
+
+# Общий пул движков процесса
+engine_pool = Pyttsx3EnginePool()
+
+def warm_up_engine_pool():
+    """
+    Подготовка пула движков при запуске процесса
+
+    Ошибки только логируются: при недоступном pyttsx3 синтез перейдет на
+    запасной движок.
+    """
+    if not PYTTSX3_AVAILABLE:
+        return
+
+    try:
+        engine_pool.warm_up()
+    except Exception as e:
+        logger.warning(f"Не удалось подготовить движки pyttsx3: {e}")
@@ -2,44 +2,663 @@
 Модуль для управления очередью задач
 """
 import logging
+import os
+import json
+import socket
+import threading
+import time
 import uuid
-from datetime import datetime
+from datetime import timezone
+from config import (
+    TASKS_DIR, TASK_LEASE_SECONDS, TASK_MAX_ATTEMPTS, CHARS_PER_MINUTE_PROCESSING, PREMIUM_WEIGHT,
+    QUEUE_SCHEDULING, QUEUE_MAX_SIZE, SHORT_JOB_LENGTH, SHORT_JOB_AGING
+)
+from app.db.database import (
+    session_scope, write_async, create_task, claim_task, requeue_task, extend_task_leases, finish_task,
+    requeue_orphaned_tasks, get_pending_tasks, update_task_status, cancel_task_row,
+    get_task_status, get_cancelled_task_ids,
+    update_task_progress, user_settings_cache, settings_to_dict,
+    get_user_settings as db_get_user_settings
+)
+from app.utils.checkpoints import ChunkCheckpoints
+from app.utils.order_index import OrderIndex
+from app.utils.rate_limiter import rate_limiter
+from app.utils.tts_engines import get_engine
 
 logger = logging.getLogger(__name__)
 
-# Очередь задач (в реальном проекте должна быть в базе данных)
-task_queue = []
+# Префикс идентификаторов обработчиков этого процесса
+WORKER_ID_PREFIX = f"{socket.gethostname()}:{os.getpid()}:"
 
-def add_to_queue(user_id, text, source_type):
+class TaskQueue:
+    """
+    Очередь задач с блокирующим ожиданием и индексом по ID
+
+    Обработчики ждут на условной переменной и просыпаются сразу после
+    добавления задачи. Взятая задача считается активной до вызова
+    task_done, поэтому она продолжает учитываться в размере очереди.
+
+    Задачи выдаются не в порядке поступления, а по взвешенной честной
+    очереди (WFQ) между пользователями: стоимость задачи — длина текста,
+    деленная на вес пользователя (см. task['weight']). Каждая задача
+    получает виртуальное время окончания
+
+        начало = max(V, окончание предыдущей задачи пользователя)
+        окончание = начало + длина текста / вес
+
+    и очередь выдает задачу с наименьшим временем окончания, а V
+    становится временем начала выданной задачи. Поэтому двадцать длинных
+    текстов одного пользователя не задерживают короткий текст другого,
+    а премиум-пользователь с весом 2 получает вдвое больше символов.
+
+    В режиме short_first очередь выдает задачу с наименьшим ожидаемым
+    временем синтеза (длина текста с учетом стоимости движка, деленная на
+    вес), из которого вычитается SHORT_JOB_AGING секунд за каждую секунду
+    ожидания, поэтому длинная задача не ждет бесконечно. Старение у всех
+    задач одинаковое, так что порядок задается постоянным ключом
+    «ожидаемое время + SHORT_JOB_AGING * момент поступления».
+
+    Ожидающие задачи хранятся в упорядоченном индексе по ключу
+    (окончание или ожидаемое время, номер поступления), а короткие — еще
+    и в отдельном таком же индексе (см. OrderIndex): постановка, выдача,
+    отмена и позиция задачи занимают O(log n) даже при тысячах задач.
+    Словари по ID задачи и по пользователю дают поиск за O(1).
+    """
+
+    def __init__(self, mode=QUEUE_SCHEDULING):
+        """
+        Args:
+            mode (str): Порядок выдачи задач: fair или short_first
+        """
+        if mode not in ('fair', 'short_first'):
+            logger.warning(f"Неизвестный режим очереди {mode}, используется fair")
+            mode = 'fair'
+        self.mode = mode
+        self._tasks = {}  # ID задачи -> задача (ожидающие и активные)
+        self._keys = {}  # ID ожидающей задачи -> ключ в _pending
+        self._pending = OrderIndex()  # Ключи (окончание, номер, ID задачи) ожидающих задач
+        self._express = OrderIndex()  # Ключи коротких задач из _pending
+        self._starts = {}  # ID ожидающей задачи -> виртуальное время начала
+        self._finish = {}  # ID пользователя -> виртуальное окончание его последней задачи
+        self._active = {}
+        self._by_user = {}  # ID пользователя -> {ID задачи: None} в порядке поступления
+        self._virtual_time = 0.0
+        self._sequence = 0
+        lock = threading.Lock()
+        self._condition = threading.Condition(lock)  # Появилась задача для любого обработчика
+        self._express_ready = threading.Condition(lock)  # Появилась короткая задача
+
+    def _schedule(self, task):
+        """
+        Вычисление виртуальных времен задачи и ее постановка в _pending
+        """
+        user_id = task['user_id']
+        start = max(self._virtual_time, self._finish.get(user_id, 0.0))
+        finish = start + max(1, task.get('text_length') or 0) / max(1, task.get('weight') or 1)
+        self._finish[user_id] = finish
+
+        if self.mode == 'short_first':
+            rank = _expected_seconds(task) / max(1, task.get('weight') or 1) + SHORT_JOB_AGING * _queued_at(task)
+        else:
+            rank = finish
+
+        self._sequence += 1
+        key = (rank, self._sequence, task['id'])
+        self._keys[task['id']] = key
+        self._starts[task['id']] = start
+        self._pending.add(key)
+        if task.get('express'):
+            self._express.add(key)
+
+    def _unschedule(self, task_id):
+        """
+        Удаление ожидающей задачи из _pending
+
+        Returns:
+            float: Виртуальное время начала задачи
+        """
+        key = self._keys.pop(task_id)
+        self._pending.remove(key)
+        if self._tasks[task_id].get('express'):
+            self._express.remove(key)
+        return self._starts.pop(task_id)
+
+    def _forget(self, task):
+        """
+        Удаление задачи из индексов по ID и по пользователю
+        """
+        del self._tasks[task['id']]
+        user_id = task['user_id']
+        user_tasks = self._by_user[user_id]
+        del user_tasks[task['id']]
+        if not user_tasks:
+            # Пользователь без задач начинает следующую с текущего виртуального времени
+            del self._by_user[user_id]
+            self._finish.pop(user_id, None)
+
+    def put(self, task):
+        """
+        Добавление задачи в очередь
+
+        Args:
+            task (dict): Задача (text_length и weight задают ее место в очереди)
+        """
+        with self._condition:
+            # Обработчик проверяет флаг между частями и томами
+            task.setdefault('cancelled', threading.Event())
+            self._tasks[task['id']] = task
+            self._by_user.setdefault(task['user_id'], {})[task['id']] = None
+            self._schedule(task)
+            # Короткую задачу может взять и экспресс-обработчик, поэтому
+            # будим по одному ожидающему каждого подходящего вида
+            self._condition.notify()
+            if task.get('express'):
+                self._express_ready.notify()
+
+    def _first(self, express_only):
+        """
+        Первая по порядку ожидающая задача (вызывается под блокировкой)
+
+        Args:
+            express_only (bool): Искать только короткие задачи (task['express'])
+
+        Returns:
+            dict: Задача или None
+        """
+        key = (self._express if express_only else self._pending).first()
+        return self._tasks[key[2]] if key is not None else None
+
+    def get(self, timeout=None, express_only=False):
+        """
+        Получение следующей задачи с ожиданием ее появления
+
+        Args:
+            timeout (float): Максимальное время ожидания в секундах (None — без ограничения)
+            express_only (bool): Брать только короткие задачи
+
+        Returns:
+            dict: Задача или None, если время ожидания истекло
+        """
+        ready = self._express_ready if express_only else self._condition
+        with ready:
+            if not ready.wait_for(lambda: self._first(express_only), timeout=timeout):
+                return None
+
+            task = self._first(express_only)
+            self._virtual_time = max(self._virtual_time, self._unschedule(task['id']))
+            task['status'] = 'processing'
+            self._active[task['id']] = task
+            return task
+
+    def task_done(self, task_id):
+        """
+        Завершение обработки задачи
+
+        Args:
+            task_id (str): ID задачи
+        """
+        with self._condition:
+            task = self._active.pop(task_id, None)
+            if task is not None:
+                self._forget(task)
+
+    def remove(self, task_id):
+        """
+        Удаление задачи из очереди (ожидающей или активной)
+
+        Обработчик активной задачи узнает об удалении по флагу
+        task['cancelled'] и останавливается на границе части.
+
+        Args:
+            task_id (str): ID задачи
+
+        Returns:
+            dict: Удаленная задача или None, если ее не было в очереди
+        """
+        with self._condition:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+
+            if task_id in self._active:
+                del self._active[task_id]
+            else:
+                self._unschedule(task_id)
+            self._forget(task)
+            task['cancelled'].set()
+            return task
+
+    def position(self, task_id):
+        """
+        Позиция задачи в очереди с учетом уже обрабатываемых задач
+
+        Args:
+            task_id (str): ID задачи
+
+        Returns:
+            int: Позиция в очереди (0, если задача не найдена)
+        """
+        with self._condition:
+            if task_id in self._active:
+                return 1
+
+            key = self._keys.get(task_id)
+            if key is None:
+                return 0
+
+            return len(self._active) + self._pending.rank(key) + 1
+
+    def user_tasks(self, user_id):
+        """
+        Задачи пользователя в порядке поступления
+
+        Args:
+            user_id (int): ID пользователя
+
+        Returns:
+            list: Задачи пользователя (ожидающие и активные)
+        """
+        with self._condition:
+            return [self._tasks[task_id] for task_id in self._by_user.get(user_id, ())]
+
+    def active_ids(self):
+        """
+        Список ID задач, которые сейчас обрабатываются
+
+        Returns:
+            list: ID активных задач
+        """
+        with self._condition:
+            return list(self._active)
+
+    def __contains__(self, task_id):
+        with self._condition:
+            return task_id in self._tasks
+
+    def __len__(self):
+        with self._condition:
+            return len(self._tasks)
+
+# Очередь задач в памяти; источником истины служит таблица tasks
+task_queue = TaskQueue()
+
+def _payload_path(task_id):
+    """
+    Путь к файлу с текстом задачи
+    
+    Args:
+        task_id (str): ID задачи
+        
+    Returns:
+        str: Путь к файлу
+    """
+    return os.path.join(TASKS_DIR, f"{task_id}.txt")
+
+def _remove_payload(task_id):
+    """
+    Удаление файла с текстом задачи и ее контрольных точек
+    
+    Args:
+        task_id (str): ID задачи
+    """
+    try:
+        os.remove(_payload_path(task_id))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error(f"Ошибка при удалении текста задачи {task_id}: {e}")
+    
+    try:
+        ChunkCheckpoints(task_id).clear()
+    except Exception as e:
+        logger.error(f"Ошибка при удалении контрольных точек задачи {task_id}: {e}")
+
+def _expected_seconds(task):
+    """
+    Ожидаемое время синтеза задачи
+
+    Args:
+        task (dict): Задача
+
+    Returns:
+        float: Время в секундах (по CHARS_PER_MINUTE_PROCESSING и стоимости движка)
+    """
+    engine = get_engine((task.get('settings') or {}).get('tts_engine'))
+    return (task.get('text_length') or 0) * engine.cost * 60 / CHARS_PER_MINUTE_PROCESSING
+
+def _queued_at(task):
+    """
+    Время постановки задачи в очередь
+
+    Берется из сохраненного created_at, поэтому задача, возвращенная в
+    очередь или загруженная после перезапуска, не теряет накопленное ожидание.
+
+    Args:
+        task (dict): Задача
+
+    Returns:
+        float: Время по часам UTC в секундах
+    """
+    created_at = task.get('created_at')
+    if created_at is None:
+        return time.time()
+    # created_at в базе хранится без часового пояса, в UTC (datetime.utcnow)
+    return created_at.replace(tzinfo=timezone.utc).timestamp()
+
+def _is_express(text_length):
+    """
+    Проверка, что задача идет через экспресс-обработчики
+
+    Args:
+        text_length (int): Длина текста
+
+    Returns:
+        bool: True в режиме short_first для текстов не длиннее SHORT_JOB_LENGTH
+    """
+    return QUEUE_SCHEDULING == 'short_first' and text_length <= SHORT_JOB_LENGTH
+
+def _user_weight(user):
+    """
+    Вес пользователя в честной очереди задач и частей
+    
+    Args:
+        user (User): Пользователь или None
+        
+    Returns:
+        int: PREMIUM_WEIGHT для премиум-пользователей, иначе 1
+    """
+    if user is not None and user.is_premium:
+        return max(1, PREMIUM_WEIGHT)
+    return 1
+
+def add_to_queue(user_id, text, source_type, file_name=None):
     """
     Добавление задачи в очередь
     
+    Текст сохраняется на диск, а задача записывается в таблицу tasks до
+    постановки в очередь в памяти, поэтому она переживает перезапуск бота.
+    В очереди хранится только путь к тексту: обработчик читает его сам.
+    
     Args:
         user_id (int): ID пользователя
         text (str): Текст для конвертации
         source_type (str): Тип источника (text/file)
+        file_name (str): Имя исходного файла
         
     Returns:
         str: ID задачи
     """
     task_id = str(uuid.uuid4())
+    payload_path = _payload_path(task_id)
+    
+    with open(payload_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    
+    # Настройки фиксируются при постановке в очередь, обработчик не читает их из базы
+    settings = get_user_settings(user_id)
+    
+    try:
+        with session_scope() as db:
+            row = create_task(
+                db, user_id, task_id,
+                text_length=len(text),
+                file_name=file_name,
+                estimated_time=int(len(text) / CHARS_PER_MINUTE_PROCESSING),
+                source_type=source_type,
+                payload_path=payload_path,
+                settings=settings
+            )
+            weight = _user_weight(row.user)
+            created_at = row.created_at
+    except Exception:
+        # Без строки в tasks текст никто не прочитает и не удалит
+        os.remove(payload_path)
+        raise
     
     task = {
         'id': task_id,
         'user_id': user_id,
-        'text': text,
+        'payload_path': payload_path,
+        'text_length': len(text),
         'source_type': source_type,
+        'settings': settings,
+        'weight': weight,
+        'express': _is_express(len(text)),
+        'chunks_done': 0,
+        'chapters_sent': 0,
+        'chapter_part': 1,
         'status': 'pending',
-        'created_at': datetime.now(),
-        'position': len(task_queue) + 1
+        'created_at': created_at
     }
     
-    task_queue.append(task)
+    task_queue.put(task)
     
     logger.info(f"Задача {task_id} добавлена в очередь для пользователя {user_id}")
     
     return task_id
 
+def submit_task(user_id, text, source_type, file_name=None, chat_id=None):
+    """
+    Постановка текста на озвучку
+    
+    Единая точка входа для обработчиков Telegram: задача только ставится
+    в очередь, а синтез, обработка и отправка аудио выполняются воркерами,
+    поэтому обработчик сразу возвращает управление диспетчеру.
+    
+    Args:
+        user_id (int): ID пользователя
+        text (str): Текст для конвертации
+        source_type (str): Тип источника (text/file)
+        file_name (str): Имя исходного файла
+        chat_id (int): ID чата (для лимита запросов чата)
+        
+    Returns:
+        tuple: (ID задачи, позиция в очереди)
+    """
+    task_id = add_to_queue(user_id, text, source_type, file_name=file_name)
+    update_request_counter(user_id, chat_id)
+    
+    return task_id, get_queue_position(task_id)
+
+def take_task(worker_name, express_only=False):
+    """
+    Ожидание и захват следующей задачи обработчиком
+    
+    Задача из очереди в памяти захватывается атомарным обновлением строки
+    в таблице tasks; если ее уже взял другой процесс или она была
+    отменена, обработчик переходит к следующей.
+    
+    Args:
+        worker_name (str): Имя обработчика
+        express_only (bool): Брать только короткие задачи (экспресс-обработчик)
+        
+    Returns:
+        dict: Захваченная задача (attempts — номер попытки ее обработки)
+        
+    Raises:
+        Exception: Если захват не удалось записать в базу (задача
+            возвращается в очередь)
+    """
+    worker_id = f"{WORKER_ID_PREFIX}{worker_name}"
+    
+    while True:
+        task = task_queue.get(express_only=express_only)
+        
+        try:
+            attempt = write_async(claim_task, task['id'], worker_id, TASK_LEASE_SECONDS).result()
+        except Exception:
+            # Захват не записался (например, база занята): задача возвращается
+            # в очередь, иначе она осталась бы активной до перезапуска
+            task_queue.task_done(task['id'])
+            if not task['cancelled'].is_set():
+                task_queue.put(task)
+            raise
+        if attempt:
+            task['attempts'] = attempt
+            return task
+        
+        logger.debug(f"Задача {task['id']} уже захвачена или отменена, пропускаем")
+        task_queue.task_done(task['id'])
+
+def complete_task(task_id, success=True, retry=False):
+    """
+    Завершение обработки задачи
+    
+    Неудачная задача с retry (книга, у которой не отправился том или не
+    озвучилась часть) возвращается в очередь, пока не исчерпаны
+    TASK_MAX_ATTEMPTS попыток: ее текст и озвученные части сохраняются,
+    и обработка продолжится с первой неотправленной части.
+    
+    Args:
+        task_id (str): ID задачи
+        success (bool): Успешно ли обработана задача
+        retry (bool): Вернуть ли неудачную задачу в очередь
+    """
+    task_queue.task_done(task_id)
+    
+    # Через общий поток записи, чтобы прогресс книги был записан раньше
+    if not success and retry and write_async(requeue_task, task_id, TASK_MAX_ATTEMPTS).result():
+        logger.info(f"Задача {task_id} возвращена в очередь для повторной попытки")
+        with session_scope() as db:
+            _load_pending_tasks(db)
+        return
+    
+    with session_scope() as db:
+        finished = finish_task(db, task_id, 'completed' if success else 'failed')
+        # Текст и части отмененной во время обработки задачи удаляет ее обработчик
+        cleanup = finished or get_task_status(db, task_id) == 'cancelled'
+    
+    if cleanup:
+        _remove_payload(task_id)
+
+def save_task_progress(task_id, chunks_done, chapters_sent, chapter_part=1):
+    """
+    Сохранение прогресса обработки книги
+    
+    Args:
+        task_id (str): ID задачи
+        chunks_done (int): Количество озвученных частей
+        chapters_sent (int): Номер последней отправленной (хотя бы частично) главы
+        chapter_part (int): Номер отправленной части этой главы
+    """
+    # Прогресс записывается часто, поэтому через общий поток записи
+    write_async(update_task_progress, task_id, chunks_done, chapters_sent, chapter_part)
+
+def restore_queue():
+    """
+    Восстановление очереди из базы данных при запуске
+    
+    Сразу возвращаются задачи с истекшей арендой и задачи предыдущего
+    процесса с тем же хостом и PID (например, после перезапуска контейнера).
+    Задачи других процессов этого хоста не трогаются: если процесс упал,
+    его задачи вернет в очередь истечение аренды.
+    
+    Returns:
+        int: Количество восстановленных задач
+    """
+    with session_scope() as db:
+        _report_requeued(*requeue_orphaned_tasks(db, worker_prefix=WORKER_ID_PREFIX, max_attempts=TASK_MAX_ATTEMPTS))
+        return _load_pending_tasks(db)
+
+def _report_requeued(requeued, failed_ids):
+    """
+    Обработка результата requeue_orphaned_tasks
+    
+    Текст и озвученные части задач, исчерпавших TASK_MAX_ATTEMPTS попыток,
+    удаляются.
+    
+    Args:
+        requeued (int): Количество возвращенных в очередь задач
+        failed_ids (list): ID задач, помеченных как failed
+        
+    Returns:
+        int: Количество возвращенных задач
+    """
+    if requeued:
+        logger.info(f"Возвращено в очередь прерванных задач: {requeued}")
+    
+    for task_id in failed_ids:
+        logger.error(f"Задача {task_id} не завершилась за {TASK_MAX_ATTEMPTS} попыток и помечена как failed")
+        _remove_payload(task_id)
+    
+    return requeued
+
+def _load_pending_tasks(db):
+    """
+    Загрузка ожидающих задач из базы данных в очередь в памяти
+    
+    Args:
+        db (Session): Сессия базы данных
+        
+    Returns:
+        int: Количество добавленных задач
+    """
+    restored = 0
+    for row in get_pending_tasks(db):
+        if row.task_id in task_queue:
+            continue
+        
+        if not row.payload_path or not os.path.exists(row.payload_path):
+            logger.error(f"Не найден текст задачи {row.task_id}")
+            update_task_status(db, row.task_id, 'failed')
+            continue
+        
+        task_queue.put({
+            'id': row.task_id,
+            'user_id': row.user_id,
+            'payload_path': row.payload_path,
+            'text_length': row.text_length,
+            'source_type': row.source_type,
+            'settings': json.loads(row.settings) if row.settings else None,
+            'weight': _user_weight(row.user),
+            'express': _is_express(row.text_length or 0),
+            'chunks_done': row.chunks_done or 0,
+            'chapters_sent': row.chapters_sent or 0,
+            'chapter_part': row.chapter_part or 1,
+            'status': 'pending',
+            'created_at': row.created_at
+        })
+        restored += 1
+    
+    if restored:
+        logger.info(f"Загружено задач из базы данных: {restored}")
+    
+    return restored
+
+def _keep_leases():
+    """
+    Продление аренды активных задач, остановка отмененных и возврат задач
+    с истекшей арендой
+    """
+    interval = max(1, TASK_LEASE_SECONDS // 3)
+    
+    while True:
+        time.sleep(interval)
+        try:
+            active_ids = task_queue.active_ids()
+            write_async(extend_task_leases, active_ids, TASK_LEASE_SECONDS).result()
+            
+            # Задачи, отмененные через другой процесс, останавливаются здесь
+            with session_scope() as db:
+                cancelled_ids = get_cancelled_task_ids(db, active_ids)
+            for task_id in cancelled_ids:
+                task_queue.remove(task_id)
+            
+            # Задачи других процессов, переставших продлевать аренду
+            if _report_requeued(*write_async(requeue_orphaned_tasks, None, TASK_MAX_ATTEMPTS).result()):
+                with session_scope() as db:
+                    _load_pending_tasks(db)
+        except Exception as e:
+            logger.error(f"Ошибка при продлении аренды задач: {e}")
+
+def start_lease_keeper():
+    """
+    Запуск фонового потока продления аренды задач
+    """
+    thread = threading.Thread(target=_keep_leases, name="task-lease-keeper")
+    thread.daemon = True
+    thread.start()
+
 def get_queue_position(task_id):
     """
     Получение позиции задачи в очереди
@@ -50,11 +669,7 @@ def get_queue_position(task_id):
     Returns:
         int: Позиция в очереди (0, если задача не найдена)
     """
-    for i, task in enumerate(task_queue):
-        if task['id'] == task_id:
-            return i + 1
-    
-    return 0
+    return task_queue.position(task_id)
 
 def is_queue_full():
     """
@@ -63,58 +678,60 @@ def is_queue_full():
     Returns:
         bool: True, если очередь заполнена, иначе False
     """
-    # Максимальный размер очереди (в реальном проекте должен быть в конфигурации)
-    max_queue_size = 100
-    
-    return len(task_queue) >= max_queue_size
+    return QUEUE_MAX_SIZE > 0 and len(task_queue) >= QUEUE_MAX_SIZE
 
-def can_make_request(user_id):
+def can_make_request(user_id, chat_id=None):
     """
     Проверка, может ли пользователь сделать запрос
     
+    Проверяются лимиты пользователя, чата и бота в целом (в памяти, без
+    обращения к базе данных, кроме первого запроса пользователя).
+    
     Args:
         user_id (int): ID пользователя
+        chat_id (int): ID чата
         
     Returns:
         bool: True, если пользователь может сделать запрос, иначе False
     """
-    # В реальном проекте здесь должна быть проверка лимитов запросов
-    return True
+    return rate_limiter.can_make_request(user_id, chat_id)
 
-def update_request_counter(user_id):
+def update_request_counter(user_id, chat_id=None):
     """
     Обновление счетчика запросов пользователя
     
+    Счетчики сохраняются в таблицу request_counters периодически.
+    
     Args:
         user_id (int): ID пользователя
+        chat_id (int): ID чата
     """
-    # В реальном проекте здесь должно быть обновление счетчика в базе данных
-    pass
+    rate_limiter.record(user_id, chat_id)
 
 def get_user_settings(user_id):
     """
     Получение настроек пользователя
     
+    Настройки берутся из кэша процесса, база данных читается только при
+    промахе.
+    
     Args:
         user_id (int): ID пользователя
         
     Returns:
         dict: Настройки пользователя
     """
-    # Импортируем здесь, чтобы избежать циклических импортов
-    from app.db.database import get_db, get_user_settings as db_get_user_settings
+    settings = user_settings_cache.get(user_id)
+    if settings is not None:
+        return settings
     
     # Получаем настройки из базы данных
-    db = get_db()
-    settings = db_get_user_settings(db, user_id)
-    
-    # Преобразуем объект настроек в словарь
-    return {
-        'tts_engine': settings.tts_engine,
-        'voice_type': settings.voice_type,
-        'language': settings.language,
-        'audio_format': settings.audio_format
-    }
+    token = user_settings_cache.token()
+    with session_scope() as db:
+        settings = settings_to_dict(db_get_user_settings(db, user_id))
+    
+    user_settings_cache.put(user_id, settings, token)
+    return settings
 
 def cancel_task(task_id):
     """
@@ -126,12 +743,20 @@ def cancel_task(task_id):
     Returns:
         bool: True, если задача успешно отменена, иначе False
     """
-    global task_queue
+    removed = task_queue.remove(task_id)
+    
+    # Задача может быть в очереди другого процесса, поэтому отменяем ее и в базе данных
+    with session_scope() as db:
+        previous_status = cancel_task_row(db, task_id)
     
-    for i, task in enumerate(task_queue):
-        if task['id'] == task_id:
-            task_queue.pop(i)
-            logger.info(f"Задача {task_id} отменена")
-            return True
+    if removed is None and previous_status is None:
+        return False
     
-    return False
\ No newline at end of file
+    # Обрабатываемая задача останавливается на границе части, а ее текст и
+    # озвученные части удаляет обработчик (см. complete_task), иначе он
+    # создал бы их заново
+    if previous_status != 'processing':
+        _remove_payload(task_id)
+    
+    logger.info(f"Задача {task_id} отменена")
+    return True
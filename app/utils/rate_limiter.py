@@ -0,0 +1,281 @@
+"""
+Модуль ограничения частоты запросов
+
+Проверка выполняется в памяти: корзины токенов для пользователя, чата и
+всего бота, а также часовой и суточный счетчики пользователя. Счетчики
+загружаются из таблицы request_counters при первом запросе пользователя и
+периодически сохраняются в нее одной транзакцией, поэтому лимиты
+переживают перезапуск бота.
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from config import (
+    USER_RATE_PER_MINUTE, USER_RATE_BURST, CHAT_RATE_PER_MINUTE, CHAT_RATE_BURST,
+    GLOBAL_RATE_PER_MINUTE, GLOBAL_RATE_BURST, HOURLY_REQUEST_LIMIT, DAILY_REQUEST_LIMIT,
+    RATE_LIMIT_FLUSH_SECONDS
+)
+from app.db.database import session_scope, write_async, get_request_counter, save_request_counters
+
+logger = logging.getLogger(__name__)
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+class TokenBucket:
+    """
+    Корзина токенов: запрос тратит токен, токены восстанавливаются
+    с постоянной скоростью до размера корзины
+
+    Пополнение вычисляется при обращении, фоновых таймеров нет.
+    """
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, per_minute, burst):
+        """
+        Args:
+            per_minute (float): Скорость восстановления (токенов в минуту, 0 — без ограничения)
+            burst (int): Размер корзины
+        """
+        self.rate = per_minute / 60
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now):
+        """
+        Проверка наличия токена без его расходования
+        """
+        if self.rate <= 0:
+            return True
+        self._refill(now)
+        return self.tokens >= 1
+
+    def take(self, now):
+        """
+        Расходование токена
+        """
+        if self.rate <= 0:
+            return
+        self._refill(now)
+        self.tokens = max(0.0, self.tokens - 1)
+
+    def full(self, now):
+        """
+        Проверка, что корзина восстановилась полностью (ее можно забыть)
+        """
+        if self.rate <= 0:
+            return True
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+class UserCounter:
+    """
+    Часовой и суточный счетчики пользователя (как в таблице request_counters)
+
+    Окно сбрасывается при первом обращении после его окончания.
+    """
+    __slots__ = ('hourly_count', 'daily_count', 'last_hourly_reset', 'last_daily_reset', 'dirty')
+
+    def __init__(self, row=None):
+        """
+        Args:
+            row (RequestCounter): Сохраненный счетчик или None
+        """
+        now = datetime.utcnow()
+        self.hourly_count = (row.hourly_count or 0) if row else 0
+        self.daily_count = (row.daily_count or 0) if row else 0
+        self.last_hourly_reset = (row.last_hourly_reset or now) if row else now
+        self.last_daily_reset = (row.last_daily_reset or now) if row else now
+        self.dirty = False
+
+    def _reset_expired(self, now):
+        if now - self.last_hourly_reset >= HOUR:
+            self.hourly_count = 0
+            self.last_hourly_reset = now
+            self.dirty = True
+        if now - self.last_daily_reset >= DAY:
+            self.daily_count = 0
+            self.last_daily_reset = now
+            self.dirty = True
+
+    def available(self, now):
+        """
+        Проверка, что лимиты часа и суток не исчерпаны
+        """
+        self._reset_expired(now)
+        if HOURLY_REQUEST_LIMIT > 0 and self.hourly_count >= HOURLY_REQUEST_LIMIT:
+            return False
+        if DAILY_REQUEST_LIMIT > 0 and self.daily_count >= DAILY_REQUEST_LIMIT:
+            return False
+        return True
+
+    def add(self, now):
+        """
+        Учет запроса
+        """
+        self._reset_expired(now)
+        self.hourly_count += 1
+        self.daily_count += 1
+        self.dirty = True
+
+    def row(self, user_id):
+        """
+        Значения для save_request_counters
+        """
+        return (user_id, self.hourly_count, self.daily_count, self.last_hourly_reset, self.last_daily_reset)
+
+class RateLimiter:
+    """
+    Ограничение частоты запросов пользователей, чатов и бота в целом
+
+    can_make_request только проверяет лимиты, record расходует их после
+    того, как запрос принят (отклоненные проверкой запросы не учитываются).
+    """
+
+    def __init__(self):
+        self._users = {}
+        self._user_buckets = {}
+        self._chat_buckets = {}
+        self._global_bucket = TokenBucket(GLOBAL_RATE_PER_MINUTE, GLOBAL_RATE_BURST)
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def _counter(self, user_id):
+        """
+        Счетчик пользователя (при первом обращении загружается из базы данных)
+
+        Вызывается без блокировки: чтение из базы не должно задерживать
+        проверки других пользователей.
+        """
+        counter = self._users.get(user_id)
+        if counter is not None:
+            return counter
+
+        with session_scope() as db:
+            counter = UserCounter(get_request_counter(db, user_id))
+
+        with self._lock:
+            return self._users.setdefault(user_id, counter)
+
+    def _user_bucket(self, user_id):
+        bucket = self._user_buckets.get(user_id)
+        if bucket is None:
+            bucket = self._user_buckets[user_id] = TokenBucket(USER_RATE_PER_MINUTE, USER_RATE_BURST)
+        return bucket
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(CHAT_RATE_PER_MINUTE, CHAT_RATE_BURST)
+        return bucket
+
+    def can_make_request(self, user_id, chat_id=None):
+        """
+        Проверка лимитов без их расходования
+
+        Args:
+            user_id (int): ID пользователя
+            chat_id (int): ID чата (None — не проверять лимит чата)
+
+        Returns:
+            bool: True, если запрос укладывается во все лимиты
+        """
+        counter = self._counter(user_id)
+        now = time.monotonic()
+
+        with self._lock:
+            if not counter.available(datetime.utcnow()):
+                return False
+            if not self._user_bucket(user_id).available(now):
+                return False
+            if chat_id is not None and not self._chat_bucket(chat_id).available(now):
+                return False
+            return self._global_bucket.available(now)
+
+    def record(self, user_id, chat_id=None):
+        """
+        Учет принятого запроса
+
+        Args:
+            user_id (int): ID пользователя
+            chat_id (int): ID чата
+        """
+        counter = self._counter(user_id)
+        now = time.monotonic()
+
+        with self._lock:
+            # flush мог убрать счетчик из памяти после его получения: возвращаем
+            # его на место, иначе запрос учтется в забытом объекте
+            counter = self._users.setdefault(user_id, counter)
+            counter.add(datetime.utcnow())
+            self._user_bucket(user_id).take(now)
+            if chat_id is not None:
+                self._chat_bucket(chat_id).take(now)
+            self._global_bucket.take(now)
+
+        self._ensure_flusher()
+
+    def flush(self):
+        """
+        Запись измененных счетчиков в базу данных и удаление из памяти
+        состояний, которые больше ничего не ограничивают
+
+        Returns:
+            Future: Результат записи или None, если записывать нечего
+        """
+        now = time.monotonic()
+        utcnow = datetime.utcnow()
+
+        with self._lock:
+            rows = []
+            for user_id, counter in self._users.items():
+                if counter.dirty:
+                    rows.append(counter.row(user_id))
+                    counter.dirty = False
+
+            # Сохраненные счетчики с истекшими окнами снова загрузятся из базы при необходимости
+            self._users = {
+                user_id: counter for user_id, counter in self._users.items()
+                if utcnow - counter.last_daily_reset < DAY and (counter.hourly_count or counter.daily_count)
+            }
+            self._user_buckets = {key: bucket for key, bucket in self._user_buckets.items() if not bucket.full(now)}
+            self._chat_buckets = {key: bucket for key, bucket in self._chat_buckets.items() if not bucket.full(now)}
+
+        if not rows:
+            return None
+
+        logger.debug(f"Запись счетчиков запросов в базу данных: {len(rows)}")
+        return write_async(save_request_counters, rows)
+
+    def _ensure_flusher(self):
+        """
+        Запуск фонового потока записи счетчиков при первом запросе
+        """
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._run_flusher, name="rate-limit-flush")
+            self._flusher.daemon = True
+            self._flusher.start()
+
+    def _run_flusher(self):
+        """
+        Цикл периодической записи счетчиков
+        """
+        while True:
+            time.sleep(max(1, RATE_LIMIT_FLUSH_SECONDS))
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка при записи счетчиков запросов: {e}")
+
+# Общий ограничитель процесса
+rate_limiter = RateLimiter()
+atexit.register(rate_limiter.flush)
@@ -7,6 +7,116 @@ from config import MAX_TEXT_LENGTH
 
 logger = logging.getLogger(__name__)
 
+# Размер блока, которым читается поток текста
+READ_BLOCK_SIZE = 64 * 1024
+
+# Границы, по которым режется текст, в порядке предпочтения:
+# (шаблон, резать по концу совпадения)
+BOUNDARIES = (
+    # Абзац: пустая строка
+    (re.compile(r'\n[ \t]*\n'), False),
+    # Конец предложения (с закрывающими кавычками и скобками)
+    (re.compile(r'[.!?…]+["\'»”)\]]*(?=\s)'), True),
+    # Конец части предложения
+    (re.compile(r'[,;:]["\'»”)\]]*(?=\s)|(?<=\s)[—–-](?=\s)'), True),
+    # Граница слова
+    (re.compile(r'\s'), False),
+)
+
+def _read_blocks(stream):
+    """
+    Чтение источника текста блоками
+
+    Args:
+        stream (str | file | iterable): Строка, текстовый файл или итератор строк
+
+    Yields:
+        str: Очередной блок текста
+    """
+    if isinstance(stream, str):
+        for start in range(0, len(stream), READ_BLOCK_SIZE):
+            yield stream[start:start + READ_BLOCK_SIZE]
+    elif hasattr(stream, 'read'):
+        for block in iter(lambda: stream.read(READ_BLOCK_SIZE), ''):
+            yield block
+    else:
+        yield from stream
+
+def _find_cut(buffer, start, max_length):
+    """
+    Поиск места разреза в окне buffer[start:start + max_length]
+
+    Сначала ищется последняя граница каждого уровня во второй половине
+    окна (чтобы не получать слишком короткие части), затем в любом месте
+    окна. Если границ нет совсем, слово режется по длине.
+
+    Args:
+        buffer (str): Буфер текста
+        start (int): Начало окна
+        max_length (int): Максимальная длина части
+
+    Returns:
+        int: Позиция разреза в буфере
+    """
+    # Символ после окна нужен для проверки (?=\s) на его границе
+    end = min(len(buffer), start + max_length + 1)
+    limit = start + max_length
+
+    for min_cut in (start + max_length // 2, start + 1):
+        for pattern, cut_at_end in BOUNDARIES:
+            best = None
+            for match in pattern.finditer(buffer, start, end):
+                cut = match.end() if cut_at_end else match.start()
+                if min_cut <= cut <= limit:
+                    best = cut
+            if best is not None:
+                return best
+
+    return limit
+
+def iter_text_chunks(stream, max_length=MAX_TEXT_LENGTH):
+    """
+    Ленивое разбиение текста на части не длиннее max_length
+
+    Текст читается блоками, в памяти держится только текущий блок, поэтому
+    можно разбивать книги размером в мегабайты. Части режутся по абзацам,
+    затем по предложениям, частям предложений и словам. Время работы
+    линейно по длине текста.
+
+    Args:
+        stream (str | file | iterable): Строка, текстовый файл или итератор строк
+        max_length (int): Максимальная длина части
+
+    Yields:
+        str: Очередная часть текста (без пробелов по краям)
+    """
+    blocks = _read_blocks(stream)
+    buffer = ""
+    start = 0
+    exhausted = False
+
+    while True:
+        # Дочитываем, пока в буфере нет полного окна
+        while not exhausted and len(buffer) - start <= max_length:
+            block = next(blocks, None)
+            if block is None:
+                exhausted = True
+            else:
+                buffer = buffer[start:] + block
+                start = 0
+
+        if len(buffer) - start <= max_length:
+            chunk = buffer[start:].strip()
+            if chunk:
+                yield chunk
+            return
+
+        cut = _find_cut(buffer, start, max_length)
+        chunk = buffer[start:cut].strip()
+        if chunk:
+            yield chunk
+        start = cut
+
 def split_text(text, max_length=MAX_TEXT_LENGTH):
     """
     Разбиение текста на части по максимальной длине
@@ -22,37 +132,4 @@ def split_text(text, max_length=MAX_TEXT_LENGTH):
     if len(text) <= max_length:
         return [text]
     
-    # Разбиваем текст на предложения
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    
-    parts = []
-    current_part = ""
-    
-    for sentence in sentences:
-        # Если предложение слишком длинное, разбиваем его на части
-        if len(sentence) > max_length:
-            if current_part:
-                parts.append(current_part)
-                current_part = ""
-            
-            # Разбиваем предложение на части
-            for i in range(0, len(sentence), max_length):
-                part = sentence[i:i + max_length]
-                parts.append(part)
-        else:
-            # Если добавление предложения превысит максимальную длину,
-            # сохраняем текущую часть и начинаем новую
-            if len(current_part) + len(sentence) + 1 > max_length:
-                parts.append(current_part)
-                current_part = sentence
-            else:
-                # Добавляем пробел, если текущая часть не пуста
-                if current_part:
-                    current_part += " "
-                current_part += sentence
-    
-    # Добавляем последнюю часть, если она не пуста
-    if current_part:
-        parts.append(current_part)
-    
-    return parts
\ No newline at end of file
+    return list(iter_text_chunks(text, max_length))
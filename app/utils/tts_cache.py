@@ -0,0 +1,221 @@
+"""
+Модуль дискового кэша синтезированной речи
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import unicodedata
+import uuid
+from collections import OrderedDict
+from config import CACHE_DIR, TTS_CACHE_MAX_MB, TEMP_DIR
+
+logger = logging.getLogger(__name__)
+
+# Через сколько обращений к кэшу в лог пишется его статистика
+STATS_LOG_INTERVAL = 100
+
+def normalize_text(text):
+    """
+    Нормализация текста для вычисления ключа кэша
+
+    Args:
+        text (str): Исходный текст
+
+    Returns:
+        str: Текст в форме NFC со схлопнутыми пробелами
+    """
+    text = unicodedata.normalize('NFC', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+def make_cache_key(text, language, voice_type, tts_engine, audio_format):
+    """
+    Вычисление ключа кэша по тексту и параметрам синтеза
+
+    Args:
+        text (str): Текст
+        language (str): Язык
+        voice_type (str): Тип голоса
+        tts_engine (str): Движок TTS
+        audio_format (str): Формат аудио
+
+    Returns:
+        str: SHA-256 в шестнадцатеричном виде
+    """
+    payload = json.dumps(
+        [normalize_text(text), language, voice_type, tts_engine, audio_format],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class SpeechCache:
+    """
+    Кэш аудиофайлов с вытеснением давно не использованных записей
+
+    Файлы хранятся в CACHE_DIR под именем <ключ>.<формат>; порядок
+    использования восстанавливается при запуске по времени изменения
+    файлов, которое обновляется при каждом попадании.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=TTS_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = None  # Имя файла -> размер, от старых к новым
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _load(self):
+        """
+        Построение индекса по содержимому директории кэша
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith('.') or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, name, stat.st_size))
+
+        self._entries = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self._total_bytes = sum(self._entries.values())
+        logger.debug(f"Кэш речи загружен: {len(self._entries)} файлов, {self._total_bytes} байт")
+
+    def _evict(self):
+        """
+        Удаление старых записей, пока кэш превышает лимит
+        """
+        while self._total_bytes > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            logger.debug(f"Запись {name} вытеснена из кэша речи")
+
+    def _count(self, hit):
+        """
+        Учет обращения к кэшу (вызывается под блокировкой)
+
+        Args:
+            hit (bool): Попадание в кэш
+        """
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        lookups = self.hits + self.misses
+        if lookups % STATS_LOG_INTERVAL == 0:
+            logger.info(
+                f"Кэш речи: {self.hits} попаданий из {lookups} обращений ({self.hits * 100 // lookups}%), "
+                f"{len(self._entries)} файлов, {self._total_bytes} байт"
+            )
+
+    def get(self, key, audio_format):
+        """
+        Получение копии закэшированного аудиофайла во временной директории
+
+        Args:
+            key (str): Ключ кэша
+            audio_format (str): Формат аудио
+
+        Returns:
+            str: Путь к новому временному файлу или None при промахе
+        """
+        if not self.enabled:
+            return None
+
+        name = f"{key}.{audio_format}"
+        with self._lock:
+            if self._entries is None:
+                self._load()
+
+            if name not in self._entries:
+                self._count(False)
+                return None
+
+            cached_path = os.path.join(self.cache_dir, name)
+            file_path = os.path.join(TEMP_DIR, f"tts_{uuid.uuid4()}.{audio_format}")
+            try:
+                # Жесткая ссылка не копирует данные; вызывающий код удаляет только свое имя
+                try:
+                    os.link(cached_path, file_path)
+                except OSError:
+                    shutil.copyfile(cached_path, file_path)
+                os.utime(cached_path)
+            except FileNotFoundError:
+                self._total_bytes -= self._entries.pop(name)
+                self._count(False)
+                return None
+
+            self._entries.move_to_end(name)
+            self._count(True)
+            return file_path
+
+    def put(self, key, audio_format, file_path):
+        """
+        Сохранение аудиофайла в кэш (исходный файл остается на месте)
+
+        Args:
+            key (str): Ключ кэша
+            audio_format (str): Формат аудио
+            file_path (str): Путь к аудиофайлу
+        """
+        if not self.enabled:
+            return
+
+        name = f"{key}.{audio_format}"
+        cached_path = os.path.join(self.cache_dir, name)
+        partial_path = os.path.join(self.cache_dir, f".{name}.{uuid.uuid4().hex}")
+        try:
+            with self._lock:
+                if self._entries is None:
+                    self._load()
+
+            # Данные пишутся во временное имя без блокировки: запись большого
+            # файла не задерживает чтение кэша другими потоками
+            try:
+                os.link(file_path, partial_path)
+            except OSError:
+                shutil.copyfile(file_path, partial_path)
+            size = os.path.getsize(partial_path)
+
+            with self._lock:
+                # Переименование атомарно, поэтому обрезанный файл в кэше не появится
+                os.replace(partial_path, cached_path)
+                self._total_bytes += size - self._entries.pop(name, 0)
+                self._entries[name] = size
+                self._evict()
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении в кэш речи: {e}")
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    def stats(self):
+        """
+        Статистика кэша
+
+        Returns:
+            dict: Попадания, промахи, количество файлов и объем в байтах
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries or ()),
+                'bytes': self._total_bytes
+            }
+
+# Общий кэш речи процесса
+speech_cache = SpeechCache()
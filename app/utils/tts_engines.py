@@ -0,0 +1,227 @@
+"""
+Модуль реестра TTS-движков
+
+Каждый движок описывает свои возможности (языки, длину части, число
+одновременных запросов, формат вывода и относительную стоимость синтеза),
+а конвейер и обработчики очереди берут эти параметры из реестра.
+"""
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from config import MAX_TEXT_LENGTH, CHUNK_LENGTH, ENGINE_CONCURRENCY, DEFAULT_TTS_ENGINE, TTS_FALLBACK_CHAIN
+from app.utils.voice_catalog import voice_catalog
+from app.utils.gtts_client import save_gtts
+from app.utils.pyttsx3_pool import PYTTSX3_AVAILABLE, engine_pool
+from app.utils.espeak_backend import ESPEAK_COMMAND, get_library, save_espeak
+from app.utils.festival_backend import FESTIVAL_COMMAND, save_festival
+from app.utils.coqui_backend import COQUI_AVAILABLE, save_coqui
+
+logger = logging.getLogger(__name__)
+
+class TTSEngine(ABC):
+    """
+    Базовый класс движка синтеза речи
+
+    Attributes:
+        name (str): Имя движка (хранится в настройках пользователя)
+        title (str): Название для меню настроек
+        output_format (str): Формат, который движок выдает сам (без ffmpeg
+            файл сохраняется в этом формате)
+        cost (float): Относительная стоимость синтеза одного символа
+            (1 — Google TTS)
+        cpu_bound (bool): Нагружает ли синтез процессор (такие движки
+            выполняются в пуле процессов)
+        own_processes (bool): Выполняется ли движок в отдельных процессах
+            (concurrency процессов), а не в общем пуле процессов синтеза
+        chunk_length (int): Максимальная длина части текста
+        concurrency (int): Максимум одновременно синтезируемых частей
+        slots (threading.BoundedSemaphore): Места для одновременного синтеза
+            (занимаются в процессе бота, см. convert_text_to_speech)
+    """
+    name = None
+    title = None
+    output_format = 'wav'
+    cost = 1.0
+    cpu_bound = True
+    own_processes = False
+
+    def __init__(self):
+        self.chunk_length = CHUNK_LENGTH.get(self.name, MAX_TEXT_LENGTH)
+        self.concurrency = max(1, ENGINE_CONCURRENCY.get(self.name, 1))
+        self.slots = threading.BoundedSemaphore(self.concurrency)
+
+    def available(self):
+        """
+        Проверка, что движок установлен
+
+        Returns:
+            bool: True, если движок можно использовать
+        """
+        return True
+
+    def voice(self, language, voice_type):
+        """
+        Голос движка для языка и типа голоса
+
+        Returns:
+            str: ID голоса или None, если голоса нет
+        """
+        return voice_catalog.resolve(self.name, language, voice_type)
+
+    @abstractmethod
+    def synthesize(self, text, voice, language, file_path, audio_format):
+        """
+        Синтез речи в файл
+
+        Args:
+            text (str): Текст
+            voice (str): ID голоса (см. voice)
+            language (str): Язык
+            file_path (str): Путь к файлу
+            audio_format (str): Формат файла
+
+        Raises:
+            Exception: Если синтез не удался
+        """
+
+class GTTSEngine(TTSEngine):
+    """
+    Google TTS (онлайн)
+    """
+    name = 'gtts'
+    title = 'Google TTS (онлайн)'
+    output_format = 'mp3'
+    cost = 1.0
+    cpu_bound = False
+
+    def synthesize(self, text, voice, language, file_path, audio_format):
+        save_gtts(text, language, file_path)
+
+class Pyttsx3Engine(TTSEngine):
+    """
+    pyttsx3 (оффлайн)
+    """
+    name = 'pyttsx3'
+    title = 'pyttsx3 (оффлайн, высокое качество)'
+    cost = 2.0
+    # Драйвер espeak у pyttsx3 занимает libespeak во всем процессе, поэтому
+    # в общем пуле библиотека осталась бы недоступной для eSpeak
+    own_processes = True
+
+    def available(self):
+        return PYTTSX3_AVAILABLE
+
+    def synthesize(self, text, voice, language, file_path, audio_format):
+        try:
+            # Движок берется из пула
+            with engine_pool.engine() as engine:
+                engine.setProperty('voice', voice)
+                engine.save_to_file(text, file_path)
+                engine.runAndWait()
+        except Exception as e:
+            # Драйвер может сообщить об ошибке, уже записав файл
+            if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+                logger.debug(f"Файл {file_path} был создан, несмотря на ошибку pyttsx3 ({e}). Используем его.")
+                return
+            raise
+
+class EspeakEngine(TTSEngine):
+    """
+    eSpeak (оффлайн)
+    """
+    name = 'espeak'
+    title = 'eSpeak (оффлайн)'
+    cost = 0.5
+
+    def available(self):
+        return ESPEAK_COMMAND is not None or get_library() is not None
+
+    def synthesize(self, text, voice, language, file_path, audio_format):
+        save_espeak(text, voice, file_path, audio_format)
+
+class FestivalEngine(TTSEngine):
+    """
+    Festival (оффлайн)
+    """
+    name = 'festival'
+    title = 'Festival (оффлайн)'
+    cost = 2.0
+
+    def available(self):
+        return FESTIVAL_COMMAND is not None
+
+    def synthesize(self, text, voice, language, file_path, audio_format):
+        save_festival(text, file_path, audio_format)
+
+class CoquiEngine(TTSEngine):
+    """
+    Coqui TTS (оффлайн, нейросетевые модели)
+    """
+    name = 'coqui'
+    title = 'Coqui TTS (оффлайн, нейросеть)'
+    cost = 10.0
+
+    def available(self):
+        return COQUI_AVAILABLE
+
+    def synthesize(self, text, voice, language, file_path, audio_format):
+        save_coqui(text, voice, file_path, audio_format)
+
+# Реестр движков: имя -> движок (в порядке меню настроек)
+ENGINES = {}
+
+def register_engine(engine):
+    """
+    Добавление движка в реестр
+
+    Args:
+        engine (TTSEngine): Движок
+    """
+    ENGINES[engine.name] = engine
+
+for _engine_class in (GTTSEngine, Pyttsx3Engine, EspeakEngine, FestivalEngine, CoquiEngine):
+    register_engine(_engine_class())
+
+def get_engine(name):
+    """
+    Получение движка по имени
+
+    Args:
+        name (str): Имя движка
+
+    Returns:
+        TTSEngine: Движок (для неизвестного имени — движок по умолчанию)
+    """
+    engine = ENGINES.get(name)
+    if engine is None:
+        engine = ENGINES.get(DEFAULT_TTS_ENGINE, ENGINES['gtts'])
+    return engine
+
+def fallback_chain(name):
+    """
+    Порядок движков для синтеза: выбранный движок, затем TTS_FALLBACK_CHAIN
+
+    Args:
+        name (str): Имя выбранного движка
+
+    Returns:
+        list: Движки без повторов
+    """
+    chain = []
+    for engine_name in [name] + TTS_FALLBACK_CHAIN:
+        engine = ENGINES.get(engine_name)
+        if engine is None:
+            logger.warning(f"Неизвестный движок TTS: {engine_name}")
+        elif engine not in chain:
+            chain.append(engine)
+    return chain
+
+def engine_titles():
+    """
+    Названия установленных движков для меню настроек
+
+    Returns:
+        dict: Имя движка -> название
+    """
+    return {name: engine.title for name, engine in ENGINES.items() if engine.available()}
@@ -0,0 +1,247 @@
+"""
+Модуль каталога голосов TTS-движков
+"""
+import logging
+import subprocess
+import threading
+from config import SUPPORTED_LANGUAGES
+from app.utils.pyttsx3_pool import PYTTSX3_AVAILABLE, engine_pool
+from app.utils.espeak_backend import ESPEAK_COMMAND
+from app.utils.festival_backend import FESTIVAL_COMMAND
+from app.utils.coqui_backend import coqui_model_for
+
+logger = logging.getLogger(__name__)
+
+ENGINES = ('gtts', 'pyttsx3', 'espeak', 'festival', 'coqui')
+VOICE_TYPES = ('male', 'female')
+
+# Варианты голосов eSpeak для типов голоса
+ESPEAK_VARIANTS = {
+    'male': 'm1',
+    'female': 'f2'
+}
+
+# Языки стандартной установки Festival
+FESTIVAL_LANGUAGES = ('en',)
+
+def _voice_languages(voice):
+    """
+    Языки голоса pyttsx3 в нижнем регистре
+
+    Args:
+        voice (pyttsx3.voice.Voice): Голос
+
+    Returns:
+        list: Коды языков
+    """
+    langs = []
+    for lang in voice.languages:
+        if isinstance(lang, bytes):
+            try:
+                langs.append(lang.decode('utf-8').lower())
+            except Exception:
+                langs.append(str(lang).lower())
+        else:
+            langs.append(str(lang).lower())
+    return langs
+
+def match_pyttsx3_voice(voices, language, voice_type):
+    """
+    Выбор голоса pyttsx3 по языку и типу голоса
+
+    Args:
+        voices (list): Голоса движка pyttsx3
+        language (str): Язык текста
+        voice_type (str): Тип голоса (male/female)
+
+    Returns:
+        str: ID голоса или None, если голосов для языка нет
+    """
+    # Собираем кандидатов, поддерживающих требуемый язык
+    candidates = []
+
+    # Для русского языка явно ищем голос "russian"
+    if language == 'ru':
+        candidates = [voice for voice in voices if 'russian' in voice.id.lower() or 'ru' in voice.id.lower()]
+
+    # Если русских голосов не нашлось, ищем по стандартному алгоритму:
+    # хотя бы один язык голоса начинается с требуемого кода (например, "ru")
+    if not candidates:
+        candidates = [
+            voice for voice in voices
+            if any(lang.startswith(language) for lang in _voice_languages(voice))
+        ]
+
+    if not candidates:
+        return None
+
+    if voice_type == 'female':
+        markers = ('female', 'zira', 'helena')
+    else:
+        markers = ('male', 'david', 'mark')
+
+    for voice in candidates:
+        # Используем voice.name для определения пола
+        name = voice.name.lower() if getattr(voice, 'name', None) else ''
+        if any(marker in name for marker in markers):
+            return voice.id
+
+    # Если нужного пола не найдено, используем первого кандидата
+    return candidates[0].id
+
+def _espeak_languages():
+    """
+    Языки, для которых в eSpeak установлены голоса
+
+    Returns:
+        set: Коды языков (пустое множество, если eSpeak не установлен)
+    """
+    if ESPEAK_COMMAND is None:
+        return set()
+
+    result = subprocess.run([ESPEAK_COMMAND, '--voices'], capture_output=True, text=True)
+    languages = set()
+    # Формат строк: Pty Language Age/Gender VoiceName File Other Languages
+    for line in result.stdout.splitlines()[1:]:
+        columns = line.split()
+        if len(columns) > 1:
+            languages.add(columns[1].split('-')[0].lower())
+    return languages
+
+class VoiceCatalog:
+    """
+    Каталог голосов: (движок, язык, тип голоса) -> ID голоса
+
+    Значение None означает, что подходящего голоса нет и синтез перейдет на
+    запасной движок (см. TTS_FALLBACK_CHAIN). Голоса движка определяются при первом обращении к нему и
+    остаются в каталоге до вызова refresh.
+    """
+
+    def __init__(self, languages=SUPPORTED_LANGUAGES):
+        self.languages = list(languages)
+        self._voices = {}
+        self._built = set()
+        self._lock = threading.Lock()
+
+    def _build_engine(self, engine):
+        """
+        Определение голосов одного движка
+
+        Args:
+            engine (str): Имя движка
+
+        Returns:
+            dict: (движок, язык, тип голоса) -> ID голоса или None
+        """
+        voices = {}
+
+        if engine == 'gtts':
+            # Google TTS не различает тип голоса, голос задается языком
+            for language in self.languages:
+                for voice_type in VOICE_TYPES:
+                    voices[(engine, language, voice_type)] = language
+
+        elif engine == 'pyttsx3':
+            engine_voices = []
+            if PYTTSX3_AVAILABLE:
+                try:
+                    with engine_pool.engine() as tts:
+                        engine_voices = tts.getProperty('voices')
+                except Exception as e:
+                    logger.warning(f"Не удалось получить голоса pyttsx3: {e}")
+
+            for language in self.languages:
+                for voice_type in VOICE_TYPES:
+                    voices[(engine, language, voice_type)] = match_pyttsx3_voice(engine_voices, language, voice_type)
+
+        elif engine == 'espeak':
+            try:
+                installed = _espeak_languages()
+            except Exception as e:
+                logger.warning(f"Не удалось получить голоса eSpeak: {e}")
+                installed = set()
+
+            for language in self.languages:
+                for voice_type in VOICE_TYPES:
+                    voice = f"{language}+{ESPEAK_VARIANTS[voice_type]}" if language in installed else None
+                    voices[(engine, language, voice_type)] = voice
+
+        elif engine == 'festival':
+            installed = FESTIVAL_COMMAND is not None
+            for language in self.languages:
+                for voice_type in VOICE_TYPES:
+                    voice = 'default' if installed and language in FESTIVAL_LANGUAGES else None
+                    voices[(engine, language, voice_type)] = voice
+
+        elif engine == 'coqui':
+            # Модели Coqui TTS одноголосые: голос задается моделью языка
+            for language in self.languages:
+                for voice_type in VOICE_TYPES:
+                    voices[(engine, language, voice_type)] = coqui_model_for(language)
+
+        return voices
+
+    def build(self, engines=ENGINES):
+        """
+        Заполнение каталога голосами указанных движков
+
+        Args:
+            engines (iterable): Имена движков
+        """
+        for engine in engines:
+            voices = self._build_engine(engine)
+            with self._lock:
+                self._voices.update(voices)
+                self._built.add(engine)
+
+            missing = [key for key, voice in voices.items() if voice is None]
+            if missing:
+                logger.info(f"Для движка {engine} нет голосов ({len(missing)} сочетаний), будет использован запасной движок")
+
+    def refresh(self):
+        """
+        Повторное определение голосов всех уже опрошенных движков
+        """
+        with self._lock:
+            engines = list(self._built)
+            self._built.clear()
+        self.build(engines)
+
+    def resolve(self, engine, language, voice_type):
+        """
+        Получение ID голоса
+
+        Args:
+            engine (str): Имя движка
+            language (str): Язык
+            voice_type (str): Тип голоса (male/female)
+
+        Returns:
+            str: ID голоса или None, если голоса нет
+        """
+        if engine not in self._built:
+            self.build([engine])
+
+        return self._voices.get((engine, language, voice_type))
+
+    def items(self):
+        """
+        Все записи каталога
+
+        Returns:
+            list: Пары ((движок, язык, тип голоса), ID голоса), отсортированные по ключу
+        """
+        with self._lock:
+            return sorted(self._voices.items())
+
+    def fallbacks(self):
+        """
+        Сочетания, для которых синтез перейдет на запасной движок
+
+        Returns:
+            list: Ключи (движок, язык, тип голоса)
+        """
+        return [key for key, voice in self.items() if voice is None]
+
+# Общий каталог голосов процесса
+voice_catalog = VoiceCatalog()
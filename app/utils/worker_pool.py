@@ -0,0 +1,249 @@
+"""
+Модуль пула обработчиков очереди задач
+"""
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import QUEUE_WORKERS, SYNTHESIS_PROCESSES, QUEUE_SCHEDULING, EXPRESS_WORKERS
+from app.utils.queue_manager import take_task, complete_task
+from app.utils.tts_converter import convert_text_to_speech, synthesize_speech, prepare_synthesis
+from app.utils.tts_engines import ENGINES, get_engine
+
+logger = logging.getLogger(__name__)
+
+# Пулы процессов для синтеза (создаются при первом обращении): имя -> пул
+_process_executors = {}
+_process_executor_lock = threading.Lock()
+
+# Имя общего пула процессов синтеза
+SHARED_POOL = 'synthesis'
+
+def _pool_layout(pool):
+    """
+    Размер пула процессов и движки, которые в нем работают
+
+    Движки с own_processes работают в пуле со своим именем (по процессу на
+    одновременный синтез), остальные оффлайн-движки — в общем пуле.
+
+    Args:
+        pool (str): Имя пула (SHARED_POOL или имя движка)
+
+    Returns:
+        tuple: (количество процессов, имена движков)
+    """
+    if pool == SHARED_POOL:
+        return SYNTHESIS_PROCESSES, [name for name, engine in ENGINES.items() if not engine.own_processes]
+    return get_engine(pool).concurrency, [pool]
+
+def _pool_for(engine):
+    """
+    Имя пула процессов для движка
+
+    Args:
+        engine (TTSEngine): Движок
+
+    Returns:
+        str: Имя пула
+    """
+    return engine.name if engine.own_processes else SHARED_POOL
+
+def _get_process_executor(pool=SHARED_POOL):
+    """
+    Получение пула процессов для синтеза речи
+
+    Args:
+        pool (str): Имя пула (см. _pool_for)
+
+    Returns:
+        ProcessPoolExecutor: Пул процессов
+    """
+    with _process_executor_lock:
+        executor = _process_executors.get(pool)
+        if executor is None:
+            processes, engines = _pool_layout(pool)
+            # spawn вместо fork: к моменту создания пула в процессе уже работают потоки бота
+            # Каждый процесс при запуске один раз готовит свои движки и заполняет каталог голосов
+            executor = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=prepare_synthesis,
+                initargs=(engines,)
+            )
+            _process_executors[pool] = executor
+            logger.info(f"Пул процессов {pool} запущен ({processes} процессов)")
+
+    return executor
+
+def _reset_process_executor(pool, broken):
+    """
+    Замена сломанного пула процессов (процесс синтеза упал, например,
+    по нехватке памяти или из-за ошибки в библиотеке движка)
+
+    Следующее обращение к _get_process_executor создаст новый пул.
+
+    Args:
+        pool (str): Имя пула
+        broken (ProcessPoolExecutor): Сломанный пул
+    """
+    with _process_executor_lock:
+        # Пул мог уже пересоздать другой поток
+        if _process_executors.get(pool) is not broken:
+            return
+        del _process_executors[pool]
+
+    broken.shutdown(wait=False, cancel_futures=True)
+    logger.warning(f"Пул процессов {pool} сломан и будет создан заново")
+
+def _ready():
+    """
+    Пустая работа для запуска процессов пула
+    """
+    return True
+
+def warm_up_synthesis():
+    """
+    Подготовка синтеза при запуске бота: запуск всех процессов пулов или,
+    если синтез выполняется в потоках, подготовка текущего процесса
+
+    Пул запускает процессы только под работу, поэтому в него ставится
+    по пустой работе на процесс: каждый процесс стартует и выполняет
+    prepare_synthesis до первой задачи.
+    """
+    if SYNTHESIS_PROCESSES <= 0:
+        prepare_synthesis()
+        return
+
+    pools = [SHARED_POOL] + [name for name, engine in ENGINES.items()
+                             if engine.own_processes and engine.available()]
+    for pool in pools:
+        executor = _get_process_executor(pool)
+        try:
+            for future in [executor.submit(_ready) for _ in range(_pool_layout(pool)[0])]:
+                future.result()
+        except BrokenProcessPool as e:
+            logger.error(f"Не удалось запустить процессы пула {pool}: {e}")
+            _reset_process_executor(pool, executor)
+
+def synthesize(text, **kwargs):
+    """
+    Конвертация текста в речь с выбором места выполнения по типу движка
+
+    Оффлайн-движки нагружают процессор (cpu_bound), поэтому синтез для них
+    выполняется в отдельных процессах. Google TTS ограничен сетью и
+    выполняется прямо в потоке обработчика. Место выбирается для каждого
+    пробуемого движка, в том числе запасного. Кэш речи проверяется в
+    текущем процессе, в пул процессов уходит только сам синтез.
+
+    Args:
+        text (str): Текст для конвертации
+        **kwargs: Параметры convert_text_to_speech (language, voice_type, tts_engine, audio_format)
+
+    Returns:
+        str: Путь к аудиофайлу или None в случае ошибки
+    """
+    return convert_text_to_speech(text, synthesize=_synthesize_with_engine, **kwargs)
+
+def _synthesize_with_engine(text, **kwargs):
+    """
+    Синтез речи одним движком в пуле процессов или в текущем потоке
+
+    Args:
+        text (str): Текст для конвертации
+        **kwargs: Параметры synthesize_speech
+
+    Returns:
+        str: Путь к аудиофайлу или None в случае ошибки
+    """
+    engine = get_engine(kwargs.get('tts_engine'))
+    if not engine.cpu_bound or SYNTHESIS_PROCESSES <= 0:
+        return synthesize_speech(text, **kwargs)
+
+    # Если процесс пула упал, пул пересоздается и синтез повторяется один раз
+    pool = _pool_for(engine)
+    for attempt in range(2):
+        executor = _get_process_executor(pool)
+        try:
+            return executor.submit(synthesize_speech, text, **kwargs).result()
+        except BrokenProcessPool as e:
+            _reset_process_executor(pool, executor)
+            if attempt:
+                logger.error(f"Ошибка в пуле процессов {pool}: {e}")
+                return None
+        except Exception as e:
+            logger.error(f"Ошибка в пуле процессов {pool}: {e}")
+            return None
+
+class WorkerPool:
+    """
+    Пул потоков, забирающих задачи из общей очереди
+
+    Каждая задача целиком обрабатывается одним потоком, поэтому части
+    одного текста создаются и отправляются в исходном порядке.
+
+    В режиме short_first дополнительные экспресс-обработчики берут только
+    короткие задачи, поэтому короткий текст не ждет, пока обычные
+    обработчики закончат длинные документы.
+    """
+
+    def __init__(self, handler, workers=QUEUE_WORKERS, express_workers=None):
+        """
+        Args:
+            handler (callable): Функция обработки задачи, принимает словарь задачи
+                и возвращает False, если обработка не удалась
+            workers (int): Количество потоков-обработчиков
+            express_workers (int): Количество экспресс-обработчиков (None — EXPRESS_WORKERS
+                в режиме short_first, иначе 0)
+        """
+        if express_workers is None:
+            express_workers = EXPRESS_WORKERS if QUEUE_SCHEDULING == 'short_first' else 0
+
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.express_workers = max(0, express_workers)
+        self.threads = []
+
+    def start(self):
+        """
+        Запуск потоков-обработчиков
+        """
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"queue-worker-{i + 1}")
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+        for i in range(self.express_workers):
+            thread = threading.Thread(target=self._run, args=(True,), name=f"express-worker-{i + 1}")
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+        logger.info(f"Запущено обработчиков очереди: {self.workers}, экспресс-обработчиков: {self.express_workers}")
+
+    def _run(self, express_only=False):
+        """
+        Цикл обработчика: получение задачи из очереди и ее обработка
+
+        Args:
+            express_only (bool): Брать только короткие задачи
+        """
+        while True:
+            try:
+                # Ожидаем появления задачи в очереди
+                task = take_task(threading.current_thread().name, express_only=express_only)
+
+                success = False
+                try:
+                    success = self.handler(task) is not False
+                finally:
+                    # Удаляем задачу из очереди
+                    complete_task(task['id'], success, retry=task.get('retry', False))
+                    logger.debug(f"Задача {task['id']} удалена из очереди")
+
+            except Exception as e:
+                logger.error(f"Ошибка в обработчике очереди: {e}")
+                logger.debug("Трассировка стека: ", exc_info=True)
+                time.sleep(5)  # Пауза в случае ошибки
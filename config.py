@@ -8,6 +8,8 @@ from decouple import config
 # Базовые пути
 BASE_DIR = Path(__file__).resolve().parent
 TEMP_DIR = os.path.join(BASE_DIR, "temp")
+TASKS_DIR = os.path.join(BASE_DIR, "db", "tasks")  # Тексты задач из очереди (не очищается при перезапуске)
+CACHE_DIR = os.path.join(BASE_DIR, "cache")  # Кэш синтезированной речи
 
 # Настройки Telegram-бота
 TELEGRAM_TOKEN = config('TELEGRAM_TOKEN', default='')
@@ -15,6 +17,10 @@ ADMIN_USER_IDS = list(map(int, config('ADMIN_USER_IDS', default='').split(',')))
 
 # Настройки базы данных
 DATABASE_URL = config('DATABASE_URL', default='sqlite:///soundbot.db')
+DB_POOL_SIZE = int(config('DB_POOL_SIZE', default='10'))  # Постоянных соединений в пуле
+DB_MAX_OVERFLOW = int(config('DB_MAX_OVERFLOW', default='10'))  # Дополнительных соединений при пиковой нагрузке
+DB_BUSY_TIMEOUT = float(config('DB_BUSY_TIMEOUT', default='30'))  # Ожидание блокировки SQLite в секундах
+USER_SETTINGS_CACHE_SIZE = int(config('USER_SETTINGS_CACHE_SIZE', default='10000'))  # Пользователей в кэше настроек (0 — без кэша)
 
 # Настройки TTS
 DEFAULT_TTS_ENGINE = config('DEFAULT_TTS_ENGINE', default='gtts')  # Используем gtts по умолчанию, так как он более надежен для русского языка
@@ -22,13 +28,43 @@ DEFAULT_VOICE_TYPE = config('DEFAULT_VOICE_TYPE', default='female')
 DEFAULT_LANGUAGE = config('DEFAULT_LANGUAGE', default='ru')
 SUPPORTED_LANGUAGES = ['ru', 'en', 'fr', 'de', 'es', 'it']
 
+# Настройки клиента Google TTS
+GTTS_BASE_URL = config('GTTS_BASE_URL', default='https://translate.google.com')
+GTTS_CONNECTIONS = int(config('GTTS_CONNECTIONS', default='8'))  # Одновременные HTTPS-соединения
+GTTS_RATE_LIMIT = float(config('GTTS_RATE_LIMIT', default='10'))  # Запросов в секунду (0 — без ограничения)
+GTTS_RETRIES = int(config('GTTS_RETRIES', default='3'))
+GTTS_TIMEOUT = float(config('GTTS_TIMEOUT', default='30'))  # Таймаут запроса в секундах
+
+# Движки, которые по очереди пробуются, если выбранный движок не справился
+TTS_FALLBACK_CHAIN = [engine.strip() for engine in config('TTS_FALLBACK_CHAIN', default='gtts').split(',') if engine.strip()]
+
+# Модели Coqui TTS для языков (язык:модель через запятую)
+COQUI_MODELS = dict(
+    item.strip().split(':', 1)
+    for item in config(
+        'COQUI_MODELS',
+        default='en:tts_models/en/ljspeech/vits,de:tts_models/de/thorsten/tacotron2-DDC,'
+                'fr:tts_models/fr/mai/tacotron2-DDC,es:tts_models/es/mai/tacotron2-DDC,'
+                'it:tts_models/it/mai_female/glow-tts'
+    ).split(',')
+    if ':' in item
+)
+
+# Настройки серверов Festival
+FESTIVAL_TIMEOUT = float(config('FESTIVAL_TIMEOUT', default='120'))  # Таймаут запуска сервера и синтеза части в секундах
+
 # Настройки аудио
 AUDIO_BITRATE = config('AUDIO_BITRATE', default='128k')
 AUDIO_SAMPLE_RATE = int(config('AUDIO_SAMPLE_RATE', default='44100'))
 DEFAULT_AUDIO_FORMAT = config('DEFAULT_AUDIO_FORMAT', default='mp3')
 
+# Настройки кэша синтезированной речи (0 — кэш отключен)
+TTS_CACHE_MAX_MB = int(config('TTS_CACHE_MAX_MB', default='500'))
+
 # Максимальная длина текста для конвертации
-MAX_TEXT_LENGTH = int(config('MAX_TEXT_LENGTH', default='4000'))
+MAX_TEXT_LENGTH = int(config('MAX_TEXT_LENGTH', default='4000'))  # Более длинные тексты озвучиваются в режиме книги
+BOOK_MAX_LENGTH = int(config('BOOK_MAX_LENGTH', default='5000000'))
+BOOK_CHAPTER_LENGTH = int(config('BOOK_CHAPTER_LENGTH', default='40000'))  # Символов текста в одной главе
 
 # Настройки обработки текста
 LANGUAGE_CONFIDENCE_THRESHOLD = 0.7
@@ -38,5 +74,50 @@ LONG_PROCESSING_THRESHOLD_MINUTES = 5
 # Настройки файлов
 MAX_FILE_SIZE_MB = 10
 
-# Создаем временную директорию, если она не существует
-os.makedirs(TEMP_DIR, exist_ok=True)
\ No newline at end of file
+# Ограничение частоты запросов (0 — без ограничения)
+USER_RATE_PER_MINUTE = float(config('USER_RATE_PER_MINUTE', default='3'))  # Запросов пользователя в минуту
+USER_RATE_BURST = int(config('USER_RATE_BURST', default='5'))  # Запросов пользователя подряд
+CHAT_RATE_PER_MINUTE = float(config('CHAT_RATE_PER_MINUTE', default='10'))  # Запросов из одного чата в минуту
+CHAT_RATE_BURST = int(config('CHAT_RATE_BURST', default='10'))
+GLOBAL_RATE_PER_MINUTE = float(config('GLOBAL_RATE_PER_MINUTE', default='120'))  # Запросов всех пользователей в минуту
+GLOBAL_RATE_BURST = int(config('GLOBAL_RATE_BURST', default='60'))
+HOURLY_REQUEST_LIMIT = int(config('HOURLY_REQUEST_LIMIT', default='30'))  # Запросов пользователя в час
+DAILY_REQUEST_LIMIT = int(config('DAILY_REQUEST_LIMIT', default='100'))  # Запросов пользователя в сутки
+RATE_LIMIT_FLUSH_SECONDS = int(config('RATE_LIMIT_FLUSH_SECONDS', default='30'))  # Период записи счетчиков в базу
+
+# Настройки обработчиков очереди
+QUEUE_WORKERS = int(config('QUEUE_WORKERS', default='4'))  # Количество потоков, обрабатывающих задачи
+SYNTHESIS_PROCESSES = int(config('SYNTHESIS_PROCESSES', default=str(os.cpu_count() or 1)))  # Процессы для оффлайн-движков
+TASK_LEASE_SECONDS = int(config('TASK_LEASE_SECONDS', default='60'))  # Время аренды задачи обработчиком
+TASK_MAX_ATTEMPTS = int(config('TASK_MAX_ATTEMPTS', default='3'))  # Попыток обработки задачи до пометки failed
+QUEUE_MAX_SIZE = int(config('QUEUE_MAX_SIZE', default='100'))  # Задач в очереди, после которых новые не принимаются (0 — без ограничения)
+PREMIUM_WEIGHT = int(config('PREMIUM_WEIGHT', default='2'))  # Доля премиум-пользователя в очереди задач и частей
+QUEUE_SCHEDULING = config('QUEUE_SCHEDULING', default='fair')  # fair — честная очередь между пользователями, short_first — сначала короткие задачи
+SHORT_JOB_LENGTH = int(config('SHORT_JOB_LENGTH', default='1000'))  # Задачи не длиннее считаются короткими (режим short_first)
+EXPRESS_WORKERS = int(config('EXPRESS_WORKERS', default='1'))  # Обработчики только для коротких задач (режим short_first)
+SHORT_JOB_AGING = float(config('SHORT_JOB_AGING', default='1'))  # Секунд ожидаемой работы, списываемых задаче за секунду ожидания
+
+# Параллельный синтез частей одного текста
+STREAM_AUDIO_PARTS = config('STREAM_AUDIO_PARTS', default=False, cast=bool)  # Отправлять части по мере готовности вместо одного файла
+TELEGRAM_MAX_UPLOAD_MB = int(config('TELEGRAM_MAX_UPLOAD_MB', default='48'))  # Лимит Bot API 50 МБ с запасом
+CHUNK_WORKERS = int(config('CHUNK_WORKERS', default='8'))  # Общее количество потоков синтеза частей
+ENGINE_CONCURRENCY = {  # Максимум одновременно синтезируемых частей для каждого движка
+    'gtts': int(config('GTTS_CONCURRENCY', default='4')),
+    'pyttsx3': int(config('PYTTSX3_CONCURRENCY', default='2')),
+    'espeak': int(config('ESPEAK_CONCURRENCY', default='4')),
+    'festival': int(config('FESTIVAL_CONCURRENCY', default='2')),
+    'coqui': int(config('COQUI_CONCURRENCY', default='1'))
+}
+
+CHUNK_PREFETCH = int(config('CHUNK_PREFETCH', default=str(CHUNK_WORKERS * 2)))  # Частей в работе на одну задачу
+CHUNK_LENGTH = {  # Максимальная длина части текста для каждого движка
+    'gtts': int(config('GTTS_CHUNK_LENGTH', default=str(MAX_TEXT_LENGTH))),
+    'pyttsx3': int(config('PYTTSX3_CHUNK_LENGTH', default='2000')),
+    'espeak': int(config('ESPEAK_CHUNK_LENGTH', default=str(MAX_TEXT_LENGTH))),
+    'festival': int(config('FESTIVAL_CHUNK_LENGTH', default='1000')),
+    'coqui': int(config('COQUI_CHUNK_LENGTH', default='500'))
+}
+
+# Создаем рабочие директории, если они не существуют
+os.makedirs(TEMP_DIR, exist_ok=True)
+os.makedirs(TASKS_DIR, exist_ok=True)
\ No newline at end of file
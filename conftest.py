@@ -0,0 +1,36 @@
+"""
+Общие фикстуры тестов
+"""
+import pytest
+from sqlalchemy import create_engine, event
+from app.db import database
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """
+    Отдельная база данных SQLite во временной директории теста
+
+    Модульный движок и фабрика сессий переключаются на новую базу на
+    время теста, поэтому тест не трогает базу из DATABASE_URL.
+
+    Yields:
+        Engine: Движок временной базы
+    """
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    engine = create_engine(url, **database._engine_options(url))
+    event.listen(engine, "connect", database._tune_sqlite)
+
+    # Записи предыдущих тестов должны попасть в свою базу
+    database.db_writer.flush()
+    old_engine = database.engine
+    monkeypatch.setattr(database, 'engine', engine)
+    database.SessionLocal.remove()
+    database.SessionLocal.configure(bind=engine)
+    database.init_db()
+    try:
+        yield engine
+    finally:
+        database.db_writer.flush()
+        database.SessionLocal.remove()
+        database.SessionLocal.configure(bind=old_engine)
+        engine.dispose()
@@ -36,6 +36,23 @@ CREATE TABLE tasks (
 	created_at DATETIME, 
 	updated_at DATETIME, 
 	estimated_time INTEGER, 
+	source_type VARCHAR, 
+	payload_path VARCHAR, 
+	worker_id VARCHAR, 
+	lease_expires_at DATETIME, 
+	attempts INTEGER, 
+	chunks_done INTEGER, 
+	chapters_sent INTEGER, 
+	settings TEXT, 
 	PRIMARY KEY (task_id), 
 	FOREIGN KEY(user_id) REFERENCES users (user_id)
 );
+CREATE TABLE task_chunks (
+	task_id VARCHAR NOT NULL, 
+	chunk_index INTEGER NOT NULL, 
+	text_hash VARCHAR, 
+	artifact_path VARCHAR, 
+	created_at DATETIME, 
+	PRIMARY KEY (task_id, chunk_index), 
+	FOREIGN KEY(task_id) REFERENCES tasks (task_id)
+);
@@ -4,8 +4,6 @@
 Основной модуль бота для конвертации текста в аудиокниги
 """
 import logging
-import threading
-import time
 from telegram.ext import Updater, CommandHandler, MessageHandler, Filters, CallbackQueryHandler
 import config
 from app.handlers import (
@@ -19,10 +17,12 @@ from app.handlers import (
     process_text,
     process_document
 )
-from app.db.database import init_db, get_db, get_user_settings
-from app.utils.queue_manager import task_queue, cancel_task
-from app.utils.tts_converter import convert_text_to_speech
-from app.utils.audio_processor import process_audio
+from app.db.database import init_db
+from app.utils.queue_manager import restore_queue, start_lease_keeper, save_task_progress, get_user_settings
+from app.utils.worker_pool import WorkerPool, warm_up_synthesis
+from app.utils.pipeline import deliver_document, deliver_book, TaskCancelled
+from app.utils.checkpoints import ChunkCheckpoints
+from app.utils.tts_cache import speech_cache
 import os
 
 # Создаем директорию для логов
@@ -38,180 +38,135 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-def process_queue(updater):
+def process_task(updater, task):
     """
-    Обработка задач из очереди
+    Обработка одной задачи из очереди
     
     Args:
         updater (Updater): Экземпляр Updater для отправки сообщений
+        task (dict): Задача из очереди
+        
+    Returns:
+        bool: True, если задача обработана успешно, иначе False
     """
-    logger.debug("Запуск функции process_queue")
-    while True:
-        try:
-            # Логируем состояние очереди
-            logger.debug(f"Текущее состояние очереди: {len(task_queue)} задач")
-            
-            # Если очередь не пуста
-            if task_queue:
-                # Получаем первую задачу
-                task = task_queue[0]
-                
-                # Логируем начало обработки
-                logger.info(f"Начало обработки задачи {task['id']} для пользователя {task['user_id']}")
-                logger.debug(f"Содержимое задачи: {task}")
-                
-                # Получаем настройки пользователя
-                db = get_db()
-                logger.debug(f"База данных получена: {db}")
-                
-                user_settings_obj = get_user_settings(db, task['user_id'])
-                logger.debug(f"Настройки пользователя получены: {user_settings_obj}")
-                
-                user_settings = {
-                    'tts_engine': user_settings_obj.tts_engine,
-                    'voice_type': user_settings_obj.voice_type,
-                    'language': user_settings_obj.language,
-                    'audio_format': user_settings_obj.audio_format
-                }
-                logger.debug(f"Настройки пользователя преобразованы: {user_settings}")
-                
-                try:
-                    # Конвертируем текст в речь
-                    logger.debug(f"Начинаем конвертацию текста в речь для задачи {task['id']}")
-                    logger.debug(f"Параметры конвертации: язык={user_settings['language']}, тип голоса={user_settings['voice_type']}, движок={user_settings['tts_engine']}, формат={user_settings['audio_format']}")
-                    
-                    audio_file = convert_text_to_speech(
-                        task['text'],
-                        language=user_settings['language'],
-                        voice_type=user_settings['voice_type'],
-                        tts_engine=user_settings['tts_engine'],
-                        audio_format=user_settings['audio_format']
-                    )
-                    
-                    # Проверяем, что аудиофайл был успешно создан
-                    if audio_file is None:
-                        logger.error(f"Не удалось конвертировать текст в речь для задачи {task['id']}")
-                        updater.bot.send_message(
-                            chat_id=task['user_id'],
-                            text="Произошла ошибка при конвертации текста в речь. Пожалуйста, попробуйте еще раз."
-                        )
-                        continue
-                    
-                    # Обрабатываем аудиофайл
-                    logger.debug(f"Начинаем обработку аудиофайла для задачи {task['id']}")
-                    
-                    processed_audio = process_audio(
-                        audio_file,
-                        title=f"Аудиокнига {task['id']}",
-                        output_format=user_settings['audio_format']
-                    )
-                    
-                    # Проверяем, что аудиофайл был успешно обработан
-                    if processed_audio is None:
-                        logger.error(f"Не удалось обработать аудиофайл для задачи {task['id']}")
-                        updater.bot.send_message(
-                            chat_id=task['user_id'],
-                            text="Произошла ошибка при обработке аудиофайла. Пожалуйста, попробуйте еще раз."
-                        )
-                        # Удаляем исходный аудиофайл, если он существует
-                        if os.path.exists(audio_file):
-                            try:
-                                os.remove(audio_file)
-                                logger.debug(f"Исходный аудиофайл {audio_file} удален")
-                            except Exception as e:
-                                logger.error(f"Ошибка при удалении исходного аудиофайла {audio_file}: {e}")
-                        continue
-                    
-                    # Отправляем аудиофайл пользователю
-                    logger.debug(f"Начинаем отправку аудиофайла пользователю {task['user_id']}")
-                    
-                    # Проверяем, что файл существует и не содержит ':Zone.Identifier'
-                    if os.path.exists(processed_audio) and ':Zone.Identifier' not in processed_audio:
-                        try:
-                            with open(processed_audio, 'rb') as audio:
-                                updater.bot.send_audio(
-                                    chat_id=task['user_id'],
-                                    audio=audio,
-                                    caption="Ваш текст был успешно преобразован в аудио!"
-                                )
-                            logger.debug(f"Аудиофайл успешно отправлен пользователю {task['user_id']}")
-                            
-                            # Удаляем временные файлы
-                            try:
-                                # Удаляем обработанный аудиофайл
-                                if os.path.exists(processed_audio):
-                                    os.remove(processed_audio)
-                                    logger.debug(f"Обработанный аудиофайл {processed_audio} удален")
-                                
-                                # Удаляем исходный аудиофайл
-                                if os.path.exists(audio_file):
-                                    os.remove(audio_file)
-                                    logger.debug(f"Исходный аудиофайл {audio_file} удален")
-                            except Exception as e:
-                                logger.error(f"Ошибка при удалении временных файлов: {e}")
-                                
-                        except Exception as e:
-                            logger.error(f"Ошибка при отправке аудиофайла: {e}")
-                            updater.bot.send_message(
-                                chat_id=task['user_id'],
-                                text=f"Произошла ошибка при отправке аудиофайла: {str(e)}"
-                            )
-                            
-                            # Удаляем временные файлы в случае ошибки
-                            try:
-                                if os.path.exists(processed_audio):
-                                    os.remove(processed_audio)
-                                if os.path.exists(audio_file):
-                                    os.remove(audio_file)
-                            except Exception as e:
-                                logger.error(f"Ошибка при удалении временных файлов: {e}")
-                    else:
-                        logger.error(f"Файл {processed_audio} не существует или имеет неверный формат")
-                        updater.bot.send_message(
-                            chat_id=task['user_id'],
-                            text="Произошла ошибка при обработке аудиофайла. Пожалуйста, попробуйте еще раз."
-                        )
-                        
-                        # Удаляем исходный аудиофайл, если он существует
-                        try:
-                            if os.path.exists(audio_file):
-                                os.remove(audio_file)
-                                logger.debug(f"Исходный аудиофайл {audio_file} удален")
-                        except Exception as e:
-                            logger.error(f"Ошибка при удалении исходного аудиофайла: {e}")
-                    
-                    # Логируем успешное завершение
-                    logger.info(f"Задача {task['id']} для пользователя {task['user_id']} успешно обработана")
-                    
-                except Exception as e:
-                    # В случае ошибки отправляем сообщение пользователю
-                    logger.debug(f"Произошла ошибка при обработке задачи {task['id']}: {e}")
-                    logger.debug(f"Трассировка стека: ", exc_info=True)
-                    
-                    updater.bot.send_message(
-                        chat_id=task['user_id'],
-                        text=f"Произошла ошибка при обработке вашего текста: {str(e)}"
-                    )
-                    
-                    # Логируем ошибку
-                    logger.error(f"Ошибка при обработке задачи {task['id']}: {e}")
+    # Логируем начало обработки
+    logger.info(f"Начало обработки задачи {task['id']} для пользователя {task['user_id']}")
+    logger.debug(f"Содержимое задачи: {task}")
+    
+    # Настройки сохранены в задаче при постановке в очередь;
+    # у задач предыдущих версий их нет, тогда берем текущие
+    user_settings = task.get('settings') or get_user_settings(task['user_id'])
+    logger.debug(f"Настройки пользователя получены: {user_settings}")
+    
+    def send_audio(file_path, title):
+        """
+        Отправка готового аудиофайла пользователю
+        """
+        # Проверяем, что файл существует и не содержит ':Zone.Identifier'
+        if not os.path.exists(file_path) or ':Zone.Identifier' in file_path:
+            raise ValueError(f"Файл {file_path} не существует или имеет неверный формат")
+
+        logger.debug(f"Отправка аудиофайла {file_path} пользователю {task['user_id']}")
+        with open(file_path, 'rb') as audio:
+            updater.bot.send_audio(
+                chat_id=task['user_id'],
+                audio=audio,
+                title=title
+            )
+    
+    try:
+        # Конвертируем текст в речь: части синтезируются параллельно
+        # и склеиваются в один файл (или в несколько, если не помещаются в лимит Telegram)
+        logger.debug(f"Начинаем конвертацию текста в речь для задачи {task['id']}")
+        logger.debug(f"Параметры конвертации: язык={user_settings['language']}, тип голоса={user_settings['voice_type']}, движок={user_settings['tts_engine']}, формат={user_settings['audio_format']}")
+        
+        title = f"Аудиокнига {task['id']}"
+        checkpoints = None
+        with open(task['payload_path'], 'r', encoding='utf-8') as payload:
+            if task['text_length'] > config.MAX_TEXT_LENGTH:
+                # Режим книги: текст читается из файла по частям, аудио приходит
+                # файлами с оглавлением по главам; прогресс сохраняется после
+                # каждого файла, а озвученные части — сразу после синтеза
+                if task['chunks_done']:
+                    logger.info(f"Задача {task['id']} продолжается с части {task['chunks_done'] + 1}")
                 
-                finally:
-                    # Удаляем задачу из очереди
-                    logger.debug(f"Удаляем задачу {task['id']} из очереди")
-                    task_queue.pop(0)
-                    logger.debug(f"Задача {task['id']} удалена из очереди")
+                checkpoints = ChunkCheckpoints(task['id'])
+                delivered = deliver_book(
+                    payload,
+                    user_settings,
+                    send_audio,
+                    title=title,
+                    skip_chunks=task['chunks_done'],
+                    chapters_sent=task.get('chapters_sent', 0),
+                    chapter_part=task.get('chapter_part', 1),
+                    on_volume_sent=lambda chapter, chunks_done, part: save_task_progress(task['id'], chunks_done, chapter, part),
+                    checkpoints=checkpoints,
+                    owner=task['user_id'],
+                    weight=task.get('weight', 1),
+                    cancelled=task.get('cancelled')
+                )
             else:
-                # Если очередь пуста, логируем это
-                logger.debug("Очередь пуста, ожидаем новые задачи")
-            
-            # Пауза между проверками очереди
-            time.sleep(1)
-            
-        except Exception as e:
-            logger.error(f"Ошибка в обработчике очереди: {e}")
-            logger.debug(f"Трассировка стека: ", exc_info=True)
-            time.sleep(5)  # Пауза в случае ошибки
+                delivered = deliver_document(
+                    payload.read(), user_settings, send_audio, title=title,
+                    owner=task['user_id'], weight=task.get('weight', 1),
+                    express=task.get('express', False),
+                    cancelled=task.get('cancelled')
+                )
+        
+        if not delivered:
+            logger.error(f"Не удалось озвучить или отправить текст задачи {task['id']}")
+            report_failure(updater, task, "Произошла ошибка при конвертации текста в речь. Пожалуйста, попробуйте еще раз.")
+            return False
+        
+        updater.bot.send_message(
+            chat_id=task['user_id'],
+            text="Ваш текст был успешно преобразован в аудио!"
+        )
+        
+        # Логируем успешное завершение
+        logger.info(f"Задача {task['id']} для пользователя {task['user_id']} успешно обработана")
+        return True
+        
+    except TaskCancelled:
+        # Пользователь уже получил подтверждение отмены, ничего не отправляем;
+        # части, которые еще синтезируются, не сохранятся в контрольные точки
+        logger.info(f"Задача {task['id']} отменена во время обработки")
+        if checkpoints is not None:
+            checkpoints.clear()
+        return False
+        
+    except Exception as e:
+        # В случае ошибки отправляем сообщение пользователю
+        logger.debug(f"Произошла ошибка при обработке задачи {task['id']}: {e}")
+        logger.debug(f"Трассировка стека: ", exc_info=True)
+        
+        # Логируем ошибку
+        logger.error(f"Ошибка при обработке задачи {task['id']}: {e}")
+        
+        report_failure(updater, task, f"Произошла ошибка при обработке вашего текста: {str(e)}")
+        return False
+
+def report_failure(updater, task, text):
+    """
+    Сообщение пользователю о неудачной обработке задачи
+    
+    Книга, у которой остались попытки, помечается для возврата в очередь
+    (см. complete_task): отправленные тома и озвученные части сохраняются,
+    и обработка продолжится с места остановки.
+    
+    Args:
+        updater (Updater): Экземпляр Updater для отправки сообщений
+        task (dict): Задача
+        text (str): Сообщение об ошибке, если задача не будет повторена
+    """
+    if task['text_length'] > config.MAX_TEXT_LENGTH and task.get('attempts', 0) < config.TASK_MAX_ATTEMPTS:
+        task['retry'] = True
+        text = "Не удалось озвучить или отправить часть книги. Обработка продолжится с места остановки, уже отправленные файлы повторно не придут."
+    
+    try:
+        updater.bot.send_message(chat_id=task['user_id'], text=text)
+    except Exception as e:
+        logger.error(f"Не удалось отправить сообщение об ошибке задачи {task['id']}: {e}")
 
 def clean_temp_directory():
     """
@@ -250,6 +205,9 @@ def main():
     # Инициализация базы данных
     init_db()
     
+    # Восстановление очереди задач, прерванной перезапуском
+    restore_queue()
+    
     # Создание экземпляра Updater и передача ему токена бота
     updater = Updater(token=config.TELEGRAM_TOKEN, use_context=True)
     
@@ -274,16 +232,22 @@ def main():
     # Запуск бота
     updater.start_polling()
     
-    # Запуск обработчика очереди в отдельном потоке
-    queue_thread = threading.Thread(target=process_queue, args=(updater,))
-    queue_thread.daemon = True
-    queue_thread.start()
+    # Подготовка движков синтеза
+    warm_up_synthesis()
+    
+    # Запуск пула обработчиков очереди
+    worker_pool = WorkerPool(lambda task: process_task(updater, task), workers=config.QUEUE_WORKERS)
+    worker_pool.start()
+    start_lease_keeper()
     
-    # Логируем запуск обработчика очереди
-    logger.info("Обработчик очереди запущен")
+    # Логируем запуск обработчиков очереди
+    logger.info("Обработчики очереди запущены")
     
     # Остановка бота при нажатии Ctrl+C
     updater.idle()
+    
+    # Итоговая статистика кэша речи за время работы
+    logger.info(f"Статистика кэша речи: {speech_cache.stats()}")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки контрольных точек длинных задач и
+возобновления озвучки книги после сбоя отправки
+"""
+import itertools
+import logging
+import os
+import pytest
+from concurrent.futures import wait
+from app.db.database import db_writer
+from app.utils import audio_processor, checkpoints as checkpoints_module, pipeline
+from app.utils.checkpoints import ChunkCheckpoints, chunk_hash
+from app.utils.fair_executor import FairExecutor
+from app.utils.tts_engines import get_engine
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s - %(filename)s:%(lineno)d',
+    level=logging.DEBUG
+)
+
+logger = logging.getLogger(__name__)
+
+SETTINGS = {'tts_engine': 'gtts', 'language': 'ru', 'voice_type': 'female', 'audio_format': 'mp3'}
+
+# Номера временных аудиофайлов теста
+_file_numbers = itertools.count()
+
+@pytest.fixture
+def work_dirs(tmp_path, monkeypatch):
+    """
+    Временная директория и директория задач внутри директории теста
+
+    Returns:
+        pathlib.Path: Временная директория для аудиофайлов
+    """
+    temp_dir = tmp_path / "temp"
+    temp_dir.mkdir()
+    monkeypatch.setattr(checkpoints_module, 'TASKS_DIR', str(tmp_path / "tasks"))
+    monkeypatch.setattr(pipeline, 'TEMP_DIR', str(temp_dir))
+    monkeypatch.setattr(audio_processor, 'TEMP_DIR', str(temp_dir))
+    return temp_dir
+
+def make_audio(directory, content):
+    """
+    Временный "аудиофайл" с текстом части вместо звука
+
+    Args:
+        directory (pathlib.Path): Директория файла
+        content (str): Содержимое
+
+    Returns:
+        str: Путь к файлу
+    """
+    file_path = directory / f"test_{next(_file_numbers)}.mp3"
+    file_path.write_text(content, encoding='utf-8')
+    return str(file_path)
+
+def test_checkpoints_survive_restart(temp_db, work_dirs):
+    """
+    Сохраненная часть находится новым экземпляром, но только с тем же хэшем
+    """
+    task_id = "test-restart"
+    text_hash = chunk_hash("Первая часть.", SETTINGS)
+
+    checkpoints = ChunkCheckpoints(task_id)
+    artifact_path = checkpoints.save(0, text_hash, make_audio(work_dirs, "Первая часть."))
+    db_writer.flush()
+
+    restarted = ChunkCheckpoints(task_id)
+    assert restarted.get(0, text_hash) == artifact_path
+    assert restarted.get(0, chunk_hash("Другой текст.", SETTINGS)) is None
+    assert restarted.get(1, text_hash) is None
+
+    restarted.discard([0])
+    assert not os.path.exists(artifact_path)
+
+    # После clear новые части не сохраняются, а их файлы удаляются
+    restarted.clear()
+    audio_file = make_audio(work_dirs, "Поздняя часть.")
+    assert restarted.save(1, text_hash, audio_file) is None
+    assert not os.path.exists(audio_file)
+    assert not os.path.exists(restarted.directory)
+    db_writer.flush()
+
+class RecordingExecutor(FairExecutor):
+    """
+    Пул синтеза частей, запоминающий все поставленные работы
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.futures = []
+
+    def submit(self, fn, *args, **kwargs):
+        future = super().submit(fn, *args, **kwargs)
+        self.futures.append(future)
+        return future
+
+def test_book_resumes_from_checkpoints(temp_db, work_dirs, monkeypatch):
+    """
+    После сбоя отправки книга продолжается с первой неотправленной части:
+    отправленное не повторяется, озвученное не синтезируется заново
+    """
+    task_id = "test-resume"
+    chunk_length = get_engine(SETTINGS['tts_engine']).chunk_length
+    book = ""
+    while len(book) < chunk_length * 6:
+        book += f"Это предложение книги номер {len(book)}. "
+
+    synthesized = []
+    sent = []
+    progress = {'chunks_done': 0, 'chapter': 0, 'part': 1}
+    failures = itertools.count()
+    executor = RecordingExecutor(max_workers=4, thread_name_prefix="test_chunk")
+
+    def synthesize_part(text, settings):
+        synthesized.append(text)
+        return make_audio(work_dirs, text)
+
+    def send_audio(audio_file, title):
+        # Третья отправка первого запуска завершается ошибкой
+        if len(sent) == 2 and next(failures) == 0:
+            raise RuntimeError("Telegram недоступен")
+        with open(audio_file, encoding='utf-8') as f:
+            sent.append(f.read())
+
+    def on_volume_sent(chapter, chunks_done, part):
+        progress.update(chapter=chapter, chunks_done=chunks_done, part=part)
+
+    # Без ffmpeg каждая часть отправляется отдельным файлом без перекодирования
+    monkeypatch.setattr(pipeline, 'FFMPEG_AVAILABLE', False)
+    monkeypatch.setattr(audio_processor, 'FFMPEG_AVAILABLE', False)
+    monkeypatch.setattr(pipeline, '_synthesize_part', synthesize_part)
+    monkeypatch.setattr(pipeline, '_chunk_executor', executor)
+    monkeypatch.setattr(pipeline, 'estimate_encoded_size', lambda audio_file, output_format: os.path.getsize(audio_file))
+    try:
+        for _ in range(2):
+            checkpoints = ChunkCheckpoints(task_id)
+            delivered = pipeline.deliver_book(
+                book, SETTINGS, send_audio, title="Книга",
+                skip_chunks=progress['chunks_done'],
+                chapters_sent=progress['chapter'],
+                chapter_part=progress['part'],
+                on_volume_sent=on_volume_sent,
+                checkpoints=checkpoints
+            )
+            # Запущенные до сбоя части успевают сохраниться как контрольные точки
+            _, not_done = wait(executor.futures, timeout=5)
+            assert not not_done
+            db_writer.flush()
+            logger.info(f"Отправлено частей: {len(sent)}, синтезировано: {len(synthesized)}")
+            if delivered:
+                break
+    finally:
+        checkpoints.clear()
+        db_writer.flush()
+
+    parts = list(pipeline.iter_text_chunks(book, chunk_length))
+    assert delivered
+    assert sent == parts
+    # Каждая часть озвучена ровно один раз
+    assert sorted(synthesized) == sorted(parts)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
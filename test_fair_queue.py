@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки честного распределения: взвешенная честная
+очередь задач и пул частей FairExecutor
+"""
+import logging
+import threading
+from app.utils.queue_manager import TaskQueue
+from app.utils.fair_executor import FairExecutor
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s - %(filename)s:%(lineno)d',
+    level=logging.DEBUG
+)
+
+logger = logging.getLogger(__name__)
+
+def make_task(task_id, user_id, text_length, weight=1, express=False):
+    """
+    Задача в формате очереди
+
+    Args:
+        task_id (str): ID задачи
+        user_id (int): ID пользователя
+        text_length (int): Длина текста
+        weight (int): Вес пользователя
+        express (bool): Короткая задача
+
+    Returns:
+        dict: Задача
+    """
+    return {'id': task_id, 'user_id': user_id, 'text_length': text_length, 'weight': weight, 'express': express}
+
+def drain(queue, express_only=False):
+    """
+    Выдача всех доступных задач по порядку
+
+    Returns:
+        list: ID задач в порядке выдачи
+    """
+    order = []
+    while True:
+        task = queue.get(timeout=0, express_only=express_only)
+        if task is None:
+            return order
+        order.append(task['id'])
+        queue.task_done(task['id'])
+
+def run_executor(submissions):
+    """
+    Выполнение работ в пуле из одного потока, который занят до постановки всех работ
+
+    Args:
+        submissions (list): Пары (название работы, аргументы submit)
+
+    Returns:
+        list: Названия работ в порядке выполнения
+    """
+    executor = FairExecutor(max_workers=1, thread_name_prefix="test_fair")
+    started = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def block():
+        started.set()
+        release.wait()
+
+    executor.submit(block)
+    started.wait()
+    futures = [executor.submit(order.append, name, **kwargs) for name, kwargs in submissions]
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+    return order
+
+def test_fair_queue_short_text_overtakes():
+    """
+    Короткий текст второго пользователя не ждет длинные тексты первого
+    """
+    queue = TaskQueue(mode='fair')
+    for i in range(5):
+        queue.put(make_task(f"a{i}", 1, 10000))
+    queue.put(make_task("b0", 2, 100))
+
+    assert queue.position("b0") == 1
+    order = drain(queue)
+    logger.info(f"Порядок выдачи: {order}")
+    assert order == ["b0", "a0", "a1", "a2", "a3", "a4"]
+
+def test_fair_queue_weights():
+    """
+    Пользователь с весом 2 получает вдвое больше символов
+    """
+    queue = TaskQueue(mode='fair')
+    for i in range(4):
+        queue.put(make_task(f"p{i}", 1, 1000, weight=2))
+        queue.put(make_task(f"r{i}", 2, 1000))
+
+    order = drain(queue)
+    logger.info(f"Порядок выдачи: {order}")
+    # За время одной задачи обычного пользователя премиум получает две
+    # (при равном времени окончания раньше выдается поступившая раньше)
+    assert order[:6] == ["p0", "r0", "p1", "p2", "r1", "p3"]
+
+def test_fair_executor_weights():
+    """
+    Владелец с весом 2 получает два запуска за проход
+    """
+    submissions = [(f"a{i}", {'owner': 'a', 'weight': 2}) for i in range(4)]
+    submissions += [(f"b{i}", {'owner': 'b'}) for i in range(4)]
+
+    order = run_executor(submissions)
+    logger.info(f"Порядок выполнения: {order}")
+    assert order == ["a0", "a1", "b0", "a2", "a3", "b1", "b2", "b3"]
+
+if __name__ == "__main__":
+    test_fair_queue_short_text_overtakes()
+    test_fair_queue_weights()
+    test_fair_executor_weights()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки клиента Google TTS на локальной заглушке сервиса
+"""
+import asyncio
+import base64
+import json
+import logging
+import os
+import threading
+import urllib.parse
+from aiohttp import web
+from config import TEMP_DIR
+from app.utils.gtts_client import GTTSClient, GTTSError
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s - %(filename)s:%(lineno)d',
+    level=logging.DEBUG
+)
+
+logger = logging.getLogger(__name__)
+
+def start_stub_server(failures=0):
+    """
+    Запуск заглушки batchexecute, которая возвращает текст части как "аудио"
+
+    Args:
+        failures (int): Сколько первых запросов завершить кодом 503
+
+    Returns:
+        tuple: (адрес заглушки, список полученных текстов)
+    """
+    received = []
+    state = {'failures': failures}
+
+    async def batchexecute(request):
+        if state['failures'] > 0:
+            state['failures'] -= 1
+            return web.Response(status=503)
+
+        body = await request.text()
+        rpc = json.loads(urllib.parse.unquote(body[len('f.req='):].rstrip('&')))
+        text = json.loads(rpc[0][0][1])[0]
+        received.append(text)
+
+        audio = base64.b64encode(text.encode('utf-8')).decode('ascii')
+        payload = ')]}\'\n\n[["wrb.fr","jQ1olc","[\\"' + audio + '\\"]",null,null,null,"generic"]]'
+        return web.Response(text=payload)
+
+    loop = asyncio.new_event_loop()
+    app = web.Application()
+    app.router.add_post('/_/TranslateWebserverUi/data/batchexecute', batchexecute)
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+
+    thread = threading.Thread(target=loop.run_forever)
+    thread.daemon = True
+    thread.start()
+
+    return f"http://127.0.0.1:{port}", received
+
+def test_gtts_client():
+    """
+    Длинный текст делится на части, которые запрашиваются параллельно
+    и сохраняются в исходном порядке; ошибка 503 повторяется
+    """
+    base_url, received = start_stub_server(failures=1)
+    client = GTTSClient(base_url=base_url, rate_limit=0, retries=2)
+
+    text = " ".join(f"Предложение номер {i}." for i in range(30))
+    file_path = os.path.join(TEMP_DIR, "test_gtts_client.mp3")
+    client.save(text, 'ru', file_path)
+
+    with open(file_path, 'rb') as f:
+        audio = f.read().decode('utf-8')
+    os.remove(file_path)
+
+    # gTTS отбрасывает знаки препинания на границах частей, кроме последней
+    expected = [f"Предложение номер {i}" for i in range(29)] + ["Предложение номер 29."]
+
+    logger.info(f"Получено частей: {len(received)}")
+    assert sorted(received) == sorted(expected)
+    assert audio == "".join(expected)
+
+def test_gtts_client_gives_up():
+    """
+    После исчерпания повторов клиент сообщает об ошибке
+    """
+    base_url, _ = start_stub_server(failures=10)
+    client = GTTSClient(base_url=base_url, rate_limit=0, retries=1)
+
+    try:
+        client.save("Привет", 'ru', os.path.join(TEMP_DIR, "test_gtts_client.mp3"))
+    except GTTSError as e:
+        logger.info(f"Ожидаемая ошибка: {e}")
+    else:
+        raise AssertionError("Клиент не сообщил об ошибке")
+
+if __name__ == "__main__":
+    test_gtts_client()
+    test_gtts_client_gives_up()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки ограничения частоты запросов
+"""
+import logging
+import time
+import pytest
+from config import USER_RATE_PER_MINUTE, USER_RATE_BURST, CHAT_RATE_BURST, GLOBAL_RATE_BURST, HOURLY_REQUEST_LIMIT
+from app.utils.rate_limiter import TokenBucket, RateLimiter
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s - %(filename)s:%(lineno)d',
+    level=logging.DEBUG
+)
+
+logger = logging.getLogger(__name__)
+
+def test_token_bucket_burst_and_refill():
+    """
+    Корзина пропускает burst запросов подряд и восстанавливает токен
+    за 60 / per_minute секунд
+    """
+    now = 1000.0
+    bucket = TokenBucket(per_minute=6, burst=3)
+    bucket.updated = now
+
+    for _ in range(3):
+        assert bucket.available(now)
+        bucket.take(now)
+    assert not bucket.available(now)
+
+    # Один токен восстанавливается за 10 секунд
+    assert not bucket.available(now + 9)
+    assert bucket.available(now + 10)
+    assert not bucket.full(now + 20)
+    assert bucket.full(now + 30)
+
+def test_token_bucket_unlimited():
+    """
+    Корзина с нулевой скоростью ничего не ограничивает
+    """
+    bucket = TokenBucket(per_minute=0, burst=1)
+    for _ in range(100):
+        bucket.take(0)
+    assert bucket.available(0)
+
+def test_rate_limiter_user_burst(temp_db):
+    """
+    Пользователь делает USER_RATE_BURST запросов подряд, следующий
+    отклоняется; проверка без учета запрос не расходует
+    """
+    limiter = RateLimiter()
+    user_id = 1
+
+    burst = min(USER_RATE_BURST, CHAT_RATE_BURST, GLOBAL_RATE_BURST, HOURLY_REQUEST_LIMIT or USER_RATE_BURST)
+    for _ in range(burst):
+        assert limiter.can_make_request(user_id)
+        assert limiter.can_make_request(user_id)
+        limiter.record(user_id)
+
+    if USER_RATE_PER_MINUTE > 0:
+        assert not limiter.can_make_request(user_id)
+    # Другой пользователь ограничен только своей корзиной
+    assert limiter.can_make_request(user_id + 1)
+
+def test_rate_limiter_chat_bucket(temp_db):
+    """
+    Лимит чата действует на всех его пользователей
+    """
+    limiter = RateLimiter()
+    chat_id = -100
+    now = time.monotonic()
+
+    # Корзина чата опустошена, корзины пользователей полны
+    bucket = limiter._chat_bucket(chat_id)
+    bucket.tokens = 0
+    bucket.updated = now
+
+    if bucket.rate > 0:
+        assert not limiter.can_make_request(1, chat_id)
+    assert limiter.can_make_request(1)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
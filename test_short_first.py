@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки режима short_first: выдача задач по
+ожидаемому времени, экспресс-обработчики и приоритет частей коротких
+задач в пуле синтеза
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+import pytest
+from app.utils import queue_manager
+from app.utils.queue_manager import TaskQueue
+from test_fair_queue import make_task, drain, run_executor
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s - %(filename)s:%(lineno)d',
+    level=logging.DEBUG
+)
+
+logger = logging.getLogger(__name__)
+
+def test_short_first_with_express_workers():
+    """
+    Задачи выдаются по ожидаемому времени, а экспресс-обработчик берет
+    только короткие задачи
+    """
+    queue = TaskQueue(mode='short_first')
+    queue.put(make_task("long", 1, 50000))
+    queue.put(make_task("medium", 1, 5000))
+    queue.put(make_task("short", 2, 200, express=True))
+
+    express = queue.get(timeout=0, express_only=True)
+    assert express['id'] == "short"
+    assert queue.get(timeout=0, express_only=True) is None
+    # Взятая задача учитывается в позиции остальных
+    assert queue.position("medium") == 2
+    queue.task_done("short")
+
+    assert drain(queue) == ["medium", "long"]
+
+def test_express_worker_wakes_up():
+    """
+    Ожидающий экспресс-обработчик просыпается при появлении короткой задачи
+    """
+    queue = TaskQueue(mode='short_first')
+    taken = []
+    worker = threading.Thread(target=lambda: taken.append(queue.get(timeout=5, express_only=True)))
+    worker.start()
+
+    queue.put(make_task("long", 1, 50000))
+    queue.put(make_task("short", 2, 200, express=True))
+    worker.join()
+
+    assert taken[0]['id'] == "short"
+    assert len(queue) == 2
+
+def test_express_parts_run_first():
+    """
+    Части короткой задачи (меньший приоритет) выполняются раньше частей длинных
+    """
+    submissions = [(f"bulk{i}", {'owner': 'a', 'priority': 1}) for i in range(3)]
+    submissions += [("express", {'owner': 'b', 'priority': 0})]
+
+    order = run_executor(submissions)
+    logger.info(f"Порядок выполнения: {order}")
+    assert order == ["express", "bulk0", "bulk1", "bulk2"]
+
+def test_aging_survives_requeue(monkeypatch):
+    """
+    Ожидание считается от created_at задачи: давно поставленный длинный
+    текст идет раньше нового короткого и после возврата в очередь
+    """
+    monkeypatch.setattr(queue_manager, 'SHORT_JOB_AGING', 1.0)
+    queue = TaskQueue(mode='short_first')
+    old = make_task("old", 1, 50000)
+    old['created_at'] = datetime.utcnow() - timedelta(days=30)
+    new = make_task("new", 2, 200)
+    new['created_at'] = datetime.utcnow()
+    queue.put(new)
+    queue.put(old)
+
+    assert queue.position("old") == 1
+    task = queue.get(timeout=0)
+    assert task['id'] == "old"
+
+    # Возврат в очередь (как после сбоя) не сбрасывает накопленное ожидание
+    queue.task_done("old")
+    queue.put(task)
+    assert drain(queue) == ["old", "new"]
+
+if __name__ == "__main__":
+    pytest.main([__file__])
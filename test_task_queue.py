@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки индекса очереди задач: порядок выдачи,
+позиция задачи, отмена и список задач пользователя
+"""
+import logging
+import random
+from app.utils.order_index import OrderIndex
+from app.utils.queue_manager import TaskQueue
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s - %(filename)s:%(lineno)d',
+    level=logging.DEBUG
+)
+
+logger = logging.getLogger(__name__)
+
+def make_task(task_id, user_id, text_length, weight=1):
+    """
+    Задача в формате очереди
+
+    Args:
+        task_id (str): ID задачи
+        user_id (int): ID пользователя
+        text_length (int): Длина текста
+        weight (int): Вес пользователя
+
+    Returns:
+        dict: Задача
+    """
+    return {'id': task_id, 'user_id': user_id, 'text_length': text_length, 'weight': weight}
+
+def test_order_index_matches_sorted_list():
+    """
+    Наименьший ключ и номер ключа совпадают с отсортированным списком
+    после случайных вставок и удалений
+    """
+    rng = random.Random(4)
+    index = OrderIndex()
+    keys = []
+    for step in range(3000):
+        if keys and rng.random() < 0.4:
+            key = keys.pop(rng.randrange(len(keys)))
+            index.remove(key)
+        else:
+            key = (rng.random(), step)
+            keys.append(key)
+            index.add(key)
+        if step % 100 == 0:
+            ordered = sorted(keys)
+            assert len(index) == len(ordered)
+            assert index.first() == (ordered[0] if ordered else None)
+            for position, key in enumerate(ordered[::37]):
+                assert index.rank(key) == position * 37
+
+    try:
+        index.remove((2.0, 0))
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("Удаление отсутствующего ключа должно вызывать KeyError")
+
+def test_position_in_large_queue():
+    """
+    Позиция задачи в очереди из тысяч задач совпадает с порядком выдачи
+    """
+    queue = TaskQueue(mode='fair')
+    for i in range(5000):
+        queue.put(make_task(f"t{i}", i % 50, 100 + (i * 7919) % 20000))
+
+    order = [queue.get(timeout=0)['id'] for _ in range(10)]
+    sample = [f"t{i}" for i in range(0, 5000, 250) if f"t{i}" not in order]
+    positions = {task_id: queue.position(task_id) for task_id in sample}
+    for task_id in order:
+        queue.task_done(task_id)
+
+    issued = []
+    while True:
+        task = queue.get(timeout=0)
+        if task is None:
+            break
+        issued.append(task['id'])
+        queue.task_done(task['id'])
+
+    assert len(issued) == 4990
+    for task_id, position in positions.items():
+        # В позиции учитывались 10 взятых задач
+        assert issued.index(task_id) + 10 + 1 == position
+
+def test_remove_sets_cancelled():
+    """
+    Удаление задачи из очереди выставляет флаг отмены для обработчика
+    """
+    queue = TaskQueue(mode='fair')
+    queue.put(make_task("a", 1, 100))
+    queue.put(make_task("b", 1, 100))
+    task = queue.get(timeout=0)
+
+    assert queue.remove("a") is task
+    assert task['cancelled'].is_set()
+    assert "a" not in queue
+    assert queue.remove("a") is None
+
+    # Отмена ожидающей задачи убирает ее из индекса
+    assert queue.remove("b") is not None
+    assert queue.position("b") == 0
+    assert queue.get(timeout=0) is None
+
+def test_user_tasks():
+    """
+    Список задач пользователя включает ожидающие и активные задачи
+    в порядке поступления
+    """
+    queue = TaskQueue(mode='fair')
+    queue.put(make_task("a0", 1, 5000))
+    queue.put(make_task("b0", 2, 100))
+    queue.put(make_task("a1", 1, 100))
+
+    taken = queue.get(timeout=0)
+    assert taken['id'] == "b0"
+    assert [task['id'] for task in queue.user_tasks(1)] == ["a0", "a1"]
+    assert [task['id'] for task in queue.user_tasks(2)] == ["b0"]
+
+    queue.task_done("b0")
+    queue.remove("a0")
+    assert queue.user_tasks(2) == []
+    assert [task['id'] for task in queue.user_tasks(1)] == ["a1"]
+
+if __name__ == "__main__":
+    test_order_index_matches_sorted_list()
+    test_position_in_large_queue()
+    test_remove_sets_cancelled()
+    test_user_tasks()
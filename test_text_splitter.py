@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки разбиения текста на части
+"""
+import io
+import logging
+from app.utils.text_splitter import split_text, iter_text_chunks
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s - %(filename)s:%(lineno)d',
+    level=logging.DEBUG
+)
+
+logger = logging.getLogger(__name__)
+
+def test_short_text_is_one_part():
+    """
+    Текст короче лимита возвращается как есть
+    """
+    assert split_text("Привет, мир!", 100) == ["Привет, мир!"]
+
+def test_parts_fit_and_keep_words():
+    """
+    Части не длиннее лимита и вместе дают исходный текст
+    """
+    text = " ".join(f"Предложение номер {i}, в нем несколько слов." for i in range(200))
+    parts = split_text(text, 150)
+
+    logger.info(f"Частей: {len(parts)}")
+    assert all(len(part) <= 150 for part in parts)
+    assert " ".join(parts).split() == text.split()
+
+def test_cuts_at_sentence_boundary():
+    """
+    Текст режется по концу предложения, а не посреди него
+    """
+    text = " ".join(f"Предложение номер {i}." for i in range(50))
+    parts = split_text(text, 100)
+
+    assert all(part.endswith(".") for part in parts)
+
+def test_prefers_paragraph_boundary():
+    """
+    Абзац, который помещается в часть, не делится
+    """
+    first = "Первый абзац. " * 3
+    second = "Второй абзац. " * 3
+    parts = split_text(f"{first.strip()}\n\n{second.strip()}", 60)
+
+    assert parts == [first.strip(), second.strip()]
+
+def test_long_word_is_cut():
+    """
+    Слово длиннее лимита режется по лимиту
+    """
+    parts = split_text("а" * 250, 100)
+
+    assert [len(part) for part in parts] == [100, 100, 50]
+
+def test_stream_matches_string():
+    """
+    Разбиение файла, прочитанного несколькими блоками, совпадает с разбиением строки
+    """
+    text = "\n\n".join(" ".join(f"Абзац {p}, предложение {i}." for i in range(40)) for p in range(200))
+
+    from_string = list(iter_text_chunks(text, 500))
+    from_stream = list(iter_text_chunks(io.StringIO(text), 500))
+
+    assert from_string == from_stream
+
+if __name__ == "__main__":
+    test_short_text_is_one_part()
+    test_parts_fit_and_keep_words()
+    test_cuts_at_sentence_boundary()
+    test_prefers_paragraph_boundary()
+    test_long_word_is_cut()
+    test_stream_matches_string()
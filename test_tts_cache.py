@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки дискового кэша синтезированной речи
+"""
+import logging
+import os
+import shutil
+import tempfile
+import pytest
+from config import TEMP_DIR
+from app.utils.tts_cache import SpeechCache, make_cache_key, STATS_LOG_INTERVAL
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s - %(filename)s:%(lineno)d',
+    level=logging.DEBUG
+)
+
+logger = logging.getLogger(__name__)
+
+def make_audio(content):
+    """
+    Временный "аудиофайл" с заданным содержимым
+
+    Returns:
+        str: Путь к файлу
+    """
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    fd, file_path = tempfile.mkstemp(suffix=".mp3", dir=TEMP_DIR)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    return file_path
+
+def read_and_remove(file_path):
+    """
+    Чтение файла, полученного из кэша, с его удалением
+    """
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    os.remove(file_path)
+    return content
+
+def test_cache_key_normalization():
+    """
+    Пробелы и форма Unicode не влияют на ключ, параметры синтеза влияют
+    """
+    key = make_cache_key("Привет,  мир ", 'ru', 'male', 'gtts', 'mp3')
+
+    assert key == make_cache_key(" Привет, мир", 'ru', 'male', 'gtts', 'mp3')
+    assert key != make_cache_key("Привет, мир", 'ru', 'female', 'gtts', 'mp3')
+    assert key != make_cache_key("Привет, мир", 'ru', 'male', 'espeak', 'mp3')
+
+def test_cache_evicts_least_recently_used():
+    """
+    При превышении лимита вытесняется давно не использованная запись,
+    а попадание продлевает жизнь записи
+    """
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache = SpeechCache(cache_dir=cache_dir, max_bytes=2500)
+        for name in ("a", "b"):
+            source = make_audio(name.encode() * 1000)
+            cache.put(name, 'mp3', source)
+            os.remove(source)
+
+        # Попадание делает "a" самой свежей записью
+        assert read_and_remove(cache.get("a", 'mp3')) == b"a" * 1000
+
+        source = make_audio(b"c" * 1000)
+        cache.put("c", 'mp3', source)
+        os.remove(source)
+
+        assert cache.get("b", 'mp3') is None
+        assert read_and_remove(cache.get("a", 'mp3')) == b"a" * 1000
+        assert read_and_remove(cache.get("c", 'mp3')) == b"c" * 1000
+        assert sorted(os.listdir(cache_dir)) == ["a.mp3", "c.mp3"]
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses']) == (3, 1)
+        assert (stats['entries'], stats['bytes']) == (2, 2000)
+    finally:
+        shutil.rmtree(cache_dir)
+
+def test_cache_survives_restart():
+    """
+    Новый экземпляр кэша находит записи на диске и учитывает их в лимите
+    """
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache = SpeechCache(cache_dir=cache_dir, max_bytes=2500)
+        source = make_audio(b"x" * 1000)
+        cache.put("x", 'mp3', source)
+        os.remove(source)
+
+        restarted = SpeechCache(cache_dir=cache_dir, max_bytes=2500)
+        assert read_and_remove(restarted.get("x", 'mp3')) == b"x" * 1000
+        assert restarted.get("y", 'mp3') is None
+
+        source = make_audio(b"y" * 2000)
+        restarted.put("y", 'mp3', source)
+        os.remove(source)
+        assert os.listdir(cache_dir) == ["y.mp3"]
+    finally:
+        shutil.rmtree(cache_dir)
+
+def test_cache_hit_rate_logged(caplog):
+    """
+    Статистика попаданий периодически пишется в лог
+    """
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache = SpeechCache(cache_dir=cache_dir, max_bytes=2500)
+        source = make_audio(b"h" * 10)
+        cache.put("h", 'mp3', source)
+        os.remove(source)
+
+        with caplog.at_level(logging.INFO, logger='app.utils.tts_cache'):
+            for i in range(STATS_LOG_INTERVAL):
+                if i % 4:
+                    os.remove(cache.get("h", 'mp3'))
+                else:
+                    assert cache.get(f"miss{i}", 'mp3') is None
+
+        assert cache.hits == STATS_LOG_INTERVAL * 3 // 4
+        assert cache.misses == STATS_LOG_INTERVAL // 4
+        messages = [record.getMessage() for record in caplog.records if record.name == 'app.utils.tts_cache']
+        assert any("75%" in message for message in messages)
+    finally:
+        shutil.rmtree(cache_dir)
+
+def test_cache_disabled():
+    """
+    Кэш с нулевым лимитом ничего не сохраняет
+    """
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache = SpeechCache(cache_dir=cache_dir, max_bytes=0)
+        source = make_audio(b"z")
+        cache.put("z", 'mp3', source)
+        os.remove(source)
+
+        assert cache.get("z", 'mp3') is None
+        assert os.listdir(cache_dir) == []
+    finally:
+        shutil.rmtree(cache_dir)
+
+if __name__ == "__main__":
+    pytest.main([__file__])